@@ -163,7 +163,7 @@ def SaveStructure(**args):
 
     elif args["format"] == "CIF":
         cif_file = mmCIFFile()
-        mmCIFFileBuilder(struct, cif_file)
+        mmCIFFileBuilder(struct, cif_file, stream = True)
         cif_file.save_file(fileobj)
         return
 
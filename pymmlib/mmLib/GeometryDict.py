@@ -6,19 +6,234 @@
 """
 
 from __future__ import generators
-import random
 import math
 import itertools
 
+try:
+    import numpy
+except ImportError:
+    import NumericCompat as numpy
+
+
+## number of cells looked up at once by XYZIndex.iter_candidates()
+CANDIDATE_BLOCK_SIZE = 65536
+
+
+class XYZIndex(object):
+    """Vectorized cell list spatial index over a fixed numpy.array[N,3] of
+    positions.  The positions are binned into cubic cells with edges of
+    length resolution and sorted by cell, so the points of each cell are a
+    contiguous run of the sorted order and a cell is found by a binary
+    search of the occupied cell keys.  All queries are answered in bulk with
+    numpy index arrays into the positions array.
+    """
+    def __init__(self, positions, resolution):
+        self.positions  = numpy.asarray(positions, float).reshape((-1, 3))
+        self.resolution = float(resolution)
+
+        num_points = len(self.positions)
+        if num_points == 0:
+            self.point_cells = numpy.zeros((0, 3), int)
+            self.cell_origin = numpy.zeros(3, int)
+            self.cell_dims   = numpy.zeros(3, int)
+            self.order       = numpy.zeros(0, int)
+            self.cell_keys   = numpy.zeros(0, int)
+            self.cell_start  = numpy.zeros(0, int)
+            self.cell_count  = numpy.zeros(0, int)
+            return
+
+        cells = numpy.floor(self.positions / self.resolution).astype(int)
+        self.cell_origin = cells.min(axis = 0)
+        cells -= self.cell_origin
+        self.cell_dims   = cells.max(axis = 0) + 1
+        self.point_cells = cells
+
+        keys = self.calc_cell_keys(cells)
+        self.order = numpy.argsort(keys, kind = "mergesort")
+        self.cell_keys, self.cell_start = numpy.unique(
+            keys[self.order], return_index = True)
+        self.cell_count = numpy.diff(
+            numpy.append(self.cell_start, num_points))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def calc_cell_keys(self, cells):
+        """Returns the integer keys of the (in bounds) cell coordinates in
+        the numpy.array[M,3] cells.
+        """
+        dims = self.cell_dims
+        return (cells[:,0] * dims[1] + cells[:,1]) * dims[2] + cells[:,2]
+
+    def calc_cells(self, positions):
+        """Returns the cell coordinates of the numpy.array[M,3] positions.
+        """
+        cells = numpy.floor(positions / self.resolution).astype(int)
+        return cells - self.cell_origin
+
+    def calc_offsets(self, radius, half = False):
+        """Returns the numpy.array[M,3] of cell offsets needed to reach all
+        points within radius of a point.  If half is True, only the offsets
+        lexicographically greater than (0,0,0) are returned, so each pair
+        of distinct cells is reached once.
+        """
+        m = int(math.ceil(radius / self.resolution))
+        r = numpy.arange(-m, m + 1)
+        offsets = numpy.array(
+            [(i, j, k) for i in r for j in r for k in r], int)
+        if half:
+            keep = ((offsets[:,0] > 0) |
+                    ((offsets[:,0] == 0) & (offsets[:,1] > 0)) |
+                    ((offsets[:,0] == 0) & (offsets[:,1] == 0) & (offsets[:,2] > 0)))
+            offsets = offsets[keep]
+        return offsets
+
+    def lookup_cells(self, cells):
+        """Returns the (start, count) arrays locating the points of each of
+        the cells in the sorted point order; count is 0 for empty or out of
+        bounds cells.
+        """
+        in_bounds = numpy.all((cells >= 0) & (cells < self.cell_dims), axis = 1)
+        keys = self.calc_cell_keys(cells)
+        pos = numpy.searchsorted(self.cell_keys, keys)
+        pos[pos >= len(self.cell_keys)] = 0
+        found = in_bounds & (self.cell_keys[pos] == keys)
+        start = numpy.where(found, self.cell_start[pos], 0)
+        count = numpy.where(found, self.cell_count[pos], 0)
+        return start, count
+
+    def iter_candidates(self, query_cells, offsets):
+        """Yields blocks of the (q, p) index arrays of the query cells and of
+        the points in the cells at each offset from them. The offsets are
+        processed in blocks of about CANDIDATE_BLOCK_SIZE cells, so a few
+        query cells are looked up with all offsets at once.
+        """
+        num_query = len(query_cells)
+        block_size = max(1, CANDIDATE_BLOCK_SIZE // max(1, num_query))
+
+        for k in xrange(0, len(offsets), block_size):
+            block = offsets[k:k + block_size]
+            cells = query_cells[:,numpy.newaxis,:] + block[numpy.newaxis,:,:]
+            query_index = numpy.repeat(numpy.arange(num_query), len(block))
+
+            start, count = self.lookup_cells(cells.reshape((-1, 3)))
+            total = count.sum()
+            if total == 0:
+                continue
+            q = numpy.repeat(query_index, count)
+            first = numpy.repeat(start - (numpy.cumsum(count) - count), count)
+            yield q, self.order[first + numpy.arange(total)]
+
+    def calc_neighbors(self, positions, radius):
+        """Returns the (q, p, d) arrays of all pairs of a query position
+        positions[q] and an indexed point p within distance radius of each
+        other, and their distances d.
+        """
+        positions = numpy.asarray(positions, float).reshape((-1, 3))
+        q_list, p_list, d_list = [], [], []
+        if len(self.positions) > 0 and len(positions) > 0:
+            query_cells = self.calc_cells(positions)
+            offsets = self.calc_offsets(radius)
+            for q, p in self.iter_candidates(query_cells, offsets):
+                d = numpy.sqrt(
+                    ((positions[q] - self.positions[p]) ** 2).sum(axis = 1))
+                keep = d <= radius
+                q_list.append(q[keep])
+                p_list.append(p[keep])
+                d_list.append(d[keep])
+        return self.concatenate(q_list, p_list, d_list)
+
+    def calc_sphere_intersection(self, position, radius):
+        """Returns the (p, d) arrays of the indexes of the points within
+        distance radius of position, and their distances.
+        """
+        q, p, d = self.calc_neighbors([position], radius)
+        return p, d
+
+    def calc_cube_intersection(self, position, radius):
+        """Returns the array of the indexes of the points inside the cube
+        with half edge length radius centered on position.
+        """
+        q, p, d = self.calc_neighbors([position], radius * math.sqrt(3.0))
+        delta = numpy.abs(self.positions[p] - numpy.asarray(position, float))
+        return p[numpy.all(delta <= radius, axis = 1)]
+
+    def calc_nearest(self, position, k):
+        """Returns the (p, d) arrays of the indexes and distances of the k
+        points nearest to position, from the nearest to the farthest.
+        """
+        k = min(k, len(self.positions))
+        radius = self.resolution
+        while True:
+            p, d = self.calc_sphere_intersection(position, radius)
+            if len(p) >= k:
+                order = numpy.argsort(d, kind = "mergesort")[:k]
+                return p[order], d[order]
+            radius *= 2.0
+
+    def calc_contact_pairs(self, distance):
+        """Returns the (i, j, d) arrays of all pairs of indexed points i < j
+        within distance of each other, and their distances d; each pair is
+        returned once, sorted by i and then j.
+        """
+        i_list, j_list, d_list = [], [], []
+        if len(self.positions) > 0:
+            cells = self.point_cells
+
+            ## pairs within one cell, then pairs in distinct cells
+            candidates = [(q[q < p], p[q < p]) for q, p in
+                          self.iter_candidates(cells, numpy.zeros((1, 3), int))]
+            candidates.extend(self.iter_candidates(
+                cells, self.calc_offsets(distance, half = True)))
+
+            for q, p in candidates:
+                d = numpy.sqrt(
+                    ((self.positions[q] - self.positions[p]) ** 2).sum(axis = 1))
+                keep = d <= distance
+                i_list.append(numpy.minimum(q[keep], p[keep]))
+                j_list.append(numpy.maximum(q[keep], p[keep]))
+                d_list.append(d[keep])
+
+        i, j, d = self.concatenate(i_list, j_list, d_list)
+        order = numpy.lexsort((j, i))
+        return i[order], j[order], d[order]
+
+    def concatenate(self, *array_lists):
+        """Concatenates each list of index or distance arrays.
+        """
+        arrays = []
+        for array_list in array_lists[:-1]:
+            if array_list:
+                arrays.append(numpy.concatenate(array_list))
+            else:
+                arrays.append(numpy.zeros(0, int))
+        if array_lists[-1]:
+            arrays.append(numpy.concatenate(array_lists[-1]))
+        else:
+            arrays.append(numpy.zeros(0, float))
+        return tuple(arrays)
+
 
 class XYZDict(object):
     """Hash all objects according to their position, allowing spacial
-    location of objects quickly.  This is a brain-dead simple implementation,
-    but it gets the job done.
+    location of objects quickly.  This is a thin wrapper around XYZIndex.
+    Each item has a slot in position_list and item_list, and the slots of
+    the items in each cube are listed in geom_dict.  Items added since the
+    index was built are found through geom_dict, and removed items have
+    their slot emptied and are left out of the query results, until they
+    are more than an eighth of the indexed items and the index is rebuilt.
     """
     def __init__(self, resolution):
-        self.resolution = resolution
-        self.geom_dict  = {}
+        self.resolution    = resolution
+        self.position_list = []
+        self.item_list     = []
+        self.geom_dict     = {}
+
+        ## the index of the positions of the first num_indexed slots, and
+        ## the slots emptied since it was built
+        self.xyz_index     = None
+        self.num_indexed   = 0
+        self.removed       = set()
 
     def calc_geom_key(self, position):
         """Calculates the cube key for the given position.
@@ -28,110 +243,168 @@ class XYZDict(object):
         return ( int(position[0] / res),
                  int(position[1] / res),
                  int(position[2] / res) )
+
+    def add_slot(self, slot, position):
+        geom_key = self.calc_geom_key(position)
+        try:
+            self.geom_dict[geom_key].append(slot)
+        except KeyError:
+            self.geom_dict[geom_key] = [slot]
         
     def add(self, position, item):
         """Add a item.
         """
-        res = self.resolution
-        
-        geom_key = ( int(position[0] / res),
-                     int(position[1] / res),
-                     int(position[2] / res) )
-
-        geom_tuple = (position, item)
-
-        if self.geom_dict.has_key(geom_key):
-            self.geom_dict[geom_key].append(geom_tuple)
-        else:
-            self.geom_dict[geom_key] = [geom_tuple]
+        self.add_slot(len(self.item_list), position)
+        self.position_list.append(position)
+        self.item_list.append(item)
 
     def remove(self, position, item):
         """Remove an item.
         """
-        geom_key   = self.calc_geom_key(position)
+        geom_key = self.calc_geom_key(position)
 
         try:
-            geom_list = self.geom_dict[geom_key]
+            slots = self.geom_dict[geom_key]
         except KeyError:
             pass
         else:
-            for geom_tuple in geom_list:
-                if geom_tuple[1]==item:
-                    geom_list.remove(geom_tuple)
+            for slot in slots:
+                if self.item_list[slot] == item:
+                    slots.remove(slot)
+                    if not slots:
+                        del self.geom_dict[geom_key]
+                    self.position_list[slot] = None
+                    self.item_list[slot] = None
+                    self.removed.add(slot)
                     return
 
         raise ValueError, "GeometryDict.remove(x) x not in GeometryDict"
 
-    def iter_all(self):
-        """Iter all items
+    def rebuild_xyz_index(self):
+        """Drops the emptied slots, and indexes the positions of all the
+        items.
         """
-        for geom_list in self.geom_dict.values():
-            for geom_tuple in geom_list:
-                yield geom_tuple
+        if self.removed:
+            slots = [slot for slot in xrange(len(self.item_list))
+                     if slot not in self.removed]
+            self.position_list = [self.position_list[slot] for slot in slots]
+            self.item_list = [self.item_list[slot] for slot in slots]
+            self.removed = set()
+            self.geom_dict = {}
+            for slot, position in enumerate(self.position_list):
+                self.add_slot(slot, position)
 
-    def iter_cube_intersection(self, position, radius):
-        """Iterate all objects which intersect the cube in no particular
-        order.
+        self.xyz_index = XYZIndex(self.position_list, self.resolution)
+        self.num_indexed = len(self.position_list)
+
+    def get_xyz_index(self):
+        """Returns the XYZIndex of the positions of the first num_indexed
+        slots, building it on first use and again once the items added or
+        removed since it was built are more than an eighth of it.
         """
-        center_geom_key = self.calc_geom_key(position)
+        num_changed = len(self.item_list) - self.num_indexed + len(self.removed)
+        if self.xyz_index is None or num_changed > max(64, self.num_indexed // 8):
+            self.rebuild_xyz_index()
+        return self.xyz_index
+
+    def iter_added_slots(self, position, radius):
+        """Iterates over the slots of the items added since the index was
+        built, at least those in the cubes reaching within radius of
+        position.
+        """
+        num_indexed = self.num_indexed
+        num_slots = len(self.item_list)
         bounding_cube_blocks = int(radius / self.resolution) + 1
+        blocks = xrange(-bounding_cube_blocks, bounding_cube_blocks + 1)
 
-        for i in xrange(-bounding_cube_blocks, bounding_cube_blocks+1):
-            for j in xrange(-bounding_cube_blocks, bounding_cube_blocks+1):
-                for k in xrange(-bounding_cube_blocks, bounding_cube_blocks+1):
+        ## look through the added slots themselves if there are fewer of
+        ## them than cubes
+        if num_slots - num_indexed <= len(blocks) ** 3:
+            removed = self.removed
+            for slot in xrange(num_indexed, num_slots):
+                if slot not in removed:
+                    yield slot
+            return
 
+        center_geom_key = self.calc_geom_key(position)
+
+        for i in blocks:
+            for j in blocks:
+                for k in blocks:
                     geom_key = ( center_geom_key[0] + i,
                                  center_geom_key[1] + j,
                                  center_geom_key[2] + k )
-                    
-                    try:
-                        geom_list = self.geom_dict[geom_key]
-                    except KeyError:
-                        continue
+                    for slot in self.geom_dict.get(geom_key, ()):
+                        if slot >= num_indexed:
+                            yield slot
 
-                    for geom_tuple in geom_list:
-                        yield geom_tuple
+    def live_slots(self, slots):
+        """Returns the list of the indexed slots of the array returned by a
+        query of the index, leaving out the emptied ones.
+        """
+        removed = self.removed
+        if not removed:
+            return slots.tolist()
+        return [slot for slot in slots.tolist() if slot not in removed]
+
+    def iter_all(self):
+        """Iter all items
+        """
+        removed = self.removed
+        for slot, geom_tuple in enumerate(
+                itertools.izip(self.position_list, self.item_list)):
+            if slot not in removed:
+                yield geom_tuple
+
+    def iter_cube_intersection(self, position, radius):
+        """Iterate all objects which intersect the cube in no particular
+        order.
+        """
+        slots = self.get_xyz_index().calc_cube_intersection(position, radius)
+        for slot in self.live_slots(slots):
+            yield self.position_list[slot], self.item_list[slot]
+
+        for slot in self.iter_added_slots(position, radius):
+            ipos = self.position_list[slot]
+            if abs(ipos[0] - position[0]) <= radius and \
+               abs(ipos[1] - position[1]) <= radius and \
+               abs(ipos[2] - position[2]) <= radius:
+                yield ipos, self.item_list[slot]
 
     def iter_sphere_intersection(self, position, radius):
         """Iterate all objects which intersect the cube in no particular
         order.
         """
-        for geom_tuple in self.iter_cube_intersection(position, radius):
-            ipos = geom_tuple[0]
+        p, d = self.get_xyz_index().calc_sphere_intersection(position, radius)
+        for slot in self.live_slots(p):
+            yield self.position_list[slot], self.item_list[slot]
 
+        for slot in self.iter_added_slots(position, radius):
+            ipos = self.position_list[slot]
             x = ipos[0] - position[0]
             y = ipos[1] - position[1]
             z = ipos[2] - position[2]
-            d = math.sqrt(x*x + y*y + z*z)
-
-            if d <= radius:
-                yield geom_tuple
+            if math.sqrt(x*x + y*y + z*z) <= radius:
+                yield ipos, self.item_list[slot]
         
     def iter_contact_distance(self, distance):
         """Iterates all items within a given contact distance.
         """
-        visited = {}
-
-        for geom_tuple1 in self.iter_all():
-            visited[geom_tuple1[1]] = True
-
-            for geom_tuple2 in self.iter_cube_intersection(
-                geom_tuple1[0], distance):
-
-                if visited.has_key(geom_tuple2[1]):
-                    continue
-
-                p1 = geom_tuple1[0]
-                p2 = geom_tuple2[0]
-
-                d = math.sqrt((p1[0]-p2[0])**2 + \
-                              (p1[1]-p2[1])**2 + \
-                              (p1[2]-p2[2])**2)
-
-                if d>distance:
-                    continue
+        ## all the pairs are searched, so index all the items; a cell at
+        ## least as large as the contact distance keeps the search to the
+        ## 27 neighboring cells
+        if self.xyz_index is None or self.removed or \
+           self.num_indexed < len(self.item_list):
+            self.rebuild_xyz_index()
+        xyz_index = self.xyz_index
+        if xyz_index.resolution < distance:
+            xyz_index = XYZIndex(xyz_index.positions, distance)
 
-                yield geom_tuple1, geom_tuple2, d
+        i, j, d = xyz_index.calc_contact_pairs(distance)
+        for i, j, d in itertools.izip(i.tolist(), j.tolist(), d.tolist()):
+            yield ((self.position_list[i], self.item_list[i]),
+                   (self.position_list[j], self.item_list[j]),
+                   d)
                 
 
 ### <testing>
@@ -8,6 +8,7 @@ for the identification and construction of biopolymers and ligands.
 import os
 import sys
 import types
+import cPickle
 
 import ConsoleOutput
 import mmCIF
@@ -26,18 +27,45 @@ ELEMENT_DATA_PATH       = os.path.join(MMLIB_PATH, "Data", "elements.cif")
 MMLIB_MONOMER_DATA_PATH = os.path.join(MMLIB_PATH, "Data", "monomers.cif")
 RCSB_MONOMER_DATA_FILE  = os.path.join(MMLIB_PATH, "Data", "Monomers.zip") 
 RCSB_MONOMER_DATA_PATH  = os.path.join(MMLIB_PATH, "Data", "Monomers") 
+MONOMER_CACHE_PATH      = os.path.join(MMLIB_PATH, "Data", "MonomerCache")
 
 ###############################################################################
 ## Caches
 ##
 ELEMENT_CACHE          = {}
-MONOMER_RES_NAME_CACHE = {}
 
-ELEMENT_CIF_FILE = mmCIF.mmCIFFile()
-ELEMENT_CIF_FILE.load_file(open(ELEMENT_DATA_PATH, "r"))
+## MonomerDesc objects keyed by residue name; residue names without a
+## monomer description are cached as None
+MONOMER_RES_NAME_CACHE = {}
 
-MMLIB_MONOMERS_CIF = mmCIF.mmCIFFile()
-MMLIB_MONOMERS_CIF.load_file(open(MMLIB_MONOMER_DATA_PATH, "r"))
+## compiled MonomerDesc objects are pickled to MONOMER_CACHE_PATH so the
+## monomer library mmCIF files are parsed once per install; each cache file
+## holds the descriptions built from one monomer library file, by residue
+## name
+MONOMER_CACHE_VERSION = 2
+
+## residue class index: maps residue names to the tuple
+## (amino_acid, nucleic_acid, water, one_letter_code), or to None if the
+## residue is not in the monomer library; the entries are read from the
+## chem_comp table of the monomer library files only, and persisted by
+## monomer library file name with their cache headers in
+## MONOMER_CACHE_PATH/RESIDUE_CLASS_INDEX_FILE
+RESIDUE_CLASS_CACHE      = {}
+RESIDUE_CLASS_INDEX      = None
+RESIDUE_CLASS_INDEX_FILE = "residue_class_index.pickle"
+
+## memo of library_guess_element_from_name() keyed by (atom name, residue
+## name); it is emptied when it grows to ELEMENT_GUESS_CACHE_SIZE entries
+ELEMENT_GUESS_CACHE       = {}
+ELEMENT_GUESS_CACHE_SIZE  = 20000
+ELEMENT_GUESS_CACHE_STATS = {"hits": 0, "misses": 0}
+
+## the library mmCIF files are not parsed at import; their data blocks are
+## read on first use from a precompiled cache file written next to the
+## source file, and kept here keyed by source path
+LIBRARY_CIF_CACHE_EXT     = ".cache"
+LIBRARY_CIF_CACHE_VERSION = 1
+LIBRARY_CIF_BLOCKS        = {}
 
 RCSB_USE_ZIP = None
 RCSB_ZIP = None
@@ -256,10 +284,125 @@ class MonomerDesc(object):
 ## Library API
 ##
 
+def library_compile_cif_blocks(path):
+    """Parses the mmCIF file at path and returns its data blocks as a
+    dictionary mapping the lower case block name to a (name, table_list)
+    tuple, where each table is a (name, columns, rows) tuple and each row a
+    tuple of values in column order.
+    """
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(open(path, "r"))
+
+    blocks = {}
+    for cif_data in cif_file:
+        table_list = []
+        for cif_table in cif_data:
+            clower_list = [column.lower() for column in cif_table.columns]
+            rows = [tuple([cif_row.get_lower(clower) for clower in clower_list])
+                    for cif_row in cif_table]
+            table_list.append((cif_table.name, tuple(cif_table.columns), rows))
+        blocks[cif_data.name.lower()] = (cif_data.name, table_list)
+    return blocks
+
+
+def library_read_cache(cache_path, header):
+    """Returns the object pickled in the cache file at cache_path if the
+    file exists and was written with the given header, otherwise returns
+    None.
+    """
+    try:
+        fil = open(cache_path, "rb")
+        try:
+            if cPickle.load(fil) == header:
+                return cPickle.load(fil)
+        finally:
+            fil.close()
+    except (IOError, EOFError, cPickle.UnpicklingError, ValueError,
+            TypeError, AttributeError, ImportError):
+        pass
+    return None
+
+
+def library_write_cache(cache_path, header, obj):
+    """Pickles header and obj to the cache file at cache_path. The file is
+    written to a temporary file and renamed into place, so concurrent
+    readers never see a partial cache. Caches which cannot be written are
+    silently skipped.
+    """
+    tmp_path = "%s.%d" % (cache_path, os.getpid())
+    try:
+        fil = open(tmp_path, "wb")
+        try:
+            cPickle.dump(header, fil, 2)
+            cPickle.dump(obj, fil, 2)
+        finally:
+            fil.close()
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def library_load_cif_blocks(path):
+    """Returns the compiled data blocks of the mmCIF file at path. They are
+    read from the cache file path + LIBRARY_CIF_CACHE_EXT when its header
+    matches the cache version and the size and modification time of the
+    source file; otherwise the source is parsed and the cache rewritten.
+    """
+    stat = os.stat(path)
+    header = (LIBRARY_CIF_CACHE_VERSION, stat.st_size, stat.st_mtime)
+    cache_path = path + LIBRARY_CIF_CACHE_EXT
+
+    blocks = library_read_cache(cache_path, header)
+    if blocks is None:
+        blocks = library_compile_cif_blocks(path)
+        library_write_cache(cache_path, header, blocks)
+    return blocks
+
+
+def library_get_cif_blocks(path):
+    """Loads/caches/returns the compiled data blocks of the mmCIF file at
+    path; see library_load_cif_blocks().
+    """
+    try:
+        return LIBRARY_CIF_BLOCKS[path]
+    except KeyError:
+        pass
+
+    blocks = library_load_cif_blocks(path)
+    LIBRARY_CIF_BLOCKS[path] = blocks
+    return blocks
+
+
+def library_get_cif_data(path, name):
+    """Returns a new mmCIFData object holding the data block with the given
+    (case insensitive) name from the library mmCIF file at path. Returns
+    None if no such data block exists.
+    """
+    try:
+        data_name, table_list = library_get_cif_blocks(path)[name.lower()]
+    except KeyError:
+        return None
+
+    cif_data = mmCIF.mmCIFData(data_name)
+    for table_name, columns, rows in table_list:
+        cif_table = mmCIF.mmCIFTable(table_name, list(columns))
+        for values in rows:
+            cif_row = mmCIF.mmCIFRow()
+            for column, value in zip(columns, values):
+                if value is not None:
+                    cif_row[column] = value
+            cif_table.append(cif_row)
+        cif_data.append(cif_table)
+    return cif_data
+
+
 def library_construct_element_desc(symbol):
     """Constructs the ElementDesc object for the given element symbol.
     """
-    cif_data = ELEMENT_CIF_FILE.get_data(symbol)
+    cif_data = library_get_cif_data(ELEMENT_DATA_PATH, symbol)
     if cif_data is None:
         ConsoleOutput.warning("element description not found for %s" % (symbol))
         return None
@@ -368,6 +511,14 @@ def library_open_monomer_lib_file(monomer_name):
     return libfil
 
 
+def library_monomer_lookup_name(res_name):
+    """Returns the name of the monomer library file for the residue name.
+    """
+    if ALT_RES_NAME_DICT.has_key(res_name):
+        return ALT_RES_NAME_DICT[res_name]
+    return res_name.upper()
+
+
 def library_construct_monomer_desc(res_name):
     """Constructs the MonomerDesc object for the given residue name.
     """
@@ -375,10 +526,7 @@ def library_construct_monomer_desc(res_name):
     if len(res_name) < 1:
         return None
 
-    if ALT_RES_NAME_DICT.has_key(res_name):
-        lookup_name = ALT_RES_NAME_DICT[res_name]
-    else:
-        lookup_name = res_name.upper()
+    lookup_name = library_monomer_lookup_name(res_name)
 
     libfil = library_open_monomer_lib_file(lookup_name)
     if libfil is None:
@@ -387,13 +535,15 @@ def library_construct_monomer_desc(res_name):
 
     ## generate monomer description    
     mon_desc = MonomerDesc()
-    ## data from RCSB library
+    ## data from RCSB library; only the tables used here are parsed
     rcsb_cif_file = mmCIF.mmCIFFile()
-    rcsb_cif_file.load_file(libfil)
+    rcsb_cif_file.load_file(libfil, lazy = True)
     rcsb_cif_data = rcsb_cif_file[0]
+    chem_comp = rcsb_cif_data.get_table("chem_comp")[0]
+    chem_comp_atom = rcsb_cif_data.get_table("chem_comp_atom")
+    chem_comp_bond = rcsb_cif_data.get_table("chem_comp_bond")
     libfil.close()
 
-    chem_comp = rcsb_cif_data.get_table("chem_comp")[0]
     mon_desc.res_name     = chem_comp.get_lower("res_name")
     mon_desc.full_name    = chem_comp.get_lower("name")
     mon_desc.type         = chem_comp.get_lower("type")
@@ -401,7 +551,6 @@ def library_construct_monomer_desc(res_name):
     mon_desc.formula      = chem_comp.get_lower("formula")
     mon_desc.rcsb_class_1 = chem_comp.get_lower("rcsb_class_1")
 
-    chem_comp_atom = rcsb_cif_data.get_table("chem_comp_atom")
     if chem_comp_atom is not None:
         for cif_row in chem_comp_atom:
             name = cif_row.getitem_lower("atom_id")
@@ -425,7 +574,6 @@ def library_construct_monomer_desc(res_name):
             else:
                 mon_desc.alt_atom_dict[name] = alt_name
 
-    chem_comp_bond = rcsb_cif_data.get_table("chem_comp_bond")
     if chem_comp_bond is not None:
         for cif_row in chem_comp_bond:
             atom1 = cif_row.getitem_lower("atom_id_1")
@@ -433,7 +581,7 @@ def library_construct_monomer_desc(res_name):
             mon_desc.bond_list.append({"atom1": atom1, "atom2": atom2}) 
 
     ## data from mmLib supplemental library in mmLib/Data/monomers.cif
-    mmlib_cif_data = MMLIB_MONOMERS_CIF.get_data(res_name)
+    mmlib_cif_data = library_get_cif_data(MMLIB_MONOMER_DATA_PATH, res_name)
     if mmlib_cif_data is not None:
         ## get additional chemical information on amino acids
         chem_comp = mmlib_cif_data.get_table("chem_comp")
@@ -450,19 +598,91 @@ def library_construct_monomer_desc(res_name):
                     cif_row["atom3"], cif_row["atom4"])
 
     ## set some derived flags on the monomer description
-    mon_type = mon_desc.type.upper()
+    (mon_desc.amino_acid,
+     mon_desc.nucleic_acid,
+     mon_desc.water) = library_monomer_type_flags(mon_desc.type)
+
+    return mon_desc
+
+
+def library_monomer_type_flags(mon_type):
+    """Returns the (amino_acid, nucleic_acid, water) flags of a monomer with
+    the given chem_comp type.
+    """
+    mon_type = mon_type.upper()
 
     if mon_type == "L-PEPTIDE LINKING":
-        mon_desc.amino_acid = True
+        return True, False, False
 
     elif mon_type == "DNA LINKING" or mon_type == "RNA LINKING":
-        mon_desc.nucleic_acid = True
+        return False, True, False
 
     elif mon_type == "HOH" or mon_type == "WAT":
-        mon_desc.water = True
+        return False, False, True
+
+    return False, False, False
+
+def library_monomer_cache_header(lookup_name):
+    """Returns the header of the compiled monomer cache file for the
+    monomer library file lookup_name. It records the size and modification
+    time of every source a MonomerDesc is built from, so a cached
+    description goes stale when any of them changes.
+    """
+    fil_name = "%s.cif" % (lookup_name)
+    stat_list = []
+    for path in (os.path.join(RCSB_MONOMER_DATA_PATH, fil_name[0], fil_name),
+                 RCSB_MONOMER_DATA_FILE,
+                 MMLIB_MONOMER_DATA_PATH):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat_list.append(None)
+        else:
+            stat_list.append((stat.st_size, stat.st_mtime))
+    return (MONOMER_CACHE_VERSION, tuple(stat_list))
 
+
+def library_load_monomer_desc(res_name):
+    """Returns the MonomerDesc for the given residue name from the compiled
+    monomer cache in MONOMER_CACHE_PATH, constructing and caching it with
+    library_construct_monomer_desc() if it is not cached or stale. Only
+    found monomers are written to the compiled cache.
+    """
+    if len(res_name) < 1:
+        return None
+
+    lookup_name = library_monomer_lookup_name(res_name)
+
+    ## only plain residue names map to safe cache file names
+    if not lookup_name.isalnum():
+        return library_construct_monomer_desc(res_name)
+
+    ## the descriptions are keyed by res_name within the cache file of the
+    ## library file because the torsion angles and one letter code are
+    ## looked up in monomers.cif by residue name, not library file name
+    header = library_monomer_cache_header(lookup_name)
+    cache_path = os.path.join(MONOMER_CACHE_PATH, "%s.pickle" % (lookup_name))
+
+    mon_desc_dict = library_read_cache(cache_path, header) or {}
+    try:
+        return mon_desc_dict[res_name]
+    except KeyError:
+        pass
+
+    mon_desc = library_construct_monomer_desc(res_name)
+    if mon_desc is None:
+        return None
+    mon_desc_dict[res_name] = mon_desc
+
+    if not os.path.isdir(MONOMER_CACHE_PATH):
+        try:
+            os.makedirs(MONOMER_CACHE_PATH)
+        except OSError:
+            pass
+    library_write_cache(cache_path, header, mon_desc_dict)
     return mon_desc
 
+
 def library_get_monomer_desc(res_name):
     """Loads/caches/returns the monomer description objec MonomerDesc
     for the given monomer residue name.
@@ -474,48 +694,162 @@ def library_get_monomer_desc(res_name):
     except KeyError:
         pass
 
-    mon_desc = library_construct_monomer_desc(res_name)
-    if mon_desc is None:
-        return None
-
+    mon_desc = library_load_monomer_desc(res_name)
     MONOMER_RES_NAME_CACHE[res_name] = mon_desc
     return mon_desc
 
 
-def library_is_amino_acid(res_name):
-    """Returns True if the res_name is an amino acid.
+def library_iter_chem_comp_lines(libfil):
+    """Iterates the lines of the monomer library mmCIF file object libfil
+    up to the end of its chem_comp table, skipping the atom and bond tables.
+    """
+    in_chem_comp = False
+    in_text = False
+    for ln in libfil:
+        if ln.startswith(";"):
+            in_text = not in_text
+        elif not in_text:
+            if ln.startswith("_chem_comp."):
+                in_chem_comp = True
+            elif in_chem_comp and (ln.startswith("_") or ln.startswith("loop_")):
+                return
+        yield ln
+
+
+def library_construct_residue_class(res_name):
+    """Constructs the residue class tuple (amino_acid, nucleic_acid, water,
+    one_letter_code) for the given residue name from the chem_comp tables
+    of the monomer library and mmLib/Data/monomers.cif. Returns None if the
+    residue is not in the monomer library.
+    """
+    if len(res_name) < 1:
+        return None
+
+    lookup_name = library_monomer_lookup_name(res_name)
+
+    libfil = library_open_monomer_lib_file(lookup_name)
+    if libfil is None:
+        return None
+
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(library_iter_chem_comp_lines(libfil))
+    libfil.close()
+
+    mon_type = cif_file[0].get_table("chem_comp")[0].get_lower("type")
+    amino_acid, nucleic_acid, water = library_monomer_type_flags(mon_type)
+
+    one_letter_code = None
+    mmlib_cif_data = library_get_cif_data(MMLIB_MONOMER_DATA_PATH, res_name)
+    if mmlib_cif_data is not None:
+        chem_comp = mmlib_cif_data.get_table("chem_comp")
+        if chem_comp is not None:
+            one_letter_code = chem_comp["one_letter_code"]
+
+    return (amino_acid, nucleic_acid, water, one_letter_code)
+
+
+def library_load_residue_class(res_name):
+    """Returns the residue class tuple for the given residue name from the
+    persistent residue class index, constructing it and adding it to the
+    index if it is missing or stale. Unlike the compiled monomer cache,
+    the index also records residues missing from the monomer library;
+    their cache header changes when a library file for them appears.
+    """
+    global RESIDUE_CLASS_INDEX
+
+    if len(res_name) < 1:
+        return None
+
+    lookup_name = library_monomer_lookup_name(res_name)
+    if not lookup_name.isalnum():
+        return library_construct_residue_class(res_name)
+
+    index_path = os.path.join(MONOMER_CACHE_PATH, RESIDUE_CLASS_INDEX_FILE)
+    if RESIDUE_CLASS_INDEX is None:
+        RESIDUE_CLASS_INDEX = library_read_cache(
+            index_path, MONOMER_CACHE_VERSION) or {}
+
+    ## the key includes res_name as well because the one letter code is
+    ## looked up in monomers.cif by residue name, not library file name
+    key = (lookup_name, res_name)
+    header = library_monomer_cache_header(lookup_name)
+    try:
+        entry_header, res_class = RESIDUE_CLASS_INDEX[key]
+    except KeyError:
+        pass
+    else:
+        if entry_header == header:
+            return res_class
+
+    res_class = library_construct_residue_class(res_name)
+    RESIDUE_CLASS_INDEX[key] = (header, res_class)
+
+    if not os.path.isdir(MONOMER_CACHE_PATH):
+        try:
+            os.makedirs(MONOMER_CACHE_PATH)
+        except OSError:
+            pass
+    library_write_cache(index_path, MONOMER_CACHE_VERSION, RESIDUE_CLASS_INDEX)
+    return res_class
+
+
+def library_get_residue_class(res_name):
+    """Loads/caches/returns the residue class tuple
+    (amino_acid, nucleic_acid, water, one_letter_code) for the given residue
+    name, or None if it is not in the monomer library. Use this instead of
+    library_get_monomer_desc() when the atom, bond and torsion angle
+    definitions are not needed.
     """
     assert isinstance(res_name, str)
 
-    mdesc = library_get_monomer_desc(res_name)
-    if mdesc is None:
+    try:
+        return RESIDUE_CLASS_CACHE[res_name]
+    except KeyError:
+        pass
+
+    res_class = library_load_residue_class(res_name)
+    RESIDUE_CLASS_CACHE[res_name] = res_class
+    return res_class
+
+
+def library_is_amino_acid(res_name):
+    """Returns True if the res_name is an amino acid.
+    """
+    res_class = library_get_residue_class(res_name)
+    if res_class is None:
         return False
 
-    return mdesc.is_amino_acid()
+    return res_class[0]
 
 
 def library_is_nucleic_acid(res_name):
     """Returns True if the res_name is a nucleic acid.
     """
-    assert isinstance(res_name, str)
-
-    mdesc = library_get_monomer_desc(res_name)
-    if mdesc is None:
+    res_class = library_get_residue_class(res_name)
+    if res_class is None:
         return False
 
-    return mdesc.is_nucleic_acid()
+    return res_class[1]
 
 
 def library_is_standard_residue(res_name):
     """Returns True if the res_name is a standard amino or nucleic acid.
     """
-    assert isinstance(res_name, str)
-
-    mdesc = library_get_monomer_desc(res_name)
-    if mdesc is None:
+    res_class = library_get_residue_class(res_name)
+    if res_class is None:
         return False
 
-    return mdesc.is_standard_residue()
+    return res_class[0] or res_class[1]
+
+
+def library_get_one_letter_code(res_name):
+    """Returns the one letter code of the res_name, or None if it has none.
+    """
+    res_class = library_get_residue_class(res_name)
+    if res_class is None:
+        return None
+
+    return res_class[3]
 
 
 def library_is_water(res_name):
@@ -532,13 +866,49 @@ def library_is_water(res_name):
 def library_guess_element_from_name(name0, res_name):
     """Try everything we can possibly think of to extract the element
     symbol from the atom name. If available, use the monomer dictionary to
-    help narrow down the search.
+    help narrow down the search. Results are memoized in
+    ELEMENT_GUESS_CACHE.
+    """
+    key = (name0, res_name)
+    try:
+        (symbol, msg) = ELEMENT_GUESS_CACHE[key]
+    except KeyError:
+        ELEMENT_GUESS_CACHE_STATS["misses"] += 1
+        (symbol, msg) = guess_element_from_name(name0, res_name)
+        if len(ELEMENT_GUESS_CACHE) >= ELEMENT_GUESS_CACHE_SIZE:
+            ELEMENT_GUESS_CACHE.clear()
+        ELEMENT_GUESS_CACHE[key] = (symbol, msg)
+    else:
+        ELEMENT_GUESS_CACHE_STATS["hits"] += 1
+
+    ## repeat the warning for every atom, as the uncached guess did
+    if msg is not None:
+        ConsoleOutput.warning(msg)
+
+    return symbol
+
+
+def library_guess_element_cache_info():
+    """Returns a dictionary with the number of hits and misses of the
+    library_guess_element_from_name() memo, and its current size.
+    """
+    return {"hits":   ELEMENT_GUESS_CACHE_STATS["hits"],
+            "misses": ELEMENT_GUESS_CACHE_STATS["misses"],
+            "size":   len(ELEMENT_GUESS_CACHE)}
+
+
+def guess_element_from_name(name0, res_name):
+    """Uncached library_guess_element_from_name(). Returns a 2-tuple of
+    the element symbol, or None, and the warning message to issue for the
+    atom, or None.
     """
     ## strip any space from the name, and return now if there
     ## is nothing left to work with
     name = name0.strip()
     if name == "":
-        return None
+        return None, None
+
+    msg = None
 
     if name0 != res_name:
         ## try the easy way out -- look up the atom in the monomer dictionary
@@ -547,15 +917,14 @@ def library_guess_element_from_name(name0, res_name):
             if mdesc.atom_dict.has_key(name):
                 symbol = mdesc.atom_dict[name]
                 if symbol is not None:
-                    return symbol
+                    return symbol, None
 
             if mdesc.is_amino_acid() and name == "OXT":
-                return "O"
+                return "O", None
 
             if mdesc.is_amino_acid():
                 msg = "invalid amino acid atom name '%s' in residue '%s'" % (
                     name, res_name)
-                ConsoleOutput.warning(msg)
 
     ## okay, that didn't work...
 
@@ -576,7 +945,7 @@ def library_guess_element_from_name(name0, res_name):
     ## e1 is the possible one-character symbol
     ## e2 is the possible two-character symbol
     if len(alpha_name) == 0:
-        return None
+        return None, msg
 
     e1_symbol = alpha_name[0]
     e1_valid  = ELEMENT_SYMBOL_DICT.has_key(e1_symbol)
@@ -592,13 +961,13 @@ def library_guess_element_from_name(name0, res_name):
     ## there's just no possible element symbol contained in the atom
     ## name
     if e1_valid == False and e2_valid == False:
-        return None
+        return None, msg
 
     elif e1_valid == True and e2_valid == False:
-        return e1_symbol
+        return e1_symbol, msg
 
     elif e1_valid == False and e2_valid == True:
-        return e2_symbol
+        return e2_symbol, msg
 
     ## if we get here, then e1 and e2 are both valid elements
 
@@ -606,22 +975,21 @@ def library_guess_element_from_name(name0, res_name):
     ## before the atom name, then use the 1-char element symbol;
     ## if there is no space, then use the 2-char element symbol
     if space_flag == True:
-        return e1_symbol
+        return e1_symbol, msg
 
-    return e2_symbol
+    return e2_symbol, msg
 
 
 ## <TESTING>
 def test_module():
     h = library_get_element_desc("H")
 
-    for cif_data in ELEMENT_CIF_FILE:
-        if len(cif_data.name) == 1:
-            print '    "%s" : True, "%s" : True,' % (
-                cif_data.name, cif_data.name.lower())
+    for name, table_list in library_get_cif_blocks(ELEMENT_DATA_PATH).values():
+        if len(name) == 1:
+            print '    "%s" : True, "%s" : True,' % (name, name.lower())
         else:
             print '    "%s": True, "%s": True, "%s": True,' % (
-                cif_data.name, cif_data.name.lower(), cif_data.name.upper())
+                name, name.lower(), name.upper())
 
 if __name__ == "__main__":
     test_module()
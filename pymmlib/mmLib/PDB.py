@@ -10,6 +10,19 @@ and written back out as PDB files.
 from __future__ import generators
 import fpformat
 
+try:
+    import numpy
+except ImportError:
+    import NumericCompat as numpy
+
+## the optional C accelerator built from src/pdbmodule.c
+try:
+    import pdbmodule
+except ImportError:
+    PDBMODULE_EXISTS = False
+else:
+    PDBMODULE_EXISTS = hasattr(pdbmodule, "read_record")
+
 
 class PDBError(Exception):
     """
@@ -40,6 +53,12 @@ class PDBRecord(dict):
         """Return a properly formed PDB record string from the instance
         dictionary values.
         """
+        return pdb_record_format(self.__class__).write(self)
+
+    def write_field_list(self):
+        """Field by field version of write(), used for the records the
+        compiled PDBRecordFormat template cannot format.
+        """
         ln = self._name
 
         for (field, start, end, ftype, just, get_func) in self._field_list:
@@ -107,34 +126,7 @@ class PDBRecord(dict):
         """Read the PDB record line and convert the fields to the appropriate
         dictionary values for this class.
         """
-        for (field, start, end, ftype, just, get_func) in self._field_list:
-            s = line[start-1:end]
-
-            ## ignore blank fields
-            if s == "" or s.isspace():
-                continue
-
-            elif ftype.startswith("string"):
-                if just.endswith("lstrip"):
-                    s = s.lstrip()
-                elif just.endswith("rstrip"):
-                    s = s.rstrip()
-                else:
-                    s = s.strip()
-
-            elif ftype.startswith("integer"):
-                try:
-                    s = int(s)
-                except ValueError:
-                    continue
-
-            elif ftype.startswith("float"):
-                try:
-                    s = float(s)
-                except ValueError:
-                    continue
-
-            self[field] = s
+        pdb_record_format(self.__class__).read(self, line)
 
     def reccat(self, rec_list, field):
         """Return the concatenation of field in all the records in rec_list.
@@ -1518,9 +1510,203 @@ PDBRecordOrder = [
 ## END PDB RECORD DEFINITIONS
 ###############################################################################
 
+## field conversion codes shared with pdbmodule.read_record(); they
+## encode the ftype/just handling of PDBRecord.read()
+PDB_CODEC_STRIP   = 0
+PDB_CODEC_LSTRIP  = 1
+PDB_CODEC_RSTRIP  = 2
+PDB_CODEC_INTEGER = 3
+PDB_CODEC_FLOAT   = 4
+
+def pdb_field_codec(ftype, just):
+    """Returns the PDB_CODEC_* conversion code PDBRecord.read() applies
+    to a field with the given type and justification strings.
+    """
+    if ftype.startswith("integer"):
+        return PDB_CODEC_INTEGER
+    elif ftype.startswith("float"):
+        return PDB_CODEC_FLOAT
+    elif ftype.startswith("string"):
+        if just.endswith("lstrip"):
+            return PDB_CODEC_LSTRIP
+        elif just.endswith("rstrip"):
+            return PDB_CODEC_RSTRIP
+        return PDB_CODEC_STRIP
+    raise PDBError("unknown field type %s" % (ftype))
+
+def pdb_record_codec_map():
+    """Returns a dictionary mapping PDB record names to a 2-tuple of
+    the record class and a tuple of (field, start, end, codec) tuples
+    for pdbmodule.read_record().
+    """
+    codec_map = {}
+    for (rec_name, rec_class) in PDBRecordMap.iteritems():
+        fields = tuple([(field, start, end, pdb_field_codec(ftype, just))
+                        for (field, start, end, ftype, just, get_func)
+                        in rec_class._field_list])
+        codec_map[rec_name] = (rec_class, fields)
+    return codec_map
+
+PDBRecordCodecMap = pdb_record_codec_map()
+
+def pdb_format_float(x, digits):
+    """Returns the same string as fpformat.fix(x, digits). Python floats
+    of a magnitude that fits a PDB field are formatted with the % operator,
+    except when their repr() ends in a 5 exactly one digit past the
+    rounding position; fpformat rounds those halfway cases up from the
+    decimal string, while the % operator rounds the binary value.
+    """
+    if isinstance(x, float) and -1e8 < x < 1e8:
+        r = repr(x)
+        i = r.find(".")
+        if i != -1 and "e" not in r:
+            if len(r) - i - 1 != digits + 1 or r[-1] != "5":
+                return "%.*f" % (digits, x)
+    return fpformat.fix(x, digits)
+
+
+class PDBRecordFormat(object):
+    """The _field_list of a PDBRecord class compiled once into the field
+    conversions used by PDBRecord.read() and a single % format template
+    used by PDBRecord.write().
+    """
+    conversions = {
+        PDB_CODEC_STRIP:   str.strip,
+        PDB_CODEC_LSTRIP:  str.lstrip,
+        PDB_CODEC_RSTRIP:  str.rstrip,
+        PDB_CODEC_INTEGER: int,
+        PDB_CODEC_FLOAT:   float }
+
+    def __init__(self, rec_class):
+        ## (field, slice start, slice end, conversion function)
+        self.read_fields = []
+        ## (field, codec, float digits, width, get_func)
+        self.write_fields = []
+
+        template = rec_class._name.replace("%", "%%")
+        column = len(rec_class._name)
+
+        field_list = rec_class._field_list
+        for (field, start, end, ftype, just, get_func) in field_list:
+            codec = pdb_field_codec(ftype, just)
+            self.read_fields.append(
+                (field, start - 1, end, self.conversions[codec]))
+
+            ## the template can only be built for fields which are in
+            ## order and do not overlap
+            if template is None or start - 1 < column:
+                template = None
+                continue
+
+            width = end - start + 1
+            template += " " * (start - 1 - column)
+            column = end
+
+            if get_func:
+                template += "%s"
+            elif just.startswith("ljust"):
+                template += "%%-%d.%ds" % (width, width)
+            else:
+                template += "%%%d.%ds" % (width, width)
+
+            digits = None
+            if codec == PDB_CODEC_FLOAT:
+                digits = int(ftype[6])
+
+            self.write_fields.append((field, codec, digits, width, get_func))
+
+        self.template = template
+
+    def read(self, rec, line):
+        """Converts the fields of the PDB line into the record rec.
+        """
+        for (field, i, j, conversion) in self.read_fields:
+            s = line[i:j]
+
+            ## ignore blank fields
+            if s == "" or s.isspace():
+                continue
+
+            try:
+                rec[field] = conversion(s)
+            except ValueError:
+                continue
+
+    def write(self, rec):
+        """Returns the PDB line for the record rec.
+        """
+        if self.template is None:
+            return rec.write_field_list()
+
+        values = []
+        for (field, codec, digits, width, get_func) in self.write_fields:
+            if get_func:
+                s = get_func(rec)
+                if len(s) != width:
+                    return rec.write_field_list()
+                values.append(s)
+                continue
+
+            s = rec.get(field, "")
+
+            if s is None or s == "":
+                s = ""
+
+            elif codec == PDB_CODEC_INTEGER:
+                s = str(s)
+
+            elif codec == PDB_CODEC_FLOAT:
+                try:
+                    s = pdb_format_float(s, digits)
+                except ValueError:
+                    raise PDBValueError("field=%s %s not float" % (field, s))
+
+            elif not isinstance(s, str):
+                return rec.write_field_list()
+
+            values.append(s)
+
+        return self.template % tuple(values)
+
+
+def pdb_record_format(rec_class):
+    """Returns the PDBRecordFormat of the record class, compiling it on
+    first use.
+    """
+    try:
+        return PDBRecordFormatMap[rec_class]
+    except KeyError:
+        rec_format = PDBRecordFormatMap[rec_class] = PDBRecordFormat(rec_class)
+        return rec_format
+
+## compiled formats of all the records in PDBRecordMap
+PDBRecordFormatMap = {}
+for rec_class in PDBRecordMap.itervalues():
+    pdb_record_format(rec_class)
+del rec_class
+
+def iter_pdb_records_c(iterable):
+    """Same as iter_pdb_records, but the fields of each line are
+    converted by the pdbmodule C extension.
+    """
+    read_record = pdbmodule.read_record
+    codec_map = PDBRecordCodecMap
+    for ln in iterable:
+        pdb_record = read_record(ln, codec_map)
+        if pdb_record is not None:
+            yield pdb_record
+
 def iter_pdb_records(iterable):
     """Reads a sequence of PDB lines from iterable sequence and converts
-    them to the correct PDB record objects, then yields them.
+    them to the correct PDB record objects, then yields them. The C
+    accelerator is used when the pdbmodule extension is built.
+    """
+    if PDBMODULE_EXISTS:
+        return iter_pdb_records_c(iterable)
+    return iter_pdb_records_py(iterable)
+
+def iter_pdb_records_py(iterable):
+    """Pure Python version of iter_pdb_records.
     """
     iterable = iter(iterable)
     for ln in iterable:
@@ -1539,6 +1725,295 @@ def iter_pdb_records(iterable):
         yield pdb_record
 
 
+## record names stored by PDBCoordinateSection instead of being converted
+## to PDBRecord objects
+PDB_COORDINATE_RECORDS = set(
+    ["ATOM  ", "HETATM", "SIGATM", "ANISOU", "SIGUIJ",
+     "MODEL ", "ENDMDL", "TER   "])
+
+def pdb_string_column(lines, start, end, codec):
+    """Slices the string field start-end out of each line and strips it
+    according to the PDB_CODEC_* codec. Returns a list of interned
+    strings with None for blank fields.
+    """
+    i = start - 1
+    if codec == PDB_CODEC_RSTRIP:
+        column = [ln[i:end].rstrip() for ln in lines]
+    elif codec == PDB_CODEC_LSTRIP:
+        column = [ln[i:end].lstrip() for ln in lines]
+    else:
+        column = [ln[i:end].strip() for ln in lines]
+    return [s and intern(s) or None for s in column]
+
+def pdb_integer_column(lines, start, end):
+    """Converts the integer field start-end of each line. Returns a list
+    of integers with None for blank or invalid fields.
+    """
+    i = start - 1
+    column = [ln[i:end] for ln in lines]
+    try:
+        return numpy.array(column).astype(int).tolist()
+    except (ValueError, OverflowError, TypeError):
+        pass
+
+    ## one or more fields are blank or invalid; convert them one at a time
+    ## with the same rules as PDBRecord.read()
+    values = []
+    for s in column:
+        try:
+            values.append(int(s))
+        except ValueError:
+            values.append(None)
+    return values
+
+def pdb_float_column(lines, start, end):
+    """Converts the float field start-end of each line. Returns a 2-tuple
+    of a float array and a boolean array which is False where the field
+    was blank or invalid.
+    """
+    i = start - 1
+    column = [ln[i:end] for ln in lines]
+    try:
+        values = numpy.array(column).astype(float)
+    except (ValueError, TypeError):
+        pass
+    else:
+        return values, numpy.ones(len(column), bool)
+
+    values = numpy.zeros(len(column), float)
+    mask = numpy.zeros(len(column), bool)
+    for (j, s) in enumerate(column):
+        try:
+            values[j] = float(s)
+        except ValueError:
+            continue
+        mask[j] = True
+    return values, mask
+
+def pdb_record_fields(rec_name):
+    """Returns a dictionary mapping the field names of the record to its
+    (start, end, codec) tuple.
+    """
+    fields = {}
+    for (field, start, end, codec) in PDBRecordCodecMap[rec_name][1]:
+        fields[field] = (start, end, codec)
+    return fields
+
+def pdb_tensor_array(lines, rec_name, keys):
+    """Returns a (len(lines), 3, 3) array of the symmetric tensors stored
+    in the ANISOU/SIGUIJ integer fields keys, which are given in the order
+    11, 22, 33, 12, 13, 23 and scaled by 10**4. Blank fields are zero.
+    """
+    fields = pdb_record_fields(rec_name)
+    tensors = numpy.zeros((len(lines), 3, 3), float)
+    for (key, (r, c)) in zip(keys, ((0,0), (1,1), (2,2), (0,1), (0,2), (1,2))):
+        start, end, codec = fields[key]
+        column = pdb_integer_column(lines, start, end)
+        column = numpy.array([v or 0 for v in column], float) / 10000.0
+        tensors[:, r, c] = column
+        tensors[:, c, r] = column
+    return tensors
+
+
+class PDBCoordinateSection(object):
+    """Column oriented reader for the coordinate section of a PDB file.
+    Each ATOM/HETATM record starts a new row, and the SIGATM, ANISOU and
+    SIGUIJ records which follow it are folded into that row; a row is
+    started for them if no ATOM/HETATM record precedes them.  After all
+    lines have been added, parse() converts the fixed width columns of
+    every row at once.  String and integer fields become lists with None
+    for blank fields, while coordinates, occupancies, temperature factors
+    and the U tensors become NumPy arrays with boolean masks marking the
+    rows where they are defined.
+    """
+    def __init__(self):
+        self.model_num = None
+        self.num_rows = 0
+
+        ## model number of each row
+        self.model_list = []
+
+        ## the lines of each record type and the rows they belong to
+        self.atom_rows = []
+        self.atom_lines = []
+        self.sigatm_rows = []
+        self.sigatm_lines = []
+        self.anisou_rows = []
+        self.anisou_lines = []
+        self.siguij_rows = []
+        self.siguij_lines = []
+
+    def iter_lines(self, iterable):
+        """Adds the coordinate section lines from the iterable sequence of
+        PDB lines, and yields all other lines.
+        """
+        for ln in iterable:
+            rname = ln[:6]
+            if rname not in PDB_COORDINATE_RECORDS:
+                rname = ln.rstrip()[:6].ljust(6)
+                if rname not in PDB_COORDINATE_RECORDS:
+                    yield ln
+                    continue
+            self.add_line(rname, ln.rstrip())
+
+    def add_line(self, rname, ln):
+        """Adds the coordinate section line ln with record name rname.
+        """
+        if rname == "ATOM  " or rname == "HETATM":
+            self.atom_rows.append(self.num_rows)
+            self.atom_lines.append(ln)
+            self.model_list.append(self.model_num)
+            self.num_rows += 1
+            return
+
+        if rname == "MODEL ":
+            rec = MODEL()
+            rec.read(ln)
+            self.model_num = rec.get("serial")
+            return
+        if rname == "ENDMDL":
+            self.model_num = None
+            return
+        if rname == "TER   ":
+            return
+
+        if self.num_rows == 0:
+            self.model_list.append(None)
+            self.num_rows = 1
+        row = self.num_rows - 1
+
+        if rname == "SIGATM":
+            self.sigatm_rows.append(row)
+            self.sigatm_lines.append(ln)
+        elif rname == "ANISOU":
+            self.anisou_rows.append(row)
+            self.anisou_lines.append(ln)
+        elif rname == "SIGUIJ":
+            self.siguij_rows.append(row)
+            self.siguij_lines.append(ln)
+
+    def parse(self):
+        """Converts the columns of all the added lines.
+        """
+        num_rows = self.num_rows
+        lines = self.atom_lines
+        fields = pdb_record_fields("ATOM  ")
+
+        ## rows without an ATOM/HETATM record only occur at the start
+        pad = [None] * (num_rows - len(lines))
+
+        self.atom_mask = numpy.zeros(num_rows, bool)
+        self.atom_mask[self.atom_rows] = True
+
+        for (attr, field) in (("serial", "serial"), ("res_seq", "resSeq")):
+            start, end, codec = fields[field]
+            setattr(self, attr, pad + pdb_integer_column(lines, start, end))
+
+        for (attr, field) in (("name", "name"),
+                              ("alt_loc", "altLoc"),
+                              ("res_name", "resName"),
+                              ("chain_id", "chainID"),
+                              ("icode", "iCode"),
+                              ("column6768", "column6768")):
+            start, end, codec = fields[field]
+            column = pdb_string_column(lines, start, end, codec)
+            setattr(self, attr, pad + column)
+
+        def float_array(field):
+            start, end, codec = fields[field]
+            values, mask = pdb_float_column(lines, start, end)
+            column = numpy.zeros(num_rows, float)
+            column_mask = numpy.zeros(num_rows, bool)
+            column[self.atom_rows] = values
+            column_mask[self.atom_rows] = mask
+            return column, column_mask
+
+        self.xyz = numpy.zeros((num_rows, 3), float)
+        self.xyz_mask = self.atom_mask.copy()
+        for (j, field) in enumerate(("x", "y", "z")):
+            self.xyz[:, j], mask = float_array(field)
+            self.xyz_mask &= mask
+
+        self.occupancy, self.occupancy_mask = float_array("occupancy")
+        self.temp_factor, self.temp_factor_mask = float_array("tempFactor")
+
+        self.parse_sigatm()
+
+        self.U, self.U_mask = self.parse_tensors(
+            self.anisou_rows, self.anisou_lines, "ANISOU",
+            ("u[0][0]", "u[1][1]", "u[2][2]",
+             "u[0][1]", "u[0][2]", "u[1][2]"))
+
+        self.sig_U, self.sig_U_mask = self.parse_tensors(
+            self.siguij_rows, self.siguij_lines, "SIGUIJ",
+            ("sig[1][1]", "sig[2][2]", "sig[3][3]",
+             "sig[1][2]", "sig[1][3]", "sig[2][3]"))
+
+        ## rows holding data for an atom
+        self.row_mask = self.atom_mask | self.sigatm_mask | \
+                        self.U_mask | self.sig_U_mask
+
+    def parse_sigatm(self):
+        """Converts the SIGATM lines. Each field is set only where it is
+        present, so a row with several SIGATM records takes the last
+        value given for each field.
+        """
+        num_rows = self.num_rows
+        lines = self.sigatm_lines
+        fields = pdb_record_fields("SIGATM")
+
+        self.sig_xyz = numpy.zeros((num_rows, 3), float)
+        self.sig_occupancy = numpy.zeros(num_rows, float)
+        self.sig_temp_factor = numpy.zeros(num_rows, float)
+
+        xyz_masks = numpy.zeros((num_rows, 3), bool)
+        self.sig_occupancy_mask = numpy.zeros(num_rows, bool)
+        self.sig_temp_factor_mask = numpy.zeros(num_rows, bool)
+
+        for (field, array, mask_array, j) in (
+            ("sigX", self.sig_xyz, xyz_masks, 0),
+            ("sigY", self.sig_xyz, xyz_masks, 1),
+            ("sigZ", self.sig_xyz, xyz_masks, 2),
+            ("sigOccupancy", self.sig_occupancy,
+             self.sig_occupancy_mask, None),
+            ("sigTempFactor", self.sig_temp_factor,
+             self.sig_temp_factor_mask, None)):
+
+            start, end, codec = fields[field]
+            values, mask = pdb_float_column(lines, start, end)
+            for (i, row) in enumerate(self.sigatm_rows):
+                if not mask[i]:
+                    continue
+                if j is None:
+                    array[row] = values[i]
+                    mask_array[row] = True
+                else:
+                    array[row, j] = values[i]
+                    mask_array[row, j] = True
+
+        self.sig_xyz_mask = xyz_masks.all(1)
+        self.sigatm_mask = xyz_masks.any(1) | self.sig_occupancy_mask | \
+                           self.sig_temp_factor_mask
+
+    def parse_tensors(self, rows, lines, rec_name, keys):
+        """Returns a (num_rows, 3, 3) tensor array and row mask from the
+        ANISOU or SIGUIJ lines; the last line given for a row wins.
+        """
+        tensors = numpy.zeros((self.num_rows, 3, 3), float)
+        mask = numpy.zeros(self.num_rows, bool)
+        if not lines:
+            return tensors, mask
+
+        last_line = dict(zip(rows, range(len(lines))))
+        index_rows = last_line.keys()
+        index_lines = [last_line[row] for row in index_rows]
+
+        line_tensors = pdb_tensor_array(lines, rec_name, keys)
+        tensors[index_rows] = line_tensors[index_lines]
+        mask[index_rows] = True
+        return tensors, mask
+
+
 class PDBFile(list):
     """Class for managing a PDB file. This class inherits from a Python
     list object, and contains a list of PDBRecord objects.
@@ -126,6 +126,10 @@ class PDBStructureBuilder(StructureBuilder.StructureBuilder,
                           PDB.RecordProcessor):
     """Builds a new Structure object by loading a PDB file.
     """
+    ## records whose processing looks up atoms in the structure
+    atom_ref_classes = (PDB.SEQRES, PDB.SSBOND, PDB.LINK, PDB.HYDBND,
+                        PDB.SLTBRG, PDB.CONECT)
+
     def pdb_error(self, rec_name, text):
         ConsoleOutput.warning("PDB::%s %s" % (rec_name, text))
 
@@ -138,71 +142,150 @@ class PDBStructureBuilder(StructureBuilder.StructureBuilder,
         return fragment_id
     
     def read_start(self, fil, update_cb = None):
-        self.pdb_file = PDB.PDBFile()
-        self.pdb_file.load_file(fil)
+        if isinstance(fil, str):
+            fil = open(fil, "r")
+
+        ## store extracted bond information
+        self.bond_map = {}
+
+        ## secondary structure annotation
+        self.helix_list = []
+        self.beta_sheet_list = []
+        self.site_list = []
+
+        ## records which refer to atoms are held back until the atoms
+        ## have been loaded
+        self.atom_ref_records = []
+
+        ## the coordinate records are stored column-wise in pdb_coords,
+        ## all other records are processed as they are read
+        self.pdb_coords = PDB.PDBCoordinateSection()
+        self.process_pdb_records(self.iter_pdb_records(fil))
 
-    def load_atom(self, atm_map):
-        """Override load_atom to maintain a serial_num->atm map.
+    def iter_pdb_records(self, fil):
+        """Yields the non-coordinate records of fil which can be processed
+        before the atoms are loaded, and holds back the others.
         """
-        atm = StructureBuilder.StructureBuilder.load_atom(self, atm_map)
-        ## map PDB atom serial number -> Atom object
-        try:
-            self.atom_serial_map[atm_map["serial"]] = atm
-        except KeyError:
-            pass
+        atom_ref_classes = self.atom_ref_classes
+        atom_ref_records = self.atom_ref_records
+
+        for rec in PDB.iter_pdb_records(self.pdb_coords.iter_lines(fil)):
+            if isinstance(rec, atom_ref_classes):
+                atom_ref_records.append(rec)
+            else:
+                yield rec
 
     def read_atoms(self):
         ## map PDB atom serial numbers to the structure atom classes
         self.atom_serial_map = {}
-        ## current atom map
-        self.atm_map = {}
-        ## current model number
-        self.model_num = None
-
-        def filter_func(rec):
-            if isinstance(rec, PDB.ATOM) or \
-               isinstance(rec, PDB.SIGATM) or \
-               isinstance(rec, PDB.ANISOU) or \
-               isinstance(rec, PDB.SIGUIJ) or \
-               isinstance(rec, PDB.TER) or \
-               isinstance(rec, PDB.MODEL) or \
-               isinstance(rec, PDB.ENDMDL):
-                return True
-            return False
 
-        ## process the coordinate records
-        self.process_pdb_records(self.pdb_file, filter_func)
+        coords = self.pdb_coords
+        coords.parse()
+
+        xyz = coords.xyz
+        sig_xyz = coords.sig_xyz
+        U = coords.U
+        sig_U = coords.sig_U
+
+        row_mask = coords.row_mask.tolist()
+        xyz_mask = coords.xyz_mask.tolist()
+        sig_xyz_mask = coords.sig_xyz_mask.tolist()
+        U_mask = coords.U_mask.tolist()
+        sig_U_mask = coords.sig_U_mask.tolist()
+
+        def masked_list(values, mask):
+            column = values.tolist()
+            for (i, defined) in enumerate(mask.tolist()):
+                if not defined:
+                    column[i] = None
+            return column
+
+        occupancy = masked_list(coords.occupancy, coords.occupancy_mask)
+        temp_factor = masked_list(coords.temp_factor, coords.temp_factor_mask)
+        sig_occupancy = masked_list(
+            coords.sig_occupancy, coords.sig_occupancy_mask)
+        sig_temp_factor = masked_list(
+            coords.sig_temp_factor, coords.sig_temp_factor_mask)
+
+        guess_element = Library.library_guess_element_from_name
+
+        for i in xrange(coords.num_rows):
+            if not row_mask[i]:
+                continue
 
-        ## load last atom read
-        if self.atm_map:
-            self.load_atom(self.atm_map)
+            ## always derive element from atom name for PDB files -- they
+            ## are too messed up to use the element column
+            name = coords.name[i]
+            res_name = coords.res_name[i] or ""
+            element = ""
+            if name is None:
+                name = ""
+            else:
+                gelement = guess_element(name, res_name)
+                if gelement != None:
+                    element = gelement
+                name = name.strip()
+
+            ## construct fragment_id
+            fragment_id = ""
+            res_seq = coords.res_seq[i]
+            if res_seq is not None:
+                icode = coords.icode[i]
+                if icode is not None:
+                    fragment_id = "%d%s" % (res_seq, icode)
+                else:
+                    fragment_id = "%d" % (res_seq)
+
+            ## model number for the atom
+            model_id = coords.model_list[i]
+            if model_id == None:
+                model_id = 1
+
+            position = None
+            if xyz_mask[i]:
+                position = xyz[i]
+            sig_position = None
+            if sig_xyz_mask[i]:
+                sig_position = sig_xyz[i]
+            atm_U = None
+            if U_mask[i]:
+                atm_U = U[i]
+            atm_sig_U = None
+            if sig_U_mask[i]:
+                atm_sig_U = sig_U[i]
+
+            atm = Structure.Atom(
+                name            = name,
+                alt_loc         = coords.alt_loc[i] or "",
+                res_name        = res_name,
+                fragment_id     = fragment_id,
+                chain_id        = coords.chain_id[i] or "",
+                model_id        = model_id,
+                element         = element,
+                position        = position,
+                sig_position    = sig_position,
+                occupancy       = occupancy[i],
+                sig_occupancy   = sig_occupancy[i],
+                temp_factor     = temp_factor[i],
+                sig_temp_factor = sig_temp_factor[i],
+                column6768      = coords.column6768[i],
+                U               = atm_U,
+                sig_U           = atm_sig_U)
+
+            self.add_atom(atm)
+
+            ## map PDB atom serial number -> Atom object
+            serial = coords.serial[i]
+            if serial is not None:
+                self.atom_serial_map[serial] = atm
 
         ## cleanup
-        del self.model_num
-        del self.atm_map
-        
-    def read_metadata(self):
-        ## store extracted bond information
-        self.bond_map = {}
-
-        ## secondary structure annotation
-        self.helix_list = []
-        self.beta_sheet_list = []
-        self.site_list = []
+        del self.pdb_coords
 
-        def filter_func(rec):
-            if isinstance(rec, PDB.ATOM) or \
-               isinstance(rec, PDB.SIGATM) or \
-               isinstance(rec, PDB.ANISOU) or \
-               isinstance(rec, PDB.SIGUIJ) or \
-               isinstance(rec, PDB.TER) or \
-               isinstance(rec, PDB.MODEL) or \
-               isinstance(rec, PDB.ENDMDL):
-                return False
-            return True
-
-        ## process the non-coordinate records
-        self.process_pdb_records(self.pdb_file, filter_func)
+    def read_metadata(self):
+        ## process the records held back by read_start
+        self.process_pdb_records(self.atom_ref_records)
+        del self.atom_ref_records
 
         ## load chemical bond information
         self.load_bonds(self.bond_map)
@@ -218,103 +301,6 @@ class PDBStructureBuilder(StructureBuilder.StructureBuilder,
         self.load_sites(self.site_list)
         del self.site_list
 
-    def process_ATOM(self, rec):
-        ## load current atom since this record indicates a new atom
-        if self.atm_map:
-            self.load_atom(self.atm_map)
-            self.atm_map = {}
-
-        ## optimization
-        atm_map = self.atm_map
-
-        ## always derive element from atom name for PDB files -- they are
-        ## too messed up to use the element column
-        try:
-            name = rec["name"]
-        except KeyError:
-            atm_map["name"] = ""
-            atm_map["element"] = ""
-        else:
-            atm_map["name"] = name.strip()
-            
-            res_name = rec.get("resName", "")
-            gelement = Library.library_guess_element_from_name(name, res_name)
-            if gelement != None:
-                atm_map["element"] = gelement
-
-        ## additional atom information
-        if rec.has_key("serial"):
-            atm_map["serial"] = rec["serial"]
-
-        if rec.has_key("altLoc"):
-            atm_map["alt_loc"] = rec["altLoc"]
-
-        if rec.has_key("resName"):
-            atm_map["res_name"] = rec["resName"]
-
-        if rec.has_key("chainID"):
-            atm_map["chain_id"] = rec["chainID"]
-
-        ## construct fragment_id
-        if rec.has_key("resSeq"):
-            if rec.has_key("iCode"):
-                atm_map["fragment_id"] = "%d%s" % (rec["resSeq"],rec["iCode"])
-            else:
-                atm_map["fragment_id"] = "%d" % (rec["resSeq"])
-                
-        ## add the model number for the atom
-        if self.model_num != None:
-            atm_map["model_id"] = self.model_num
-
-        ## position
-        if rec.has_key("x"):
-            atm_map["x"] = rec["x"]
-        if rec.has_key("y"):
-            atm_map["y"] = rec["y"]
-        if rec.has_key("z"):
-            atm_map["z"] = rec["z"]
-
-        if rec.has_key("occupancy"):
-            atm_map["occupancy"] = rec["occupancy"]
-        if rec.has_key("tempFactor"):
-            atm_map["temp_factor"] = rec["tempFactor"]
-
-        ## columns 67 and 68. Can be used for anything.
-        if rec.has_key("column6768"):
-            atm_map["column6768"] = rec["column6768"]
-
-    def process_HETATM(self, rec):
-        self.process_ATOM(rec)
-
-    def process_SIGATM(self, rec):
-        setmapf(rec, "sigX", self.atm_map, "sig_x")
-        setmapf(rec, "sigY", self.atm_map, "sig_y")
-        setmapf(rec, "sigZ", self.atm_map, "sig_z")
-        setmapf(rec, "sigOccupancy", self.atm_map, "sig_occupancy")
-        setmapf(rec, "sigTempFactor", self.atm_map, "sig_temp_factor")
-
-    def process_ANISOU(self, rec):
-        self.atm_map["u11"] = rec.get("u[0][0]", 0.0) / 10000.0
-        self.atm_map["u22"] = rec.get("u[1][1]", 0.0) / 10000.0
-        self.atm_map["u33"] = rec.get("u[2][2]", 0.0) / 10000.0
-        self.atm_map["u12"] = rec.get("u[0][1]", 0.0) / 10000.0
-        self.atm_map["u13"] = rec.get("u[0][2]", 0.0) / 10000.0
-        self.atm_map["u23"] = rec.get("u[1][2]", 0.0) / 10000.0
-
-    def process_SIGUIJ(self, rec):
-        self.atm_map["sig_u11"] = rec.get("sig[1][1]", 0.0) / 10000.0
-        self.atm_map["sig_u22"] = rec.get("sig[2][2]", 0.0) / 10000.0
-        self.atm_map["sig_u33"] = rec.get("sig[3][3]", 0.0) / 10000.0
-        self.atm_map["sig_u12"] = rec.get("sig[1][2]", 0.0) / 10000.0
-        self.atm_map["sig_u13"] = rec.get("sig[1][3]", 0.0) / 10000.0
-        self.atm_map["sig_u23"] = rec.get("sig[2][3]", 0.0) / 10000.0
-
-    def process_MODEL(self, rec):
-        self.model_num = rec.get("serial")
-
-    def process_ENDMDL(self, rec):
-        self.model_num = None
-
     def process_HEADER(self, rec):
         self.struct.header = "%s:%s:%s" % (rec.get("idCode", ""),
                                            rec.get("classification", ""),
@@ -0,0 +1,318 @@
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""A small atom selection language, compiled into vectorized masks over
+the columns of a Structure.AtomTable.
+
+A selection is a boolean expression of these terms:
+
+  chain A,B          - chain_id is one of the values
+  resi 10-20,25,30A  - fragment_id is one of the values, or within one of
+                       the inclusive ranges; ranges compare the sequence
+                       number, then the insertion code, like a Chain slice
+  resn ALA,GLY       - res_name is one of the values
+  name N,CA,C,O      - atom name is one of the values
+  element C,N        - element is one of the values
+  alt A              - alt_loc is one of the values
+  b < 30.0           - temperature factor compared with the value, using
+  occ >= 1.0           one of <, <=, >, >=, ==, !=; occ compares the
+                       occupancy, and Atoms with none never match
+  within 5.0 of TERM - Atoms within the distance of any Atom of TERM
+  all, none
+  ( EXPRESSION )
+
+combined with not, and, and or, in decreasing order of precedence:
+
+  chain A and resi 10-20 and not element H
+  within 4.5 of (resn HEM) and not resn HEM
+
+Keywords are case insensitive, values are not. compile_selection() parses
+a selection string once and caches the compiled Selection.
+"""
+import re
+
+try:
+    import numpy
+except ImportError:
+    import NumericCompat as numpy
+
+
+## selection string -> compiled Selection; it is emptied when it grows to
+## SELECTION_CACHE_SIZE entries
+SELECTION_CACHE      = {}
+SELECTION_CACHE_SIZE = 1000
+
+## number of selections whose masks and AtomLists an AtomTable keeps, see
+## Structure.AtomTable.get_selection(); each holds a row per Atom
+SELECTION_MASK_CACHE_SIZE = 64
+
+## keywords selecting Atoms by one of a list of values, and the AtomTable
+## column they test
+VALUE_COLUMNS = {
+    "chain":   "chain_id",
+    "resn":    "res_name",
+    "name":    "name",
+    "element": "element",
+    "alt":     "alt_loc"}
+
+## keywords comparing a number, and the AtomArrays array they test
+NUMBER_ARRAYS = {
+    "b":   "temp_factor",
+    "occ": "occupancy"}
+
+COMPARE_OPS = {
+    "<":  numpy.less,
+    "<=": numpy.less_equal,
+    ">":  numpy.greater,
+    ">=": numpy.greater_equal,
+    "==": numpy.equal,
+    "!=": numpy.not_equal}
+
+TOKEN_RE = re.compile(r"\s*(\(|\)|,|<=|>=|==|!=|<|>|[^\s(),<>=!]+)")
+
+FRAGMENT_ID_RE = re.compile(r"^(-?\d+)([A-Za-z]?)$")
+FRAGMENT_RANGE_RE = re.compile(r"^(-?\d+[A-Za-z]?)-(-?\d+[A-Za-z]?)$")
+
+
+class SelectionError(Exception):
+    """Raised for selection strings which cannot be parsed.
+    """
+    pass
+
+
+def compile_selection(selection):
+    """Returns the compiled Selection of the selection string, which is
+    parsed once and then cached.
+    """
+    try:
+        return SELECTION_CACHE[selection]
+    except KeyError:
+        sel = Selection(selection)
+        if len(SELECTION_CACHE) >= SELECTION_CACHE_SIZE:
+            SELECTION_CACHE.clear()
+        SELECTION_CACHE[selection] = sel
+        return sel
+
+
+def tokenize(selection):
+    """Returns the list of tokens of the selection string.
+    """
+    tokens = []
+    pos = 0
+    selection = selection.rstrip()
+    while pos < len(selection):
+        match = TOKEN_RE.match(selection, pos)
+        if match is None:
+            raise SelectionError("invalid character at %d in selection %r" % (
+                pos, selection))
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def residue_range_key(frag_id):
+    """Returns the 2-tuple (sequence_num, insertion_code) of the fragment_id
+    at either end of a residue range, with "" for no insertion code to
+    compare with the AtomTable.icode column.
+    """
+    match = FRAGMENT_ID_RE.match(frag_id)
+    if match is None:
+        raise SelectionError("invalid residue number %r" % (frag_id))
+    return int(match.group(1)), match.group(2)
+
+
+class Selection(object):
+    """A parsed selection string. calc_mask() evaluates it over the Atoms
+    of a Structure.AtomTable.
+    """
+    def __init__(self, selection):
+        self.selection = selection
+        self.tokens = tokenize(selection)
+        self.pos = 0
+
+        self.mask_func = self.parse_or()
+        if self.pos < len(self.tokens):
+            self.error("unexpected %r" % (self.tokens[self.pos]))
+
+        del self.tokens
+
+    def __str__(self):
+        return "Selection(%s)" % (self.selection)
+
+    def calc_mask(self, atom_table):
+        """Returns a numpy.array[N] of bool which is True for the Atoms of
+        the AtomTable matched by the selection.
+        """
+        return self.mask_func(atom_table)
+
+    def error(self, message):
+        raise SelectionError("%s in selection %r" % (message, self.selection))
+
+    def peek(self):
+        """Returns the next token in lower case, or None at the end.
+        """
+        try:
+            return self.tokens[self.pos].lower()
+        except IndexError:
+            return None
+
+    def next_token(self):
+        """Returns the next token and moves past it.
+        """
+        try:
+            token = self.tokens[self.pos]
+        except IndexError:
+            self.error("unexpected end")
+        self.pos += 1
+        return token
+
+    def next_number(self):
+        token = self.next_token()
+        try:
+            return float(token)
+        except ValueError:
+            self.error("expected a number instead of %r" % (token))
+
+    def next_values(self):
+        """Returns the comma separated list of values which follows a
+        keyword.
+        """
+        values = [self.next_token()]
+        while self.peek() == ",":
+            self.pos += 1
+            values.append(self.next_token())
+        for value in values:
+            if value in ("(", ")", ","):
+                self.error("unexpected %r" % (value))
+        return values
+
+    def parse_or(self):
+        funcs = [self.parse_and()]
+        while self.peek() == "or":
+            self.pos += 1
+            funcs.append(self.parse_and())
+        if len(funcs) == 1:
+            return funcs[0]
+
+        def mask_func(atom_table):
+            mask = funcs[0](atom_table).copy()
+            for func in funcs[1:]:
+                mask |= func(atom_table)
+            return mask
+        return mask_func
+
+    def parse_and(self):
+        funcs = [self.parse_not()]
+        while self.peek() == "and":
+            self.pos += 1
+            funcs.append(self.parse_not())
+        if len(funcs) == 1:
+            return funcs[0]
+
+        def mask_func(atom_table):
+            mask = funcs[0](atom_table).copy()
+            for func in funcs[1:]:
+                mask &= func(atom_table)
+            return mask
+        return mask_func
+
+    def parse_not(self):
+        if self.peek() == "not":
+            self.pos += 1
+            func = self.parse_not()
+            return lambda atom_table: ~func(atom_table)
+        return self.parse_term()
+
+    def parse_term(self):
+        keyword = self.peek()
+        token = self.next_token()
+
+        if keyword == "(":
+            func = self.parse_or()
+            if self.next_token() != ")":
+                self.error("expected ')'")
+            return func
+
+        if keyword == "all":
+            return lambda atom_table: numpy.ones(len(atom_table), bool)
+
+        if keyword == "none":
+            return lambda atom_table: numpy.zeros(len(atom_table), bool)
+
+        if VALUE_COLUMNS.has_key(keyword):
+            return self.compile_values(VALUE_COLUMNS[keyword], self.next_values())
+
+        if keyword == "resi":
+            return self.compile_residues(self.next_values())
+
+        if NUMBER_ARRAYS.has_key(keyword):
+            op = self.next_token()
+            if not COMPARE_OPS.has_key(op):
+                self.error("expected a comparison instead of %r" % (op))
+            return self.compile_compare(
+                NUMBER_ARRAYS[keyword], COMPARE_OPS[op], self.next_number())
+
+        if keyword == "within":
+            distance = self.next_number()
+            if self.peek() != "of":
+                self.error("expected 'of'")
+            self.pos += 1
+            return self.compile_within(distance, self.parse_not())
+
+        self.error("unexpected %r" % (token))
+
+    def compile_values(self, column, values):
+        values = numpy.array(values, dtype = str)
+
+        def mask_func(atom_table):
+            return numpy.in1d(getattr(atom_table, column), values)
+        return mask_func
+
+    def compile_residues(self, values):
+        frag_ids = []
+        ranges = []
+        for value in values:
+            match = FRAGMENT_RANGE_RE.match(value)
+            if match is None:
+                frag_ids.append(value)
+            else:
+                ranges.append((residue_range_key(match.group(1)),
+                               residue_range_key(match.group(2))))
+        frag_ids = numpy.array(frag_ids, dtype = str)
+
+        def mask_func(atom_table):
+            mask = numpy.in1d(atom_table.fragment_id, frag_ids)
+
+            res_seq = atom_table.res_seq
+            icode = atom_table.icode
+            for (seq1, icode1), (seq2, icode2) in ranges:
+                after_start = (res_seq > seq1) | ((res_seq == seq1) & (icode >= icode1))
+                before_stop = (res_seq < seq2) | ((res_seq == seq2) & (icode <= icode2))
+                mask |= after_start & before_stop & atom_table.res_mask
+            return mask
+        return mask_func
+
+    def compile_compare(self, array_name, op, value):
+        ## Atoms with no value hold NaN, which must not match any comparison,
+        ## including !=
+        def mask_func(atom_table):
+            array = getattr(atom_table.atom_arrays, array_name)
+            with numpy.errstate(invalid = "ignore"):
+                return op(array, value) & ~numpy.isnan(array)
+        return mask_func
+
+    def compile_within(self, distance, func):
+        def mask_func(atom_table):
+            arrays = atom_table.atom_arrays
+            mask = numpy.zeros(len(atom_table), bool)
+
+            query = numpy.nonzero(func(atom_table) & arrays.position_mask)[0]
+            if len(query) == 0:
+                return mask
+
+            xyz_index, xyz_rows = atom_table.get_xyz_index()
+            q, p, d = xyz_index.calc_neighbors(arrays.position[query], distance)
+            mask[xyz_rows[p]] = True
+            return mask
+        return mask_func
@@ -34,9 +34,9 @@ class Sequence(object):
         """
         seqlist = list()
         for threeletter in self.sequence_list:
-            mdesc = Library.library_get_monomer_desc(threeletter)
-            if mdesc is not None and mdesc.one_letter_code:
-                seqlist.append(mdesc.one_letter_code)
+            one_letter_code = Library.library_get_one_letter_code(threeletter)
+            if one_letter_code:
+                seqlist.append(one_letter_code)
             else:
                 seqlist.append("X")
         return "".join(seqlist)
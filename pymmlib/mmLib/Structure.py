@@ -6,6 +6,8 @@
 """
 import copy
 import math
+import array
+import bisect
 import string
 import itertools
 
@@ -26,6 +28,7 @@ import AtomMath
 import Library
 import UnitCell
 import Sequence
+import Selection
 import mmCIFDB
 
 
@@ -91,6 +94,22 @@ class Structure(object):
         self.model_list = []
         self.model_dict = {}
 
+        ## False once a Model is appended with delay_sort, until the next sort
+        self.model_list_sorted = True
+
+        ## spatial index of the Atoms of the default Model built by
+        ## get_xyz_index(), and the AtomTable with the cached selections
+        ## built by get_atom_table(); both are dropped by invalidate_caches()
+        ## whenever Atoms, Fragments, Chains or Models are added or removed,
+        ## or the defaults change, and are rebuilt when the AtomArrays they
+        ## were built from change version because Atoms were moved or
+        ## their values set
+        self.xyz_index = None
+        self.xyz_index_version = None
+        self.atom_table = None
+        self.cache_arrays = None
+        self.cache_version = None
+
     def __str__(self):
         return "Struct(%s)" % (self.structure_id)
 
@@ -104,6 +123,21 @@ class Structure(object):
 
         return structure
 
+    def clone(self):
+        """Returns a copy of the Structure made with Model.clone(), which
+        is much faster than copy.deepcopy() for generating many frames or
+        conformers of a Structure.
+        """
+        structure = Structure(
+            cifdb     = copy.deepcopy(self.cifdb),
+            unit_cell = copy.deepcopy(self.unit_cell))
+
+        for model in self.model_list:
+            structure.add_model(model.clone(), True)
+        structure.model_list_sorted = self.model_list_sorted
+
+        return structure
+
     def __len__(self):
         """Returns the number of stored Chain objects.
         """
@@ -160,10 +194,16 @@ class Structure(object):
         """Sorts all Models and Chains in the Structure according to standard
         model_id, chain_id, and fragment_id sorting rules.
         """
-        self.model_list.sort()
+        self.sort_models()
         for model in self.model_list:
             model.sort()
 
+    def sort_models(self):
+        """Sorts the Models in the Structure by their model_id.
+        """
+        self.model_list.sort(key = model_sort_key)
+        self.model_list_sorted = True
+
     def add_model(self, model, delay_sort=True):
         """Adds a Model to a Structure. Raises the ModelOverwrite exception
         if the model_id of the Model matches the model_id of a Model
@@ -179,13 +219,27 @@ class Structure(object):
         if self.default_model is None:
             self.default_model = model
 
-        self.model_list.append(model)
+        if delay_sort:
+            self.model_list.append(model)
+            self.model_list_sorted = False
+        elif self.model_list_sorted:
+            insort_sorted(self.model_list, model, model_sort_key)
+        else:
+            self.model_list.append(model)
+            self.sort_models()
+
         self.model_dict[model.model_id] = model
 
         model.structure = self
+        self.invalidate_caches()
 
-        if not delay_sort:
-            self.model_list.sort()
+    def add_models(self, models):
+        """Adds each Model in the models sequence as add_model() does, then
+        sorts the Models once at the end.
+        """
+        for model in models:
+            self.add_model(model, True)
+        self.sort_models()
 
     def remove_model(self, model):
         """Removes a child Model object. If the Model object is the default
@@ -197,6 +251,7 @@ class Structure(object):
         self.model_list.remove(model)
         del self.model_dict[model.model_id]
         model.structure = None
+        self.invalidate_caches()
 
         ## if the default model is being removed, choose a new default model
         ## if possible
@@ -228,6 +283,7 @@ class Structure(object):
             self.default_model = self.model_dict[model_id]
         except KeyError:
             return False
+        self.invalidate_caches()
         return False
 
     def set_model(self, model_id):
@@ -243,6 +299,151 @@ class Structure(object):
         """
         return iter(self.model_list)
 
+    def get_atom_arrays(self):
+        """Returns the AtomArrays of the default Model; see
+        Model.get_atom_arrays().
+        """
+        return self.default_model.get_atom_arrays()
+
+    def get_bond_table(self):
+        """Returns the BondTable of the default Model; see
+        Model.get_bond_table().
+        """
+        return self.default_model.get_bond_table()
+
+    def get_cache_arrays(self):
+        """Returns the AtomArrays of the default Model which the caches of
+        get_xyz_index() and get_atom_table() are built from. It is checked
+        against the Model again only when its version has changed.
+        """
+        arrays = self.cache_arrays
+        if arrays is None or arrays.version != self.cache_version:
+            arrays = self.cache_arrays = self.get_atom_arrays()
+            self.cache_version = arrays.version
+        return arrays
+
+    def get_xyz_index(self):
+        """Returns the 2-tuple (xyz_index, atom_list) of the Atoms with a
+        position iterated by iter_atoms(), and the GeometryDict.XYZIndex of
+        their positions. The index is built on first use and rebuilt after
+        the Structure hierarchy or its defaults change, or an Atom is
+        assigned a position; call invalidate_caches() after writing to the
+        position arrays in place.
+        """
+        version = None
+        if self.default_model is not None:
+            arrays = self.get_cache_arrays()
+            version = (arrays, arrays.position_version)
+
+        if self.xyz_index is None or self.xyz_index_version != version:
+            atom_list = [atm for atm in self.iter_atoms()
+                         if atm.position is not None]
+            positions = numpy.array([atm.position for atm in atom_list], float)
+            self.xyz_index = (GeometryDict.XYZIndex(positions, 4.0), atom_list)
+            self.xyz_index_version = version
+        return self.xyz_index
+
+    def invalidate_caches(self):
+        """Drops the spatial index built by get_xyz_index() and the
+        AtomTable and selections built by get_atom_table(). This is done
+        when the Structure hierarchy or its defaults change, and they are
+        rebuilt when Atoms are assigned positions, temperature factors or
+        occupancies; call it after writing to the position, temp_factor or
+        occupancy arrays in place, and after assigning the name, alt_loc,
+        res_name, fragment_id, chain_id or element of an Atom directly
+        instead of through the set_*() methods of the Atom, Fragment or
+        Chain.
+        """
+        self.xyz_index = None
+        self.xyz_index_version = None
+        self.atom_table = None
+        self.cache_arrays = None
+        self.cache_version = None
+
+    def get_atom_table(self):
+        """Returns the AtomTable of all the Atoms of the default Model,
+        including those in alternate conformations, which evaluates and
+        caches the selections of select_atoms(). It is built on first use
+        and rebuilt after invalidate_caches() or when the Model's
+        AtomArrays is rebuilt. Its label columns are read from the Atoms
+        when it is built, so labels assigned directly to an Atom are not
+        seen until invalidate_caches() is called.
+        """
+        arrays = self.get_cache_arrays()
+        if self.atom_table is None or self.atom_table.atom_arrays is not arrays:
+            self.atom_table = AtomTable(arrays)
+        return self.atom_table
+
+    def select_atoms(self, selection):
+        """Returns an AtomList of the Atoms of the default Model, including
+        those in alternate conformations, matched by the selection string;
+        see the Selection module for the language. The result is cached
+        until the Structure changes or its Atoms are assigned positions,
+        temperature factors, occupancies or labels through the set_*()
+        methods; labels assigned directly to an Atom need a call to
+        invalidate_caches(). The list is shared by all callers and must not
+        be modified.
+        """
+        return self.get_atom_table().select_atoms(selection)
+
+    def calc_selection_mask(self, selection):
+        """Returns the numpy.array[N] of bool which is True for the Atoms
+        of get_atom_table().atom_list matched by the selection string. The
+        array is cached like the select_atoms() result.
+        """
+        return self.get_atom_table().calc_selection_mask(selection)
+
+    def iter_atoms_by_distance(self, position, max_distance = None):
+        """Iterates the Atoms iterated by iter_atoms() from the closest to
+        position to the farthest, up to the cutoff distance max_distance
+        if given, yielding the 2-tuple (dist, atm). With a cutoff, only the
+        neighborhood of position is searched using the spatial index.
+        """
+        listx = []
+
+        if max_distance is not None:
+            ## candidates from the spatial index, with a margin for
+            ## rounding differences from AtomMath.length
+            xyz_index, atom_list = self.get_xyz_index()
+            p, d = xyz_index.calc_sphere_intersection(
+                position, max_distance + 1.0e-6)
+            for i in p:
+                atm = atom_list[i]
+                dist = AtomMath.length(atm.position - position)
+                if dist <= max_distance:
+                    listx.append((dist, atm))
+        else:
+            for atm in self.iter_atoms():
+                if atm.position is not None:
+                    listx.append((AtomMath.length(atm.position - position), atm))
+
+        listx.sort()
+        return iter(listx)
+
+    def iter_contact_fragments(self, atoms, max_distance):
+        """Iterates, in Structure order, the Fragments which have an Atom
+        within max_distance of any of the argument atoms, an iterable of
+        Atoms such as a ligand Fragment. The Fragments of the argument
+        atoms are not included.
+        """
+        query_list = [atm for atm in atoms if atm.position is not None]
+        if len(query_list) == 0:
+            return
+
+        xyz_index, atom_list = self.get_xyz_index()
+        positions = numpy.array([atm.position for atm in query_list], float)
+        q, p, d = xyz_index.calc_neighbors(positions, max_distance)
+
+        visited = {}
+        for atm in query_list:
+            visited[atm.fragment] = True
+
+        for i in numpy.unique(p):
+            frag = atom_list[i].fragment
+            if frag not in visited:
+                visited[frag] = True
+                yield frag
+
     def count_models(self):
         """Counts all Model objects in the Structure.
         """
@@ -570,13 +771,7 @@ class Structure(object):
         iterating over all Atom objects in the same order as iter_atoms(),
         then iterating over each Atom's Bond objects.
         """
-        visited = {}
-        for atm in self.iter_atoms():
-            for bond in atm.iter_bonds():
-                if visited.has_key(bond):
-                    continue
-                yield bond
-                visited[bond] = True
+        return iter_atom_bonds(self.iter_atoms())
 
     def count_bonds(self):
         """Counts all Bond objects using the default Model and default
@@ -655,6 +850,7 @@ class Structure(object):
         self.default_alt_loc = alt_loc        
         for frag in self.iter_all_fragments():
             frag.set_default_alt_loc(alt_loc)
+        self.invalidate_caches()
 
     def add_bonds_from_covalent_distance(self):
         """Builds a Structure's bonds by atomic distance distance using
@@ -663,36 +859,54 @@ class Structure(object):
         covalent radii + 0.54A.
         """
         for model in self.iter_models():
-            xyzdict = GeometryDict.XYZDict(2.0)
-
-            for atm in model.iter_all_atoms():
-                if atm.position is not None:
-                    xyzdict.add(atm.position, atm)
-
-            for (p1,atm1),(p2,atm2),dist in xyzdict.iter_contact_distance(2.5):
-
-                if (atm1.alt_loc == "" or atm2.alt_loc == "") or (atm1.alt_loc == atm2.alt_loc):
-
-                    ## calculate the expected bond distance by adding the
-                    ## covalent radii + 0.54A
-                    edesc1 = Library.library_get_element_desc(atm1.element)
-                    edesc2 = Library.library_get_element_desc(atm2.element)
-
-                    ## this will usually occur if an atom name does not match
-                    ## the one found in the associated monomer library
-                    if edesc1 is None or edesc2 is None:
-                        continue
-
-                    bond_dist = edesc1.covalent_radius + edesc2.covalent_radius + 0.54
-
-                    ## this will usually occur if the bond distance between
-                    ## between two atoms does not match the description in
-                    ## in the monomer library
-                    if dist > bond_dist:
-                        continue
+            atom_list = [atm for atm in model.iter_all_atoms()
+                         if atm.position is not None]
+            if len(atom_list) == 0:
+                continue
 
-                    if atm1.get_bond(atm2) is None:
-                        atm1.create_bond(atom = atm2, standard_res_bond = False)
+            positions = numpy.array([atm.position for atm in atom_list], float)
+
+            ## per-atom covalent radii, NaN for atoms whose element is not
+            ## in the library so none of their pairs pass the cutoff test
+            radius_dict = {}
+            for atm in atom_list:
+                if atm.element not in radius_dict:
+                    edesc = Library.library_get_element_desc(atm.element)
+                    if edesc is None:
+                        radius_dict[atm.element] = numpy.nan
+                    else:
+                        radius_dict[atm.element] = edesc.covalent_radius
+            radius = numpy.array(
+                [radius_dict[atm.element] for atm in atom_list], float)
+
+            ## per-atom alt_loc codes, 0 for atoms with no alt_loc
+            alt_loc_dict = {"": 0}
+            for atm in atom_list:
+                if atm.alt_loc not in alt_loc_dict:
+                    alt_loc_dict[atm.alt_loc] = len(alt_loc_dict)
+            alt_loc = numpy.array(
+                [alt_loc_dict[atm.alt_loc] for atm in atom_list], int)
+
+            ## a bond is built if the distance is within the covalent radii
+            ## + 0.54A, and the atoms are in the same conformation
+            xyz_index = GeometryDict.XYZIndex(positions, 2.5)
+            i, j, dist = xyz_index.calc_contact_pairs(2.5)
+            keep = ((dist <= radius[i] + radius[j] + 0.54) &
+                    ((alt_loc[i] == 0) | (alt_loc[j] == 0) |
+                     (alt_loc[i] == alt_loc[j])))
+
+            ## skip atom pairs which are already bonded
+            bonded = {}
+            for bond in iter_atom_bonds(atom_list):
+                bonded[(id(bond.atom1), id(bond.atom2))] = True
+
+            bond_info = (None, None, None, False)
+            for i, j in itertools.izip(i[keep].tolist(), j[keep].tolist()):
+                atm1 = atom_list[i]
+                atm2 = atom_list[j]
+                if (id(atm1), id(atm2)) in bonded or (id(atm2), id(atm1)) in bonded:
+                    continue
+                bond_atoms(atm1, atm2, bond_info)
 
     def add_bonds_from_library(self):
         """Builds bonds for all Fragments in the Structure from bond tables
@@ -715,10 +929,16 @@ class Model(object):
         self.chain_dict       = {}
         self.chain_list       = []
 
+        ## False once a Chain is appended with delay_sort, until the next sort
+        self.chain_list_sorted = True
+
         self.alpha_helix_list = []
         self.beta_sheet_list  = []
         self.site_list        = []
 
+        ## AtomArrays built by get_atom_arrays()
+        self.atom_arrays      = None
+
     def __str__(self):
         return "Model(model_id=%d)" % (self.model_id)
 
@@ -728,6 +948,33 @@ class Model(object):
             model.add_chain(copy.deepcopy(chain, memo), True)
         return model
 
+    def clone(self):
+        """Returns a copy of the Model holding the same Chains, Fragments,
+        Atoms and Bonds as copy.deepcopy() would. The Atoms of the copy
+        share the immutable names and labels of the originals, and their
+        positions, temperature factors, occupancies and U tensors are
+        copied as whole arrays with AtomArrays.clone(). The copy is built
+        without the per-Atom bookkeeping of Fragment.add_atom(), so its
+        cost is dominated by creating the objects.
+        """
+        src_arrays = self.get_atom_arrays()
+        atom_arrays = src_arrays.clone()
+
+        atom_map = {}
+        for atm, atm_cpy in itertools.izip(src_arrays.atom_list,
+                                           atom_arrays.atom_list):
+            atom_map[id(atm)] = atm_cpy
+
+        model = Model(model_id = self.model_id)
+        for chain in self.chain_list:
+            model.add_chain(chain.clone(atom_map), True)
+        model.chain_list_sorted = self.chain_list_sorted
+
+        clone_bonds(src_arrays.atom_list, atom_map)
+        model.atom_arrays = atom_arrays
+
+        return model
+
     def __lt__(self, other):
         assert isinstance(other, Model)
         return int(self.model_id) < int(other.model_id)
@@ -782,10 +1029,17 @@ class Model(object):
     def sort(self):
         """Sorts all Chains in the Model by their chain_id.
         """
-        self.chain_list.sort()
+        self.sort_chains()
         for chain in self.chain_list:
             chain.sort()
 
+    def sort_chains(self):
+        """Sorts the Chains in the Model by their chain_id, without sorting
+        the Fragments within each Chain.
+        """
+        self.chain_list.sort(key = chain_sort_key)
+        self.chain_list_sorted = True
+
     def add_chain(self, chain, delay_sort=False):
         """Adds a Chain to the Model.
         """
@@ -794,12 +1048,28 @@ class Model(object):
         if self.chain_dict.has_key(chain.chain_id):
             raise ChainOverwrite()
 
-        self.chain_list.append(chain)
+        if delay_sort:
+            self.chain_list.append(chain)
+            self.chain_list_sorted = False
+        elif self.chain_list_sorted:
+            insort_sorted(self.chain_list, chain, chain_sort_key)
+        else:
+            self.chain_list.append(chain)
+            self.sort_chains()
+
         self.chain_dict[chain.chain_id] = chain
         chain.model = self
 
-        if not delay_sort:
-            self.chain_list.sort()
+        if self.structure is not None:
+            self.structure.invalidate_caches()
+
+    def add_chains(self, chains):
+        """Adds each Chain in the chains sequence as add_chain() does, then
+        sorts the Chains once at the end.
+        """
+        for chain in chains:
+            self.add_chain(chain, True)
+        self.sort_chains()
 
     def remove_chain(self, chain):
         """Removes the Chain from the Model.
@@ -809,6 +1079,9 @@ class Model(object):
         del self.chain_dict[chain.chain_id]
         chain.model = None
 
+        if self.structure is not None:
+            self.structure.invalidate_caches()
+
     def get_chain(self, chain_id):
         """Returns the Chain object matching the chain_id character.
         """
@@ -1010,6 +1283,40 @@ class Model(object):
         except KeyError:
             return None
 
+    def get_atom_arrays(self):
+        """Returns an AtomArrays object holding the positions, temperature
+        factors, occupancies and U tensors of all the Atoms in the Model,
+        including those in alternate conformations, in contiguous arrays.
+        The AtomArrays is built on the first call and returned again until
+        Atoms are added to or removed from the Model, or until an Atom's
+        position or U is assigned a new array; then it is rebuilt.
+        """
+        atom_list = list(self.iter_all_atoms())
+        if self.atom_arrays is None or not self.atom_arrays.is_valid(atom_list):
+            self.atom_arrays = AtomArrays(atom_list)
+        return self.atom_arrays
+
+    def get_bond_table(self):
+        """Returns the BondTable holding the Bonds of all the Atoms in the
+        Model, including those in alternate conformations, as rows of Atom
+        pairs. The BondTables of the Atoms are merged into one on the first
+        call, and again if Bonds are later created between Atoms of
+        separate tables. Atoms without Bonds are not in the table.
+        """
+        table = None
+        for atm in self.iter_all_atoms():
+            atm_table = atm.bond_table
+            if atm_table is None or atm_table is table:
+                continue
+            if table is None:
+                table = atm_table
+            else:
+                table = merge_bond_tables(table, atm_table)
+
+        if table is None:
+            table = BondTable()
+        return table
+
     def add_alpha_helix(self, alpha_helix):
         """Adds an AlphaHelix object to the Model.
         """
@@ -1077,13 +1384,7 @@ class Model(object):
         iterating over all Atom objects in the same order as iter_atoms(),
         then iterating over each Atom's Bond objects.
         """
-        visited = {}
-        for atm in self.iter_atoms():
-            for bond in atm.iter_bonds():
-                if visited.has_key(bond):
-                    continue
-                yield bond
-                visited[bond] = True
+        return iter_atom_bonds(self.iter_atoms())
 
     def count_bonds(self):
         """Counts all Bond objects.
@@ -1109,7 +1410,7 @@ class Model(object):
             chain.set_model_id(model_id)
 
         if self.structure is not None:
-            self.structure.model_list.sort()
+            self.structure.sort_models()
 
 
 class Segment(object):
@@ -1136,6 +1437,14 @@ class Segment(object):
         self.fragment_list  = []
         self.fragment_dict  = {}
 
+        ## False once a Fragment is appended with delay_sort, until the next
+        ## sort
+        self.fragment_list_sorted = True
+
+        ## fragment_id range index over fragment_list, built on demand
+        ## by get_fragment_index()
+        self.fragment_index = None
+
         ## sequence associated with the segment
         self.sequence = Sequence.Sequence()
 
@@ -1156,6 +1465,28 @@ class Segment(object):
 
         return segment
 
+    def clone(self, atom_map = None):
+        """Returns a copy of the Segment, or Chain, holding copies of its
+        Fragments made by Fragment.clone(). If atom_map is None, the Atoms
+        are copied with Atom.clone() and the Bonds between them are copied
+        too; otherwise see Fragment.clone().
+        """
+        if atom_map is None:
+            atom_map = {}
+            clone_atoms = True
+        else:
+            clone_atoms = False
+
+        segment = self.__class__(model_id = self.model_id, chain_id = self.chain_id)
+        for fragment in self.fragment_list:
+            segment.add_fragment(fragment.clone(atom_map), True)
+        segment.fragment_list_sorted = self.fragment_list_sorted
+
+        if clone_atoms:
+            clone_bonds(self.iter_all_atoms(), atom_map)
+
+        return segment
+
     def __lt__(self, other):
         """Less than operator based on the chain_id.
         """
@@ -1248,7 +1579,70 @@ class Segment(object):
     def sort(self):
         """Sort the Fragments in the Segment into proper order.
         """
-        self.fragment_list.sort()
+        self.fragment_list.sort(key = fragment_sort_key)
+        self.fragment_list_sorted = True
+        self.fragment_index = None
+
+    def get_fragment_index(self):
+        """Returns the fragment_id range index of the Segment, a 2-tuple
+        (key_list, range_dict). key_list holds the fragment_id_key() of
+        each Fragment in fragment_list, and range_dict maps each
+        fragment_id to the (start, stop) slice of fragment_list holding the
+        Fragments with an equal key. If fragment_list is not in sorted
+        order then range_dict is None.
+        """
+        if self.fragment_index is not None and \
+           len(self.fragment_index[0]) == len(self.fragment_list):
+            return self.fragment_index
+
+        key_list = [fragment_id_key(frag.fragment_id) for frag in self.fragment_list]
+        range_dict = {}
+
+        start = 0
+        num_frags = len(key_list)
+        while start < num_frags:
+            key = key_list[start]
+            stop = start + 1
+            while stop < num_frags and key_list[stop] == key:
+                stop += 1
+            if stop < num_frags and key_list[stop] < key:
+                range_dict = None
+                break
+            for i in xrange(start, stop):
+                range_dict[self.fragment_list[i].fragment_id] = (start, stop)
+            start = stop
+
+        self.fragment_index = (key_list, range_dict)
+        return self.fragment_index
+
+    def calc_fragment_range(self, start_frag_id, stop_frag_id):
+        """Returns the 2-tuple (start, stop) so the slice
+        fragment_list[start:stop] holds the Fragments from start_frag_id to
+        stop_frag_id inclusive, or None if the Segment is not sorted. Either
+        fragment_id may be None to take the range from the beginning or to
+        the end of the Segment, and neither has to be in the Segment.
+        """
+        key_list, range_dict = self.get_fragment_index()
+        if range_dict is None:
+            return None
+        if not key_list:
+            return 0, 0
+
+        if not start_frag_id:
+            start = 0
+        elif range_dict.has_key(start_frag_id):
+            start = range_dict[start_frag_id][0]
+        else:
+            start = bisect.bisect_left(key_list, fragment_id_key(start_frag_id))
+
+        if not stop_frag_id:
+            stop = len(key_list)
+        elif range_dict.has_key(stop_frag_id):
+            stop = range_dict[stop_frag_id][1]
+        else:
+            stop = bisect.bisect_right(key_list, fragment_id_key(stop_frag_id))
+
+        return start, max(start, stop)
 
     def construct_segment(self):
         """Constructs a new Segment object so that it has a valid .chain
@@ -1269,9 +1663,8 @@ class Segment(object):
         the beginning of this Segment, and if stop_frag_id is None it is taken 
         to the end of this Segment.
         """
-        fragiter = iter_fragments(iter(self.fragment_list), start_frag_id, stop_frag_id)
         segment = self.construct_segment()
-        for frag in fragiter:
+        for frag in self.iter_fragments(start_frag_id, stop_frag_id):
             segment.add_fragment(frag, True)
         return segment
 
@@ -1286,11 +1679,25 @@ class Segment(object):
         if self.fragment_dict.has_key(fragment.fragment_id):
             raise FragmentOverwrite()
 
-        self.fragment_list.append(fragment)
+        if delay_sort:
+            self.fragment_list.append(fragment)
+            self.fragment_list_sorted = False
+        elif self.fragment_list_sorted:
+            insort_sorted(self.fragment_list, fragment, fragment_sort_key)
+        else:
+            self.fragment_list.append(fragment)
+            self.sort()
+
         self.fragment_dict[fragment.fragment_id] = fragment
+        self.fragment_index = None
 
-        if not delay_sort:
-            self.fragment_list.sort()
+    def add_fragments(self, fragments):
+        """Adds each Fragment in the fragments sequence as add_fragment()
+        does, then sorts the Fragments once at the end.
+        """
+        for fragment in fragments:
+            self.add_fragment(fragment, True)
+        self.sort()
 
     def remove_fragment(self, fragment):
         """Removes a Fragment object from the Segment.
@@ -1298,6 +1705,7 @@ class Segment(object):
         assert isinstance(fragment, Fragment)
         self.fragment_list.remove(fragment)
         del self.fragment_dict[fragment.fragment_id]
+        self.fragment_index = None
 
     def get_fragment(self, fragment_id):
         """Returns the PDB fragment uniquely identified by its fragment_id.
@@ -1310,7 +1718,15 @@ class Segment(object):
         """Iterates over all Fragment objects. The iteration is performed in
         order according to the Fragment's position within the Segment object.
         """
-        return iter_fragments(iter(self.fragment_list), frag_id_begin, frag_id_end)
+        if not frag_id_begin and not frag_id_end:
+            return iter(self.fragment_list)
+
+        frag_range = self.calc_fragment_range(frag_id_begin, frag_id_end)
+        if frag_range is None:
+            return iter_fragments(iter(self.fragment_list), frag_id_begin, frag_id_end)
+
+        start, stop = frag_range
+        return iter(self.fragment_list[start:stop])
 
     def count_fragments(self):
         """Return the number of Fragment objects.
@@ -1488,13 +1904,7 @@ class Segment(object):
         """Iterates over all Bond objects attached to Atom objects within the
         Segment.
         """
-        visited = {}
-        for atm in self.iter_atoms():
-            for bond in atm.iter_bonds():
-                if visited.has_key(bond):
-                    continue
-                yield bond
-                visited[bond] = True
+        return iter_atom_bonds(self.iter_atoms())
 
     def get_chain(self):
         """Returns the Chain object this Segment is part of.
@@ -1623,12 +2033,16 @@ class Chain(Segment):
         Segment.add_fragment(self, fragment, delay_sort)
         fragment.chain = self
 
+        invalidate_structure_caches(self)
+
     def remove_fragment(self, fragment):
         """Remove the Fragment from the Chain.
         """
         Segment.remove_fragment(self, fragment)
         fragment.chain = None
 
+        invalidate_structure_caches(self)
+
     def set_chain_id(self, chain_id):
         """Sets a new ID for the Chain, updating the chain_id
         for all objects in the Structure hierarchy.
@@ -1643,7 +2057,7 @@ class Chain(Segment):
 
         ## resort the parent structure
         if self.model is not None:
-            self.model.chain_list.sort()
+            self.model.sort_chains()
 
 
 class Fragment(object):
@@ -1658,6 +2072,11 @@ class Fragment(object):
     Fragment.res_seq      - the sequence id of the fragment/residue
     Fragment.chain_id     - the ID of the chain containing this fragment
     """
+    __slots__ = ["chain", "model_id", "chain_id", "fragment_id", "res_name",
+                 "default_alt_loc", "atom_order_list", "alt_loc_dict",
+                 "atom_list", "atom_dict", "atom_order_index",
+                 "atom_list_index", "__dict__", "__weakref__"]
+
     def __init__(self,
                  model_id    = 1,
                  chain_id    = "",
@@ -1691,6 +2110,12 @@ class Fragment(object):
         self.atom_list       = []
         self.atom_dict       = {}
 
+        ## atom name->position of its entry in atom_order_list and of its
+        ## Atom in atom_list, made by find_entry() for a Fragment with
+        ## alt_locs, None until then
+        self.atom_order_index = None
+        self.atom_list_index  = None
+
     def __str__(self):
         return "Frag(%s,%s,%s)" % (
             self.res_name,
@@ -1709,6 +2134,58 @@ class Fragment(object):
 
         return fragment
 
+    def clone(self, atom_map = None):
+        """Returns a copy of the Fragment, of the same class, with the same
+        alt_loc arrangement and default_alt_loc. If atom_map is None, the
+        Atoms are copied with Atom.clone() and the Bonds between them are
+        copied too. Otherwise atom_map maps the id() of each Atom to its
+        copy; Atoms missing from it are copied with Atom.clone() and added
+        to it, and the caller copies the Bonds with clone_bonds().
+        """
+        if atom_map is None:
+            atom_map = {}
+            clone_atoms = True
+        else:
+            clone_atoms = False
+
+        fragment = self.__class__(
+            model_id    = self.model_id,
+            chain_id    = self.chain_id,
+            fragment_id = self.fragment_id,
+            res_name    = self.res_name)
+        fragment.default_alt_loc = self.default_alt_loc
+
+        for entry in self.atom_order_list:
+            if isinstance(entry, Atom):
+                atom = atom_map.get(id(entry))
+                if atom is None:
+                    atom = atom_map[id(entry)] = entry.clone()
+                atom.fragment = fragment
+                fragment.atom_order_list.append(atom)
+                continue
+
+            altloc = Altloc()
+            for alt_loc, atm in entry.iteritems():
+                atom = atom_map.get(id(atm))
+                if atom is None:
+                    atom = atom_map[id(atm)] = atm.clone()
+                atom.fragment = fragment
+                atom.altloc = altloc
+                altloc[alt_loc] = atom
+                name = atom.name
+            fragment.alt_loc_dict[name] = altloc
+            fragment.atom_order_list.append(altloc)
+
+        for atm in self.atom_list:
+            atom = atom_map[id(atm)]
+            fragment.atom_list.append(atom)
+            fragment.atom_dict[atom.name] = atom
+
+        if clone_atoms:
+            clone_bonds(self.iter_all_atoms(), atom_map)
+
+        return fragment
+
     def __lt__(self, other):
         assert isinstance(other, Fragment)
         return fragment_id_lt(self.fragment_id, other.fragment_id)
@@ -1803,6 +2280,90 @@ class Fragment(object):
                         self.atom_list.append(atmx)
                     self.atom_dict[atmx.name] = atmx
 
+    def find_entry(self, index_name, name, entry):
+        """Returns the position of entry, the Atom or Altloc of the atom
+        name, in atom_order_list or atom_list through the index named by
+        index_name, atom_order_index or atom_list_index. The index is made
+        if it is None, and rebuilt if the list was changed without it.
+        """
+        if index_name == "atom_order_index":
+            entry_list = self.atom_order_list
+        else:
+            entry_list = self.atom_list
+
+        entry_index = getattr(self, index_name)
+        if entry_index is not None:
+            i = entry_index.get(name)
+            if i is not None and i < len(entry_list) and entry_list[i] is entry:
+                return i
+
+        entry_index = {}
+        setattr(self, index_name, entry_index)
+        for i, entryx in enumerate(entry_list):
+            if isinstance(entryx, Atom):
+                entry_index[entryx.name] = i
+            else:
+                for atm in entryx.itervalues():
+                    entry_index[atm.name] = i
+                    break
+
+        i = entry_index.get(name)
+        if i is None or entry_list[i] is not entry:
+            raise ValueError, "entry not in list"
+        return i
+
+    def index_appended_entry(self, name, selected = True):
+        """Adds the positions of the entry of the atom name about to be
+        appended to atom_order_list, and of its Atom about to be appended
+        to atom_list if it is selected, to the indexes made by find_entry().
+        """
+        if self.atom_order_index is not None:
+            self.atom_order_index[name] = len(self.atom_order_list)
+        if selected and self.atom_list_index is not None:
+            self.atom_list_index[name] = len(self.atom_list)
+
+    def update_alt_loc_selection(self, altloc, name):
+        """Updates the atom_list and atom_dict entries of the single Altloc
+        for the Atom name after Atoms are added to it, selecting its Atom
+        for the default_alt_loc the same way set_default_alt_loc() does for
+        every Atom in the Fragment.
+        """
+        atom = altloc.get(self.default_alt_loc)
+        current = self.atom_dict.get(name)
+        if current is atom:
+            return
+
+        if current is not None:
+            i = self.find_entry("atom_list_index", name, current)
+            if atom is None:
+                del self.atom_list[i]
+                del self.atom_dict[name]
+                del self.atom_list_index[name]
+                for j in xrange(i, len(self.atom_list)):
+                    self.atom_list_index[self.atom_list[j].name] = j
+            else:
+                self.atom_list[i] = atom
+                self.atom_dict[name] = atom
+            return
+
+        ## insert the Atom after the selected Atom of the closest preceding
+        ## entry in atom_order_list
+        i = 0
+        k = self.find_entry("atom_order_index", name, altloc)
+        for j in xrange(k - 1, -1, -1):
+            prev = self.atom_order_list[j]
+            if not isinstance(prev, Atom):
+                prev = prev.get(self.default_alt_loc)
+            if prev is not None:
+                i = self.find_entry("atom_list_index", prev.name, prev) + 1
+                break
+
+        self.atom_list.insert(i, atom)
+        self.atom_dict[name] = atom
+        if self.atom_list_index is not None:
+            for j in xrange(i, len(self.atom_list)):
+                self.atom_list_index[self.atom_list[j].name] = j
+
     def add_atom(self, atom):
         """Adds an atom to the fragment, and sets the atom's atom.fragment
         attribute to the fragment.
@@ -1825,6 +2386,7 @@ class Fragment(object):
                 ##     it is, otherwise, add the atom to the fragment
 
                 if not self.atom_dict.has_key(name):
+                    self.index_appended_entry(name)
                     self.atom_order_list.append(atom)
                     self.atom_list.append(atom)
                     self.atom_dict[name] = atom
@@ -1841,14 +2403,14 @@ class Fragment(object):
                     msg += "automatically assigning ALTLOC labels"
                     ConsoleOutput.warning(msg)
 
-                    iA = self.atom_order_list.index(atomA)
+                    iA = self.find_entry("atom_order_index", name, atomA)
 
                     self.alt_loc_dict[name] = altloc = Altloc()
                     self.atom_order_list[iA] = altloc
 
                     altloc.add_atom(atomA)
                     altloc.add_atom(atom)
-                    self.set_default_alt_loc(self.default_alt_loc)
+                    self.update_alt_loc_selection(altloc, name)
 
             else:
                 ## CASE:
@@ -1859,7 +2421,7 @@ class Fragment(object):
                 ##    and add it to the fragment
                 altloc = self.alt_loc_dict[name]
                 altloc.add_atom(atom)
-                self.set_default_alt_loc(self.default_alt_loc)
+                self.update_alt_loc_selection(altloc, name)
 
         else: ## alt_loc!=""
 
@@ -1884,10 +2446,13 @@ class Fragment(object):
                     self.alt_loc_dict[name] = altloc = Altloc()
                     altloc.add_atom(atom)
 
+                    self.index_appended_entry(
+                        name, atom.alt_loc == self.default_alt_loc)
                     self.atom_order_list.append(altloc)
 
-                    self.atom_list.append(atom)
-                    self.atom_dict[name] = atom
+                    if atom.alt_loc == self.default_alt_loc:
+                        self.atom_list.append(atom)
+                        self.atom_dict[name] = atom
 
                 else:
                     ## CASE:
@@ -1897,13 +2462,14 @@ class Fragment(object):
                     ##     in the Altloc container before adding the new
                     ##     atom
                     atomA = self.atom_dict[name]
-                    iA = self.atom_order_list.index(atomA)
+                    iA = self.find_entry("atom_order_index", name, atomA)
 
                     self.alt_loc_dict[name] = altloc = Altloc()
                     self.atom_order_list[iA] = altloc
 
                     altloc.add_atom(atomA)
                     altloc.add_atom(atom)
+                    self.update_alt_loc_selection(altloc, name)
 
             else:
                 ## CASE:
@@ -1912,11 +2478,12 @@ class Fragment(object):
                 ##     partner atoms in the fragment
                 altloc = self.alt_loc_dict[name]
                 altloc.add_atom(atom)
-
-            self.set_default_alt_loc(self.default_alt_loc)
+                self.update_alt_loc_selection(altloc, name)
 
         atom.fragment = self
 
+        invalidate_structure_caches(self)
+
     def remove_atom(self, atom):
         """Removes the Atom instance from the Fragment.
         """
@@ -1939,6 +2506,8 @@ class Fragment(object):
 
         atom.fragment = None
 
+        invalidate_structure_caches(self)
+
     def get_atom(self, name, alt_loc = None):
         """Returns the matching Atom instance contained in the Fragment.
         Returns None if a match is not found. If alt_loc is not given,
@@ -2000,12 +2569,7 @@ class Fragment(object):
         """Iterates over all Bond objects. The iteration is preformed by
         iterating over all Atom objects in the same order as iter_atoms(),
         then iterating over each Atom's Bond objects."""
-        visited = {}
-        for atm in self.iter_atoms():
-            for bond in atm.iter_bonds():
-                if not visited.has_key(bond):
-                    yield bond
-                    visited[bond] = True
+        return iter_atom_bonds(self.iter_atoms())
 
     def get_offset_fragment(self, offset):
         """Returns the fragment in the same chain at integer offset from
@@ -2100,6 +2664,8 @@ class Fragment(object):
         for atm in self.iter_atoms():
             atm.set_chain_id(chain_id)
 
+        invalidate_structure_caches(self)
+
     def set_fragment_id(self, fragment_id):
         """Sets the fragment_id of the Fragment and all contained Atom
         objects.
@@ -2119,6 +2685,8 @@ class Fragment(object):
         if self.chain is not None:
             self.chain.sort()
 
+        invalidate_structure_caches(self)
+
     def set_res_name(self, res_name):
         """Sets the res_name of the Fragment and all contained Atom
         objects.
@@ -2129,6 +2697,8 @@ class Fragment(object):
         for atm in self.iter_atoms():
             atm.set_res_name(res_name)
 
+        invalidate_structure_caches(self)
+
 
 class Residue(Fragment):
     """A subclass of Fragment representing one residue in a polymer chain.
@@ -2489,7 +3059,27 @@ class Atom(object):
     Atom.label_seq_id -
                        sequence id corresponding to entity_poly_seq_num
                        and struct_conn.ptnr?_label_seq_id
+    Atom.atom_arrays - the AtomArrays the Atom's position, U, temp_factor
+                       and occupancy are stored in, or None; see
+                       Model.get_atom_arrays()
+    Atom.bond_table  - the BondTable the Atom's Bonds are stored in, or
+                       None if it has no Bonds
+
+    The attributes above are __slots__, so an Atom has no per-instance
+    __dict__ until an attribute outside of them is assigned.  The budget
+    for one Atom object and its position and U array views is 600 bytes
+    on 64-bit CPython; tests/atom_memory_bench.py measures it on a
+    ribosome-sized structure.
     """
+    __slots__ = ["fragment", "altloc", "name", "alt_loc", "res_name",
+                 "fragment_id", "chain_id", "asym_id", "model_id", "element",
+                 "_temp_factor", "column6768", "sig_temp_factor", "_occupancy",
+                 "sig_occupancy", "charge", "label_entity_id", "label_asym_id",
+                 "label_seq_id", "_position", "sig_position", "U", "sig_U",
+                 "bond_table", "bond_table_index", "atom_arrays",
+                 "atom_arrays_index",
+                 "__dict__", "__weakref__"]
+
     def __init__(
         self,
         name            = "",
@@ -2536,6 +3126,7 @@ class Atom(object):
 
         self.fragment        = None
         self.altloc          = None
+        self.atom_arrays     = None
 
         self.name            = name
         self.alt_loc         = alt_loc
@@ -2545,10 +3136,10 @@ class Atom(object):
         self.asym_id         = chain_id
         self.model_id        = model_id
         self.element         = element
-        self.temp_factor     = temp_factor
+        self._temp_factor    = temp_factor
         self.column6768      = column6768
         self.sig_temp_factor = sig_temp_factor
-        self.occupancy       = occupancy
+        self._occupancy      = occupancy
         self.sig_occupancy   = sig_occupancy
         self.charge          = charge
         self.label_entity_id = label_entity_id
@@ -2591,7 +3182,50 @@ class Atom(object):
         else:
             self.sig_U = None
 
-        self.bond_list = []
+        self.bond_table = None
+        self.bond_table_index = None
+
+    def _get_temp_factor(self):
+        arrays = self.atom_arrays
+        if arrays is None:
+            return self._temp_factor
+        return arrays.get_value(arrays.temp_factor, self.atom_arrays_index)
+
+    def _set_temp_factor(self, temp_factor):
+        arrays = self.atom_arrays
+        if arrays is None:
+            self._temp_factor = temp_factor
+        else:
+            arrays.set_value(arrays.temp_factor, self.atom_arrays_index, temp_factor)
+
+    temp_factor = property(_get_temp_factor, _set_temp_factor)
+
+    def _get_position(self):
+        return self._position
+
+    def _set_position(self, position):
+        self._position = position
+        arrays = self.atom_arrays
+        if arrays is not None:
+            arrays.position_version += 1
+            arrays.version += 1
+
+    position = property(_get_position, _set_position)
+
+    def _get_occupancy(self):
+        arrays = self.atom_arrays
+        if arrays is None:
+            return self._occupancy
+        return arrays.get_value(arrays.occupancy, self.atom_arrays_index)
+
+    def _set_occupancy(self, occupancy):
+        arrays = self.atom_arrays
+        if arrays is None:
+            self._occupancy = occupancy
+        else:
+            arrays.set_value(arrays.occupancy, self.atom_arrays_index, occupancy)
+
+    occupancy = property(_get_occupancy, _set_occupancy)
 
     def __str__(self):
         return "Atom(n=%s alt=%s res=%s chn=%s frag=%s mdl=%d)" % (
@@ -2625,24 +3259,72 @@ class Atom(object):
             label_asym_id   = self.label_asym_id,
             label_seq_id    = self.label_seq_id)
 
-        for bond in self.bond_list:
+        for bond in self.iter_bonds():
             partner = bond.get_partner(self)
             if memo.has_key(id(partner)):
                 partner_cpy = memo[id(partner)]
-                bond_cpy = copy.deepcopy(bond, memo)
+                bond_info = bond.bond_table.get_bond_info(bond.bond_id)
 
-                if bond.atom1 == self:
-                    bond_cpy.atom1 = atom_cpy
-                    bond_cpy.atom2 = partner_cpy
+                if bond.atom1 is self:
+                    bond_atoms(atom_cpy, partner_cpy, bond_info)
                 else:
-                    bond_cpy.atom1 = partner_cpy
-                    bond_cpy.atom2 = atom_cpy
-
-                atom_cpy.bond_list.append(bond_cpy)
-                partner_cpy.bond_list.append(bond_cpy)
+                    bond_atoms(partner_cpy, atom_cpy, bond_info)
 
         return atom_cpy
 
+    def clone(self, position = None, U = None):
+        """Returns a copy of the Atom which shares its immutable attributes
+        and has copies of its position, sig_position, U and sig_U arrays.
+        The position and U arrays to give the copy, for example rows of an
+        AtomArrays, may be passed instead. The copy is not in a Fragment,
+        has no Bonds, and is not bound to an AtomArrays.
+        """
+        atom = Atom.__new__(Atom)
+
+        atom.fragment        = None
+        atom.altloc          = None
+        atom.atom_arrays     = None
+
+        atom.name            = self.name
+        atom.alt_loc         = self.alt_loc
+        atom.res_name        = self.res_name
+        atom.fragment_id     = self.fragment_id
+        atom.chain_id        = self.chain_id
+        atom.asym_id         = self.asym_id
+        atom.model_id        = self.model_id
+        atom.element         = self.element
+        atom._temp_factor    = self.temp_factor
+        atom.column6768      = self.column6768
+        atom.sig_temp_factor = self.sig_temp_factor
+        atom._occupancy      = self.occupancy
+        atom.sig_occupancy   = self.sig_occupancy
+        atom.charge          = self.charge
+        atom.label_entity_id = self.label_entity_id
+        atom.label_asym_id   = self.label_asym_id
+        atom.label_seq_id    = self.label_seq_id
+
+        if position is None and self.position is not None:
+            position = self.position.copy()
+        atom.position = position
+
+        if U is None and self.U is not None:
+            U = self.U.copy()
+        atom.U = U
+
+        if self.sig_position is not None:
+            atom.sig_position = self.sig_position.copy()
+        else:
+            atom.sig_position = None
+
+        if self.sig_U is not None:
+            atom.sig_U = self.sig_U.copy()
+        else:
+            atom.sig_U = None
+
+        atom.bond_table = None
+        atom.bond_table_index = None
+        return atom
+
     def __lt__(self, other):
         assert isinstance(other, Atom)
 
@@ -2835,15 +3517,8 @@ class Atom(object):
                 (self.alt_loc == "" and atom.alt_loc != "") or
                 (self.alt_loc != "" and atom.alt_loc == ""))
 
-        bond = Bond(atom1             = self,
-                    atom2             = atom,
-                    bond_type         = bond_type,
-                    atom1_symop       = atom1_symop,
-                    atom2_symop       = atom2_symop,
-                    standard_res_bond = standard_res_bond)
-
-        self.bond_list.append(bond)
-        atom.bond_list.append(bond)
+        bond_atoms(self, atom, (bond_type, atom1_symop, atom2_symop,
+                                standard_res_bond))
 
     def create_bonds(self,
                      atom              = None,
@@ -2904,24 +3579,41 @@ class Atom(object):
         assert isinstance(atom, Atom)
         assert atom != self
 
-        for bond in self.bond_list:
-            if atom == bond.atom1 or atom == bond.atom2:
-                return bond
+        table = self.bond_table
+        if table is None or atom.bond_table is not table:
+            return None
+
+        row = self.bond_table_index
+        for bond_id in table.iter_bond_ids(row):
+            if table.get_partner_row(bond_id, row) == atom.bond_table_index:
+                return Bond(table, bond_id)
         return None
 
     def iter_bonds(self):
         """Iterates over all the Bond edges connected to self.
         """
-        for bond in self.bond_list:
-            yield bond
+        table = self.bond_table
+        if table is None:
+            return
+        for bond_id in table.iter_bond_ids(self.bond_table_index):
+            yield Bond(table, bond_id)
+
+    def _get_bond_list(self):
+        return list(self.iter_bonds())
+
+    ## a new list of the Bonds made by iter_bonds() on each access
+    bond_list = property(_get_bond_list)
 
     def iter_bonded_atoms(self):
         """Iterates over all the Atoms bonded to self.
         """
-        for bond in self.iter_bonds():
-            partner = bond.get_partner(self)
-            assert partner is not None
-            yield partner
+        table = self.bond_table
+        if table is None:
+            return
+        row = self.bond_table_index
+        atom_list = table.atom_list
+        for bond_id in table.iter_bond_ids(row):
+            yield atom_list[table.get_partner_row(bond_id, row)]
 
     def get_bonded_atom(self, name_list):
         """From atom, follow the bonding path specified by a sequence of atom 
@@ -3027,10 +3719,17 @@ class Atom(object):
         listx = []
 
         if max_distance:
-            for atm in self.get_structure().iter_atoms():
+            ## candidates from the Structure's spatial index, with a margin
+            ## for rounding differences from AtomMath.calc_distance
+            struct = self.get_structure()
+            xyz_index, atom_list = struct.get_xyz_index()
+            p, d = xyz_index.calc_sphere_intersection(
+                self.position, max_distance + 1.0e-6)
+            for i in p:
+                atm = atom_list[i]
                 d = AtomMath.calc_distance(self, atm)
                 if d <= max_distance:
-                    listx.append((AtomMath.calc_distance(self, atm), atm))
+                    listx.append((d, atm))
         else:
             for atm in self.get_structure().iter_atoms():
                 listx.append((AtomMath.calc_distance(self, atm), atm))
@@ -3054,6 +3753,8 @@ class Atom(object):
         for atm in self.iter_alt_loc():
             atm.chain_id = chain_id
 
+        invalidate_structure_caches(self)
+
     def set_fragment_id(self, fragment_id):
         """Sets the fragment_id of the Atom and all alt_loc Atom
         objects.
@@ -3062,6 +3763,8 @@ class Atom(object):
         for atm in self.iter_alt_loc():
             atm.fragment_id = fragment_id
 
+        invalidate_structure_caches(self)
+
     def set_res_name(self, res_name):
         """Sets the fragment_id of the Atom and all alt_loc Atom
         objects.
@@ -3070,44 +3773,609 @@ class Atom(object):
         for atm in self.iter_alt_loc():
             atm.res_name = res_name
 
+        invalidate_structure_caches(self)
+
+
+class AtomArrays(object):
+    """Contiguous arrays holding the positions, temperature factors,
+    occupancies and anisotropic U tensors of a list of Atoms, built by
+    Model.get_atom_arrays() for whole-model vectorized calculations. Row i
+    of each array belongs to atom_list[i].
+
+    Each Atom's position and U become views of its rows, and its temp_factor
+    and occupancy are read from and written to its rows, so changes made in
+    place through either the Atoms or the arrays are seen by both. Assigning
+    a new array to an Atom's position or U detaches it from its row; the
+    Model then builds new arrays on the next get_atom_arrays() call instead
+    of writing over the old ones, which other code may still reference.
+
+    Assigning an Atom's position, and setting values through set_value(),
+    increments the version counters the Structure caches are checked
+    against; writes made in place to the arrays or an Atom's position row
+    do not, and must be followed by Structure.invalidate_caches().
+
+    AtomArrays.atom_list     - the Atoms
+    AtomArrays.position      - numpy.array[N,3]
+    AtomArrays.position_mask - numpy.array[N] of bool, False for Atoms with
+                               no position
+    AtomArrays.U             - numpy.array[N,3,3]
+    AtomArrays.U_mask        - numpy.array[N] of bool, False for Atoms with
+                               no U
+    AtomArrays.temp_factor   - numpy.array[N], NaN for Atoms with none
+    AtomArrays.occupancy     - numpy.array[N], NaN for Atoms with none
+    AtomArrays.version       - incremented when a value of an Atom is set
+    AtomArrays.position_version -
+                               incremented when an Atom's position is set
+    """
+    def __init__(self, atom_list):
+        num_atoms = len(atom_list)
+
+        self.version          = 0
+        self.position_version = 0
+
+        self.atom_list     = atom_list
+        self.position      = numpy.zeros((num_atoms, 3), float)
+        self.position_mask = numpy.zeros(num_atoms, bool)
+        self.U             = numpy.zeros((num_atoms, 3, 3), float)
+        self.U_mask        = numpy.zeros(num_atoms, bool)
+        self.temp_factor   = numpy.zeros(num_atoms, float)
+        self.occupancy     = numpy.zeros(num_atoms, float)
+
+        ## the position and U row views bound to each Atom, or None
+        self.position_rows = [None] * num_atoms
+        self.U_rows        = [None] * num_atoms
+
+        for i, atm in enumerate(atom_list):
+            self.temp_factor[i] = self.nan_if_none(atm.temp_factor)
+            self.occupancy[i]   = self.nan_if_none(atm.occupancy)
+
+            ## the Atom's values are now set through this AtomArrays, so
+            ## the caches built from the one it was bound to are stale
+            if atm.atom_arrays is not None:
+                atm.atom_arrays.version += 1
+                atm.atom_arrays.position_version += 1
+
+            if atm.position is not None:
+                row = self.position[i]
+                row[:] = atm.position
+                self.position_mask[i] = True
+                self.position_rows[i] = row
+                atm.position = row
+
+            if atm.U is not None:
+                row = self.U[i]
+                row[:] = atm.U
+                self.U_mask[i] = True
+                self.U_rows[i] = row
+                atm.U = row
+
+            atm.atom_arrays = self
+            atm.atom_arrays_index = i
+
+    def __len__(self):
+        return len(self.atom_list)
+
+    def nan_if_none(self, value):
+        if value is None:
+            return numpy.nan
+        return value
+
+    def get_value(self, array, i):
+        """Returns element i of the temp_factor or occupancy array as a
+        float, or None if it is NaN.
+        """
+        value = array[i]
+        if value != value:
+            return None
+        return float(value)
+
+    def set_value(self, array, i, value):
+        """Sets element i of the temp_factor or occupancy array; None is
+        stored as NaN.
+        """
+        array[i] = self.nan_if_none(value)
+        self.version += 1
+
+    def is_valid(self, atom_list):
+        """Returns True if the AtomArrays holds exactly the Atoms of
+        atom_list, in order, and every Atom's position and U are still
+        its row views.
+        """
+        if atom_list != self.atom_list:
+            return False
+        for i, atm in enumerate(atom_list):
+            if atm.atom_arrays is not self:
+                return False
+            if atm.position is not self.position_rows[i]:
+                return False
+            if atm.U is not self.U_rows[i]:
+                return False
+        return True
+
+    def get_U6(self):
+        """Returns a new numpy.array[N,6] of the unique U tensor values
+        (u11, u22, u33, u12, u13, u23) of each Atom.
+        """
+        U = self.U
+        return numpy.column_stack((U[:,0,0], U[:,1,1], U[:,2,2],
+                                   U[:,0,1], U[:,0,2], U[:,1,2]))
+
+    def clone(self):
+        """Returns a new AtomArrays holding copies of the arrays and a copy
+        of each Atom made by Atom.clone(), bound to its copied rows.
+        """
+        arrays = AtomArrays([])
+
+        arrays.position      = self.position.copy()
+        arrays.position_mask = self.position_mask.copy()
+        arrays.U             = self.U.copy()
+        arrays.U_mask        = self.U_mask.copy()
+        arrays.temp_factor   = self.temp_factor.copy()
+        arrays.occupancy     = self.occupancy.copy()
+
+        num_atoms = len(self.atom_list)
+        arrays.position_rows = [None] * num_atoms
+        arrays.U_rows        = [None] * num_atoms
+
+        for i, atm in enumerate(self.atom_list):
+            position = None
+            if self.position_rows[i] is not None:
+                position = arrays.position_rows[i] = arrays.position[i]
+
+            U = None
+            if self.U_rows[i] is not None:
+                U = arrays.U_rows[i] = arrays.U[i]
+
+            atm_cpy = atm.clone(position, U)
+            atm_cpy.atom_arrays = arrays
+            atm_cpy.atom_arrays_index = i
+            arrays.atom_list.append(atm_cpy)
+
+        return arrays
+
+
+class AtomTable(object):
+    """Column arrays of the labels of the Atoms of an AtomArrays, used with
+    its position, temperature factor and occupancy arrays to evaluate the
+    vectorized masks of Selection strings. Row i of each column belongs to
+    atom_list[i]. Built by Structure.get_atom_table(), which also drops it
+    when the Structure changes, taking the cached selections with it. The
+    selections and the spatial index are dropped when the version of the
+    AtomArrays changes.
+
+    AtomTable.atom_list   - the Atoms
+    AtomTable.atom_arrays - the AtomArrays of the Atoms
+    AtomTable.chain_id    - numpy.array[N] of str
+    AtomTable.fragment_id - numpy.array[N] of str
+    AtomTable.res_seq     - numpy.array[N] of int, the sequence number of
+                            the fragment_id
+    AtomTable.icode       - numpy.array[N] of str, the insertion code of the
+                            fragment_id, or "" for none
+    AtomTable.res_mask    - numpy.array[N] of bool, False for Atoms with a
+                            fragment_id which is not a sequence number
+    AtomTable.res_name    - numpy.array[N] of str
+    AtomTable.name        - numpy.array[N] of str
+    AtomTable.element     - numpy.array[N] of str
+    AtomTable.alt_loc     - numpy.array[N] of str
+    """
+    def __init__(self, atom_arrays):
+        atom_list = atom_arrays.atom_list
+        num_atoms = len(atom_list)
+
+        self.atom_list   = atom_list
+        self.atom_arrays = atom_arrays
+
+        self.chain_id    = self.str_column([atm.chain_id for atm in atom_list])
+        self.fragment_id = self.str_column([atm.fragment_id for atm in atom_list])
+        self.res_name    = self.str_column([atm.res_name for atm in atom_list])
+        self.name        = self.str_column([atm.name for atm in atom_list])
+        self.element     = self.str_column([atm.element for atm in atom_list])
+        self.alt_loc     = self.str_column([atm.alt_loc for atm in atom_list])
+
+        self.res_seq  = numpy.zeros(num_atoms, int)
+        self.res_mask = numpy.zeros(num_atoms, bool)
+        icode_list = [""] * num_atoms
+
+        for i, atm in enumerate(atom_list):
+            try:
+                res_seq, icode = fragment_id_key(atm.fragment_id)
+            except ValueError:
+                continue
+            self.res_seq[i] = res_seq
+            self.res_mask[i] = True
+            if icode is not None:
+                icode_list[i] = icode
+
+        self.icode = self.str_column(icode_list)
+
+        ## XYZIndex of the Atoms with positions, and their rows, built at
+        ## AtomArrays.position_version xyz_version
+        self.xyz_index   = None
+        self.xyz_rows    = None
+        self.xyz_version = None
+
+        ## selection string -> (mask, AtomList), evaluated at
+        ## AtomArrays.version selection_version; it is emptied when it grows
+        ## to Selection.SELECTION_MASK_CACHE_SIZE entries
+        self.selection_cache   = {}
+        self.selection_version = atom_arrays.version
+
+    def __len__(self):
+        return len(self.atom_list)
+
+    def str_column(self, values):
+        """Returns the list of strings as a numpy string array.
+        """
+        return numpy.array(values, dtype = str).reshape(len(values))
+
+    def get_xyz_index(self):
+        """Returns the 2-tuple (xyz_index, xyz_rows) of the
+        GeometryDict.XYZIndex of the Atoms with a position, and the array of
+        their rows in the table.
+        """
+        arrays = self.atom_arrays
+        if self.xyz_index is None or self.xyz_version != arrays.position_version:
+            self.xyz_rows = numpy.nonzero(arrays.position_mask)[0]
+            self.xyz_index = GeometryDict.XYZIndex(
+                arrays.position[self.xyz_rows], 4.0)
+            self.xyz_version = arrays.position_version
+        return self.xyz_index, self.xyz_rows
+
+    def get_selection(self, selection):
+        """Returns the cached 2-tuple (mask, AtomList) of the selection
+        string, evaluating it on first use and again after the values of
+        the Atoms change.
+        """
+        if self.selection_version != self.atom_arrays.version:
+            self.selection_cache = {}
+            self.selection_version = self.atom_arrays.version
+
+        try:
+            return self.selection_cache[selection]
+        except KeyError:
+            pass
+
+        mask = Selection.compile_selection(selection).calc_mask(self)
+        atom_list = AtomList([self.atom_list[i] for i in numpy.nonzero(mask)[0]])
+
+        if len(self.selection_cache) >= Selection.SELECTION_MASK_CACHE_SIZE:
+            self.selection_cache.clear()
+        result = self.selection_cache[selection] = (mask, atom_list)
+        return result
+
+    def calc_selection_mask(self, selection):
+        """Returns the numpy.array[N] of bool which is True for the Atoms
+        matched by the selection string.
+        """
+        return self.get_selection(selection)[0]
+
+    def select_atoms(self, selection):
+        """Returns the AtomList of the Atoms matched by the selection
+        string.
+        """
+        return self.get_selection(selection)[1]
+
+
+class BondTable(object):
+    """Compact store of the Bonds between a set of Atoms. The Atoms are
+    numbered by their row in atom_list, and a Bond is held as the rows of
+    its two Atoms and a code for its bond_type, symmetry operations and
+    standard_res_bond flag, so it costs a few bytes instead of a Python
+    object listed by both Atoms. The Bonds of each Atom are found through a
+    compressed sparse row (CSR) adjacency, built on first use and extended
+    as Bonds are added.
+
+    A bonded Atom refers to its BondTable and row by its bond_table and
+    bond_table_index attributes. Bonding Atoms of two BondTables merges the
+    smaller table into the larger, and Model.get_bond_table() merges the
+    tables of all the Atoms of a Model into one.
+
+    BondTable.atom_list - the Atoms, by row
+    BondTable.atom1     - array of int, the row of atom #1 of each Bond
+    BondTable.atom2     - array of int, the row of atom #2 of each Bond
+    BondTable.type_code - array of int, the index in type_list of each Bond
+    BondTable.type_list - the distinct (bond_type, atom1_symop, atom2_symop,
+                          standard_res_bond) tuples of the Bonds
+    """
+    def __init__(self):
+        self.atom_list = []
+        self.atom1     = array.array("i")
+        self.atom2     = array.array("i")
+        self.type_code = array.array("H")
+        self.type_list = []
+        self.type_dict = {}
+
+        ## CSR adjacency of the first adj_num_bonds Bonds: the Bonds of row
+        ## r are adj_bonds[adj_offsets[r]:adj_offsets[r + 1]], in the order
+        ## they were added; the Bonds added since, up to adj_num_pending,
+        ## are listed by row in adj_pending
+        self.adj_offsets     = None
+        self.adj_bonds       = None
+        self.adj_num_atoms   = 0
+        self.adj_num_bonds   = 0
+        self.adj_pending     = {}
+        self.adj_num_pending = 0
+
+        ## set when this table is merged into another; its Bond ids are
+        ## then offset by merged_offset in merged_into
+        self.merged_into   = None
+        self.merged_offset = 0
+
+    def __len__(self):
+        return len(self.atom1)
+
+    def __str__(self):
+        return "BondTable(atoms=%d, bonds=%d)" % (
+            len(self.atom_list), len(self.atom1))
+
+    def add_atom(self, atm):
+        """Adds an Atom which is not in a BondTable, and returns its row.
+        """
+        assert atm.bond_table is None
+        row = len(self.atom_list)
+        self.atom_list.append(atm)
+        atm.bond_table = self
+        atm.bond_table_index = row
+        return row
+
+    def get_type_code(self, bond_info):
+        """Returns the code of the (bond_type, atom1_symop, atom2_symop,
+        standard_res_bond) tuple, adding it to type_list if it is new.
+        """
+        try:
+            return self.type_dict[bond_info]
+        except KeyError:
+            code = self.type_dict[bond_info] = len(self.type_list)
+            self.type_list.append(bond_info)
+            return code
+
+    def add_bond(self, atom1, atom2, bond_info):
+        """Adds a Bond between two Atoms which are in this BondTable or in
+        none, and returns its id.
+        """
+        if atom1.bond_table is None:
+            self.add_atom(atom1)
+        if atom2.bond_table is None:
+            self.add_atom(atom2)
+        assert atom1.bond_table is self and atom2.bond_table is self
+
+        bond_id = len(self.atom1)
+        self.atom1.append(atom1.bond_table_index)
+        self.atom2.append(atom2.bond_table_index)
+        self.type_code.append(self.get_type_code(bond_info))
+        return bond_id
+
+    def merge(self, table):
+        """Moves the Atoms and Bonds of another BondTable into this one.
+        The Bonds keep their order, with ids offset by the number of Bonds
+        already in this table.
+        """
+        assert table is not self and table.merged_into is None
+
+        row_offset = len(self.atom_list)
+        bond_offset = len(self.atom1)
+
+        for atm in table.atom_list:
+            atm.bond_table = self
+            atm.bond_table_index += row_offset
+        self.atom_list.extend(table.atom_list)
+
+        self.atom1.extend(array.array("i", [row + row_offset for row in table.atom1]))
+        self.atom2.extend(array.array("i", [row + row_offset for row in table.atom2]))
+
+        code_map = [self.get_type_code(bond_info) for bond_info in table.type_list]
+        self.type_code.extend(array.array("H", [code_map[code] for code in table.type_code]))
+
+        table.__init__()
+        table.merged_into = self
+        table.merged_offset = bond_offset
+
+    def get_adjacency(self):
+        """Returns the 2-tuple (offsets, bonds) of the CSR adjacency of all
+        the Bonds, rebuilding it if Bonds were added since it was built.
+        """
+        if self.adj_num_bonds < len(self.atom1) or self.adj_offsets is None:
+            self.build_adjacency()
+        return self.adj_offsets, self.adj_bonds
+
+    def build_adjacency(self):
+        num_atoms = len(self.atom_list)
+        num_bonds = len(self.atom1)
+
+        if num_bonds == 0:
+            offsets = numpy.zeros(num_atoms + 1, numpy.intc)
+            bonds = numpy.zeros(0, numpy.intc)
+        else:
+            ## both rows of each Bond, interleaved so a stable sort by row
+            ## leaves the Bonds of each row in the order they were added
+            rows = numpy.empty(2 * num_bonds, numpy.intc)
+            rows[0::2] = numpy.frombuffer(self.atom1, numpy.intc)
+            rows[1::2] = numpy.frombuffer(self.atom2, numpy.intc)
+
+            order = numpy.argsort(rows, kind = "mergesort")
+            bonds = (order // 2).astype(numpy.intc)
+
+            offsets = numpy.zeros(num_atoms + 1, numpy.intc)
+            offsets[1:] = numpy.cumsum(numpy.bincount(rows, minlength = num_atoms))
+
+        self.adj_offsets     = array.array("i", offsets.tostring())
+        self.adj_bonds       = array.array("i", bonds.tostring())
+        self.adj_num_atoms   = num_atoms
+        self.adj_num_bonds   = num_bonds
+        self.adj_pending     = {}
+        self.adj_num_pending = num_bonds
+
+    def extend_adjacency(self):
+        """Lists the Bonds added since the CSR adjacency was last built or
+        extended in adj_pending by the rows of their Atoms.
+        """
+        pending = self.adj_pending
+        num_bonds = len(self.atom1)
+        for bond_id in xrange(self.adj_num_pending, num_bonds):
+            for row in (self.atom1[bond_id], self.atom2[bond_id]):
+                try:
+                    pending[row].append(bond_id)
+                except KeyError:
+                    pending[row] = [bond_id]
+        self.adj_num_pending = num_bonds
+
+    def iter_bond_ids(self, row):
+        """Iterates over the ids of the Bonds of the Atom at row, in the
+        order they were added. Bonds added since the CSR adjacency was
+        built are listed by row apart from it, until they are more than an
+        eighth of the table and it is rebuilt, so adding Bonds costs a
+        rebuild only once the table has grown by a fraction.
+        """
+        num_bonds = len(self.atom1)
+        if self.adj_offsets is None or \
+           num_bonds - self.adj_num_bonds > max(64, self.adj_num_bonds // 8):
+            self.build_adjacency()
+        elif self.adj_num_pending < num_bonds:
+            self.extend_adjacency()
+
+        if row < self.adj_num_atoms:
+            offsets = self.adj_offsets
+            for bond_id in self.adj_bonds[offsets[row]:offsets[row + 1]]:
+                yield bond_id
+
+        for bond_id in self.adj_pending.get(row, ()):
+            yield bond_id
+
+    def iter_bonds(self):
+        """Iterates over all the Bonds, in the order they were added.
+        """
+        for bond_id in xrange(len(self.atom1)):
+            yield Bond(self, bond_id)
+
+    def get_partner_row(self, bond_id, row):
+        """Returns the row of the other Atom of the Bond.
+        """
+        if self.atom1[bond_id] == row:
+            return self.atom2[bond_id]
+        return self.atom1[bond_id]
+
+    def get_bond_info(self, bond_id):
+        """Returns the (bond_type, atom1_symop, atom2_symop,
+        standard_res_bond) tuple of the Bond.
+        """
+        return self.type_list[self.type_code[bond_id]]
+
+    def set_bond_info(self, bond_id, **args):
+        """Sets the bond_type, atom1_symop, atom2_symop or standard_res_bond
+        of the Bond given as keyword arguments.
+        """
+        bond_type, atom1_symop, atom2_symop, standard_res_bond = \
+            self.get_bond_info(bond_id)
+        bond_info = (args.get("bond_type", bond_type),
+                     args.get("atom1_symop", atom1_symop),
+                     args.get("atom2_symop", atom2_symop),
+                     args.get("standard_res_bond", standard_res_bond))
+        self.type_code[bond_id] = self.get_type_code(bond_info)
+
 
 class Bond(object):
-    """Indicates two atoms are bonded together.
+    """Indicates two atoms are bonded together. Bonds are stored in a
+    BondTable, and a Bond object is a view of one of its entries made by
+    Atom.iter_bonds() and the other Bond iterators; Bond objects of the
+    same bond compare equal. Bonds are created by Atom.create_bond().
     """
-    def __init__(
-        self,
-        atom1             = None,
-        atom2             = None,
-        bond_type         = None,
-        atom1_symop       = None,
-        atom2_symop       = None,
-        standard_res_bond = False,
-        **args):
+    __slots__ = ["bond_table", "bond_id"]
 
-        self.atom1             = atom1
-        self.atom2             = atom2
-        self.bond_type         = bond_type
-        self.atom1_symop       = atom1_symop
-        self.atom2_symop       = atom2_symop
-        self.standard_res_bond = standard_res_bond
+    def __init__(self, bond_table, bond_id):
+        self.bond_table = bond_table
+        self.bond_id    = bond_id
 
     def __str__(self):
         return "Bond(%s %s)" % (self.atom1, self.atom2)
 
-    def __deepcopy__(self, memo):
-        return Bond(
-            bond_type         = self.bond_type,
-            atom1_symop       = self.atom1_symop,
-            atom2_symop       = self.atom2_symop,
-            standard_res_bond = self.standard_res_bond)
+    def __eq__(self, other):
+        return isinstance(other, Bond) and self.resolve() == other.resolve()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        ## hashed on the Atoms because the (bond_table, bond_id) of the
+        ## Bond changes when its BondTable is merged into another
+        return hash((id(self.atom1), id(self.atom2)))
+
+    def resolve(self):
+        """Returns the 2-tuple (bond_table, bond_id) of the Bond, following
+        the BondTable merges made since the Bond object was made.
+        """
+        table = self.bond_table
+        if table.merged_into is not None:
+            bond_id = self.bond_id
+            while table.merged_into is not None:
+                bond_id += table.merged_offset
+                table = table.merged_into
+            self.bond_table = table
+            self.bond_id = bond_id
+        return table, self.bond_id
+
+    def _get_atom1(self):
+        table, bond_id = self.resolve()
+        return table.atom_list[table.atom1[bond_id]]
+
+    atom1 = property(_get_atom1)
+
+    def _get_atom2(self):
+        table, bond_id = self.resolve()
+        return table.atom_list[table.atom2[bond_id]]
+
+    atom2 = property(_get_atom2)
+
+    def _get_bond_type(self):
+        table, bond_id = self.resolve()
+        return table.get_bond_info(bond_id)[0]
+
+    def _set_bond_type(self, bond_type):
+        table, bond_id = self.resolve()
+        table.set_bond_info(bond_id, bond_type = bond_type)
+
+    bond_type = property(_get_bond_type, _set_bond_type)
+
+    def _get_atom1_symop(self):
+        table, bond_id = self.resolve()
+        return table.get_bond_info(bond_id)[1]
+
+    def _set_atom1_symop(self, atom1_symop):
+        table, bond_id = self.resolve()
+        table.set_bond_info(bond_id, atom1_symop = atom1_symop)
+
+    atom1_symop = property(_get_atom1_symop, _set_atom1_symop)
+
+    def _get_atom2_symop(self):
+        table, bond_id = self.resolve()
+        return table.get_bond_info(bond_id)[2]
+
+    def _set_atom2_symop(self, atom2_symop):
+        table, bond_id = self.resolve()
+        table.set_bond_info(bond_id, atom2_symop = atom2_symop)
+
+    atom2_symop = property(_get_atom2_symop, _set_atom2_symop)
+
+    def _get_standard_res_bond(self):
+        table, bond_id = self.resolve()
+        return table.get_bond_info(bond_id)[3]
+
+    def _set_standard_res_bond(self, standard_res_bond):
+        table, bond_id = self.resolve()
+        table.set_bond_info(bond_id, standard_res_bond = standard_res_bond)
+
+    standard_res_bond = property(_get_standard_res_bond, _set_standard_res_bond)
 
     def get_partner(self, atm):
         """Returns the other atom involved in the bond.
         """
-        if atm == self.atom1:
-            return self.atom2
-        elif atm == self.atom2:
-            return self.atom1
+        table, bond_id = self.resolve()
+        row = atm.bond_table_index
+        if atm.bond_table is not table:
+            return None
+        if row == table.atom1[bond_id]:
+            return table.atom_list[table.atom2[bond_id]]
+        elif row == table.atom2[bond_id]:
+            return table.atom_list[table.atom1[bond_id]]
         return None
 
     def get_atom1(self):
@@ -3645,6 +4913,92 @@ class Site(object):
             for atm in frag.iter_all_atoms():
                 yield atm
 
+def invalidate_structure_caches(obj):
+    """Drops the caches of the Structure of obj, a Chain or Fragment, if it
+    is part of one; see Structure.invalidate_caches().
+    """
+    try:
+        struct = obj.get_structure()
+    except AttributeError:
+        return
+    if struct is not None:
+        struct.invalidate_caches()
+
+def bond_atoms(atom1, atom2, bond_info):
+    """Adds a Bond between two Atoms to the BondTable of either, merging
+    their BondTables if they are different. bond_info is the tuple
+    (bond_type, atom1_symop, atom2_symop, standard_res_bond).
+    """
+    table = atom1.bond_table
+    table2 = atom2.bond_table
+    if table is None:
+        if table2 is None:
+            table = BondTable()
+        else:
+            table = table2
+    elif table2 is not None and table2 is not table:
+        table = merge_bond_tables(table, table2)
+    table.add_bond(atom1, atom2, bond_info)
+
+def merge_bond_tables(table1, table2):
+    """Merges the smaller of two BondTables into the larger, and returns
+    the larger.
+    """
+    if len(table1.atom_list) + len(table1) < len(table2.atom_list) + len(table2):
+        table1, table2 = table2, table1
+    table1.merge(table2)
+    return table1
+
+def iter_atom_bonds(atom_iter):
+    """Iterates over the Bonds of the Atoms of atom_iter, in the order of
+    the Atoms and then of each Atom's Bonds, yielding each Bond once.
+    """
+    visited = {}
+    for atm in atom_iter:
+        table = atm.bond_table
+        if table is None:
+            continue
+        try:
+            table_visited = visited[table]
+        except KeyError:
+            table_visited = visited[table] = set()
+
+        for bond_id in table.iter_bond_ids(atm.bond_table_index):
+            if bond_id not in table_visited:
+                table_visited.add(bond_id)
+                yield Bond(table, bond_id)
+
+def clone_bonds(atom_iter, atom_map):
+    """Copies the Bonds between the Atoms of atom_iter to their copies in
+    atom_map, which maps the id() of each Atom to its copy. Bonds to Atoms
+    not in atom_iter are not copied. The copies are added to the Bonds of
+    the copied Atoms in the same order copy.deepcopy() adds them.
+    """
+    copied = {}
+    for atm in atom_iter:
+        atm_cpy = atom_map[id(atm)]
+
+        table = atm.bond_table
+        if table is not None:
+            row = atm.bond_table_index
+            atom_list = table.atom_list
+
+            for bond_id in table.iter_bond_ids(row):
+                if table.atom1[bond_id] == row:
+                    partner_cpy = copied.get(id(atom_list[table.atom2[bond_id]]))
+                    if partner_cpy is None:
+                        continue
+                    atom1, atom2 = atm_cpy, partner_cpy
+                else:
+                    partner_cpy = copied.get(id(atom_list[table.atom1[bond_id]]))
+                    if partner_cpy is None:
+                        continue
+                    atom1, atom2 = partner_cpy, atm_cpy
+
+                bond_atoms(atom1, atom2, table.get_bond_info(bond_id))
+
+        copied[id(atm)] = atm_cpy
+
 def fragment_id_split(frag_id):
     """Split a string fragment_id into a 2-tuple of:
     (sequence_num, insertion_code)
@@ -3654,6 +5008,57 @@ def fragment_id_split(frag_id):
     except ValueError:
         return (int(frag_id[:-1]), frag_id[-1:])
 
+## fragment_id -> fragment_id_split(fragment_id) sort keys; it is emptied
+## when it grows to FRAGMENT_ID_KEY_CACHE_SIZE entries
+FRAGMENT_ID_KEY_CACHE      = {}
+FRAGMENT_ID_KEY_CACHE_SIZE = 20000
+
+def fragment_id_key(frag_id):
+    """Returns the sort key of a fragment_id string, the 2-tuple returned
+    by fragment_id_split(). Keys are cached, so comparing the same
+    fragment_ids again does not re-split the strings.
+    """
+    try:
+        return FRAGMENT_ID_KEY_CACHE[frag_id]
+    except KeyError:
+        key = fragment_id_split(frag_id)
+        if len(FRAGMENT_ID_KEY_CACHE) >= FRAGMENT_ID_KEY_CACHE_SIZE:
+            FRAGMENT_ID_KEY_CACHE.clear()
+        FRAGMENT_ID_KEY_CACHE[frag_id] = key
+        return key
+
+def fragment_sort_key(fragment):
+    """Returns the sort key of a Fragment, for use as the key argument
+    of list.sort().
+    """
+    return fragment_id_key(fragment.fragment_id)
+
+def chain_sort_key(chain):
+    """Returns the sort key of a Chain or Segment, its chain_id.
+    """
+    return chain.chain_id
+
+def model_sort_key(model):
+    """Returns the sort key of a Model, its model_id.
+    """
+    return int(model.model_id)
+
+def insort_sorted(item_list, item, sort_key):
+    """Inserts item into item_list, which is sorted by sort_key, after all
+    items with an equal key. This is the position sorting the list after
+    appending the item would give it.
+    """
+    key = sort_key(item)
+    lo = 0
+    hi = len(item_list)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key < sort_key(item_list[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    item_list.insert(lo, item)
+
 def fragment_id_eq(frag_id1, frag_id2):
     """Performs a proper equivalency of fragment_id strings according
     to their sequence number, then insertion code.
@@ -3664,49 +5069,49 @@ def fragment_id_lt(frag_id1, frag_id2):
     """Performs a proper less than comparison of fragment_id strings
     according to their sequence number, then insertion code.
     """
-    return fragment_id_split(frag_id1) < fragment_id_split(frag_id2)
+    return fragment_id_key(frag_id1) < fragment_id_key(frag_id2)
 
 def fragment_id_le(frag_id1, frag_id2):
     """Performs a proper less than or equal to comparison of fragment_id
     strings according to their sequence number, then insertion code.
     """
-    return fragment_id_split(frag_id1) <= fragment_id_split(frag_id2)
+    return fragment_id_key(frag_id1) <= fragment_id_key(frag_id2)
 
 def fragment_id_gt(frag_id1, frag_id2):
     """Performs a proper greater than comparison of fragment_id strings
     according to their sequence number, then insertion code.
     """
-    return fragment_id_split(frag_id1) > fragment_id_split(frag_id2)
+    return fragment_id_key(frag_id1) > fragment_id_key(frag_id2)
 
 def fragment_id_ge(frag_id1, frag_id2):
     """Performs a proper greater than or equal to comparison of
     fragment_id strings according to their sequence number, then
     insertion code.
     """
-    return fragment_id_split(frag_id1) >= fragment_id_split(frag_id2)
+    return fragment_id_key(frag_id1) >= fragment_id_key(frag_id2)
 
 def fragment_id_cmp(frag_id1, frag_id2):
     """Compare two fragment ids.
     """
-    if fragment_id_lt(frag_id1, frag_id2):
-        return -1
-    if fragment_id_lt(frag_id1, frag_id2):
-        return 0
-    return 1
+    return cmp(fragment_id_key(frag_id1), fragment_id_key(frag_id2))
 
 def iter_fragments(fragiter, start_frag_id = None, stop_frag_id = None):
     """Given a fragment iterator and a start and end fragment id,
     return an iterator which yields only fragments within the range.
     """
     if start_frag_id and stop_frag_id:
-        dpred = lambda f: fragment_id_lt(f.fragment_id, start_frag_id)
-        tpred = lambda f: fragment_id_le(f.fragment_id, stop_frag_id)
+        start_key = fragment_id_key(start_frag_id)
+        stop_key = fragment_id_key(stop_frag_id)
+        dpred = lambda f: fragment_id_key(f.fragment_id) < start_key
+        tpred = lambda f: fragment_id_key(f.fragment_id) <= stop_key
         return itertools.takewhile(tpred, itertools.dropwhile(dpred, fragiter))
     elif start_frag_id and not stop_frag_id:
-        dpred = lambda f: fragment_id_lt(f.fragment_id, start_frag_id)
+        start_key = fragment_id_key(start_frag_id)
+        dpred = lambda f: fragment_id_key(f.fragment_id) < start_key
         return itertools.dropwhile(dpred, fragiter)
     elif not start_frag_id and stop_frag_id:
-        tpred = lambda f: fragment_id_le(f.fragment_id, stop_frag_id)
+        stop_key = fragment_id_key(stop_frag_id)
+        tpred = lambda f: fragment_id_key(f.fragment_id) <= stop_key
         return itertools.takewhile(tpred, fragiter)
     return fragiter
 
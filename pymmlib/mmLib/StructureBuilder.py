@@ -105,7 +105,12 @@ class StructureBuilder(object):
         """
         ## create atom object
         atm = Structure.Atom(**atm_map)
+        return self.add_atom(atm)
 
+    def add_atom(self, atm):
+        """Adds the Atom object atm to the structure, or queues it for the
+        naming service if it cannot be placed. Returns atm.
+        """
         ## survey the atom and structure and determine if the atom requires
         ## being passed to the naming service, absence of required fields
         if not atm.fragment_id or not atm.chain_id:
@@ -173,7 +178,10 @@ class StructureBuilder(object):
         current_frag       = None
         current_frag_list  = None
 
-        for atm in self.name_service_list[:]:
+        ## atoms left for the non-polymer name service
+        non_polymer_list = []
+
+        for atm in self.name_service_list:
             ## determine the polymer type of the atom
             if Library.library_is_amino_acid(atm.res_name):
                 polymer_type = "protein"
@@ -190,6 +198,7 @@ class StructureBuilder(object):
                 current_polymer_name_dict = None
                 current_frag              = None
                 current_frag_list         = None
+                non_polymer_list.append(atm)
                 continue
 
             fragment_id = Structure.FragmentID(atm.fragment_id)
@@ -220,10 +229,6 @@ class StructureBuilder(object):
                     polymer_model_dict[atm.model_id] = model
                 else:
                     model.append(current_frag_list)
-
-                ## we have now dealt with the atom, so it can be removed from 
-                ## the name service list
-                self.name_service_list.remove(atm)
                 continue
 
             ## if we get here, then we know this atom is destine for the
@@ -240,15 +245,14 @@ class StructureBuilder(object):
                 ## create new fragment and add it to the current fragment list
                 current_frag = [atm]
                 current_frag_list.append(current_frag)
-
-                ## we have now dealt with the atom, so it can be removed
-                ## from the name service list
-                self.name_service_list.remove(atm)
                 continue
 
             ## okay, put it in the current fragment
             current_frag.append(atm)
-            self.name_service_list.remove(atm)
+
+        ## the polymer atoms have been dealt with; only the non-polymer
+        ## atoms remain to be named
+        del self.name_service_list
 
         ## now assign chain_ids and add the atoms to the structure
         model_ids = polymer_model_dict.keys()
@@ -296,7 +300,7 @@ class StructureBuilder(object):
         name_dict = {}
 
         ## split atoms into fragments
-        for atm in self.name_service_list:
+        for atm in non_polymer_list:
             atm_id      = (atm.name, atm.alt_loc)
             atm_frag_id = (atm.model_id, atm.chain_id, atm.fragment_id, atm.res_name)
 
@@ -310,15 +314,6 @@ class StructureBuilder(object):
             else:
                 cr_key = (atm.chain_id, atm.res_name)
 
-                ### debug
-                if frag:
-                    msg = "name_service: fragment detected in cr=%s" % (
-                        str(cr_key))
-                    ConsoleOutput.debug(msg)
-                    for a in frag:
-                        ConsoleOutput.debug("  " + str(a))
-                ### /debug
-
                 try:
                     model_dict = cr_dict[cr_key]
                 except KeyError:
@@ -335,20 +330,13 @@ class StructureBuilder(object):
                 frag      = [atm]
                 frag_list.append(frag)
 
-        ## free self.name_service_list and other vars to save some memory
-        del self.name_service_list
+        ## free non_polymer_list to save some memory
+        del non_polymer_list
 
         new_chain_id    = None
         fragment_id_num = None
 
         for cr_key in cr_key_list:
-            ### debug
-            msg  = "name_service: chain_id / res_name keys\n"
-            msg += "  cr_key: chain_id='%s' res_name='%s'" % (
-                cr_key[0], cr_key[1])
-            ConsoleOutput.debug(msg)
-            ### /debug
-
             ## get the next chain ID, use the cfr group's
             ## loaded chain_id if possible
             chain_id = next_chain_id(cr_key[0])
@@ -20,6 +20,7 @@ __all__ = [
     "PDBBuilder",
     "PDB",
     "R3DDriver",
+    "Selection",
     "SpaceGroups",
     "StructureBuilder",
     "Structure",
@@ -10,7 +10,11 @@ included as a specialized version of the mmCIF parser.
 from __future__ import generators
 
 import re
+import gc
+import sys
 import copy
+import cStringIO
+import operator
 import itertools
 
 ##
@@ -26,6 +30,57 @@ import itertools
 ## mmCIF Maximum Line Length
 MAX_LINE = 2048
 
+## tokens of a line: _section.subsection, quoted strings, comments, and
+## unquoted tokens
+RE_TOKEN = re.compile(
+    r"(?:"
+
+     "(?:_(.+?)[.](\S+))"               "|"  # _section.subsection
+
+     "(?:['\"](.*?)(?:['\"]\s|['\"]$))" "|"  # quoted strings
+
+     "(?:\s*#.*$)"                      "|"  # comments
+
+     "(\S+)"                                 # unquoted tokens
+
+     ")")
+
+## lines without these characters hold only unquoted tokens, and are split
+## on whitespace instead of being matched against RE_TOKEN
+RE_SPECIAL = re.compile(r"['\"#_]")
+
+## RE_TOKEN without _section.subsection, for loop_ data lines on which no
+## token starts like one or like a reserved word; a quoted string is
+## matched with its opening quote so an empty one is told from a comment
+RE_VALUE = re.compile(
+    r"(?:"
+
+     "(?:(['\"].*?)(?:['\"]\s|['\"]$))" "|"  # quoted strings
+
+     "(?:\s*#.*$)"                        "|"  # comments
+
+     "(\S+)"                                   # unquoted tokens
+
+     ")")
+
+RE_LOOP_END = re.compile(
+    r"(?:^|\s)(?:_|(?:data|loop|save|global|stop)_)", re.IGNORECASE)
+
+## number of values of a loop_ read before they are made into rows
+LOOP_CHUNK = 65536
+
+## number of rows of a loop_ formatted at a time by mmCIFFileWriter, and
+## bytes of output it collects before writing them to the file
+WRITE_CHUNK = 4096
+WRITE_BUFFER = 65536
+
+## data types of mmCIFFileWriter values, ordered by the values they hold
+DTYPE_RANK = {"token": 0, "qstring": 1, "mstring": 2}
+
+## stands for a quoted "." among the values of a loop_, where an unquoted
+## "." is a missing value
+QUOTED_DOT = object()
+
 
 class mmCIFError(Exception):
     """Base class of errors raised by Structure objects.
@@ -45,7 +100,57 @@ class mmCIFSyntaxError(Exception):
         return "[line: %d] %s" % (self.line_num, self.text)
 
 
-class mmCIFRow(dict):
+class mmCIFRowMethods(object):
+    """The methods of mmCIFRow and mmCIFColumnRow which are built on their
+    item methods. The dict methods which change a row set and delete its
+    values through the item methods, so the hash indexes of its table are
+    kept up to date.
+    """
+    __slots__ = []
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __getattr__(self, name):
+        try:
+            return self[name] 
+        except KeyError:
+            raise AttributeError(name)
+
+    def update(self, other = (), **kwargs):
+        if hasattr(other, "keys"):
+            other = [(column, other[column]) for column in other.keys()]
+        for column, value in itertools.chain(other, kwargs.iteritems()):
+            self[column] = value
+
+    def setdefault(self, column, default = None):
+        try:
+            return self[column]
+        except KeyError:
+            self[column] = default
+            return default
+
+    def pop(self, column, *default):
+        try:
+            value = self[column]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[column]
+        return value
+
+    def popitem(self):
+        for clower in self.iterkeys():
+            return clower, self.pop(clower)
+        raise KeyError("popitem(): row is empty")
+
+    def clear(self):
+        for clower in self.keys():
+            del self[clower]
+
+
+class mmCIFRow(mmCIFRowMethods, dict):
     """Contains one row of data. In a mmCIF file, this is one complete
     set of data found under a section. The data can be accessed by using
     the column names as class attributes.
@@ -54,6 +159,11 @@ class mmCIFRow(dict):
 
     def __eq__(self, other):
         return id(self) == id(other)
+
+    def __reduce__(self):
+        ## a row is pickled without its table, which sets it again when the
+        ## row is added back to it
+        return (mmCIFRow, (dict.items(self),))
         
     def __deepcopy__(self, memo):
         cif_row = mmCIFRow()
@@ -66,13 +176,14 @@ class mmCIFRow(dict):
 
     def __setitem__(self, column, value):
         assert value is not None
-        dict.__setitem__(self, column.lower(), value)
-
-    def __getattr__(self, name):
         try:
-            return self[name] 
-        except KeyError:
-            raise AttributeError(name)
+            row_indexes = self.table.row_indexes
+        except AttributeError:
+            row_indexes = None
+        if row_indexes:
+            self.table.set_row_value(self, column.lower(), value)
+        else:
+            dict.__setitem__(self, column.lower(), value)
 
     def __getitem__(self, column):
         return dict.__getitem__(self, column.lower())
@@ -81,7 +192,14 @@ class mmCIFRow(dict):
         return dict.__getitem__(self, clower)
 
     def __delitem__(self, column):
-        dict.__delitem__(self, column.lower())
+        try:
+            row_indexes = self.table.row_indexes
+        except AttributeError:
+            row_indexes = None
+        if row_indexes:
+            self.table.set_row_value(self, column.lower(), None)
+        else:
+            dict.__delitem__(self, column.lower())
 
     def get(self, column, default = None):
         return dict.get(self, column.lower(), default)
@@ -94,19 +212,33 @@ class mmCIFRow(dict):
 
     def has_key_lower(self, clower):
         return dict.has_key(self, clower)
-    
+
 
 class mmCIFTable(list):
     """Contains columns and rows of data for a mmCIF section. Rows of data
     are stored as mmCIFRow classes.
+
+    get_row(), get_row1() and iter_rows() find rows through hash indexes
+    of the columns they search, built when the same columns are searched
+    a second time. The indexes are kept up to date as rows are appended
+    or removed and as row values are set or deleted; rows inserted before
+    the end, slice assignments, and sorting drop them, to be built again.
+    Every list and dict method which changes a table or row does one or
+    the other.
+
+    mmCIFTable.row_indexes - tuple of lower case column names -> hash index
+                             of the rows, see get_row_index(), or None for
+                             columns searched once; None if no columns were
+                             searched
     """
-    __slots__ = ["name", "columns", "columns_lower", "data"]
+    __slots__ = ["name", "columns", "columns_lower", "data", "row_indexes"]
 
     def __init__(self, name, columns = None):
         assert name is not None
 
         list.__init__(self)
         self.name = name
+        self.row_indexes = None
         if columns is None:
             self.columns = list()
             self.columns_lower = dict()
@@ -119,9 +251,18 @@ class mmCIFTable(list):
             table.append(copy.deepcopy(row, memo))
         return table
 
+    def __reduce__(self):
+        return (self.__class__, (self.name, self.columns), list(self))
+
+    def __setstate__(self, rows):
+        self.extend(rows)
+
     def __eq__(self, other):
         return id(self) == id(other)
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
     def is_single(self):
         """Return true if the table is not a _loop table with multiple
         rows of data.
@@ -136,10 +277,10 @@ class mmCIFTable(list):
     
     def __getitem__(self, x):
         """Retrieves mmCIFRow at index x from the table if the argument is
-        an integer. If the argument is a string, then the data from the
-        first row is returned.
+        an integer, or the list of them if it is a slice. If the argument
+        is a string, then the data from the first row is returned.
         """
-        if isinstance(x, int):
+        if isinstance(x, (int, slice)):
             return list.__getitem__(self, x)
 
         elif isinstance(x, str):
@@ -153,9 +294,14 @@ class mmCIFTable(list):
     def __setitem__(self, x, value):
         assert value is not None
         
-        if isinstance(x, int) and isinstance(value, mmCIFRow):
+        if isinstance(x, int):
+            assert isinstance(value, mmCIFRow)
             value.table = self
             list.__setitem__(self, x, value)
+            self.row_indexes = None
+
+        elif isinstance(x, slice):
+            self.set_rows(x, value)
 
         elif isinstance(x, str):
             try:
@@ -166,7 +312,42 @@ class mmCIFTable(list):
                 self.append(row)
 
     def __delitem__(self, i):
-        self.remove(self[i])
+        if isinstance(i, slice):
+            self.set_rows(i, None)
+        else:
+            self.remove(self[i])
+
+    def __setslice__(self, i, j, rows):
+        self.set_rows(slice(max(0, i), max(0, j)), rows)
+
+    def __delslice__(self, i, j):
+        self.set_rows(slice(max(0, i), max(0, j)), None)
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
+
+    def __imul__(self, n):
+        raise mmCIFError("rows of mmCIFTable %s cannot be repeated" % (self.name))
+
+    def set_rows(self, x, rows):
+        """Replaces the rows of the slice x with the mmCIFRow objects of
+        rows, or deletes them if rows is None, and drops the hash indexes.
+        """
+        old_rows = list.__getitem__(self, x)
+        if rows is None:
+            list.__delitem__(self, x)
+            rows = []
+        else:
+            rows = list(rows)
+            for row in rows:
+                assert isinstance(row, mmCIFRow)
+            list.__setitem__(self, x, rows)
+        for row in old_rows:
+            del row.table
+        for row in rows:
+            row.table = self
+        self.row_indexes = None
 
     def get(self, x, default = None):
         try:
@@ -178,16 +359,47 @@ class mmCIFTable(list):
         assert isinstance(row, mmCIFRow)
         row.table = self
         list.append(self, row)
+        if self.row_indexes:
+            self.index_row(row, row, self.row_indexes.items())
 
     def insert(self, i, row):
         assert isinstance(row, mmCIFRow)
+        if i >= list.__len__(self):
+            self.append(row)
+            return
         row.table = self
         list.insert(self, i, row)
+        self.row_indexes = None
+
+    def extend(self, rows):
+        for row in list(rows):
+            self.append(row)
 
     def remove(self, row):
         assert isinstance(row, mmCIFRow)
-        del row.table
         list.remove(self, row)
+        self.unlink_row(row)
+
+    def pop(self, i = -1):
+        row = list.pop(self, i)
+        self.unlink_row(row)
+        return row
+
+    def unlink_row(self, row):
+        """Detaches a row removed from the table, and removes it from the
+        hash indexes.
+        """
+        del row.table
+        if self.row_indexes:
+            self.unindex_row(row, row)
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.row_indexes = None
+
+    def reverse(self):
+        list.reverse(self)
+        self.row_indexes = None
 
     def set_columns(self, columns):
         """Sets the list of column(subsection) names to the list of names in
@@ -241,11 +453,7 @@ class mmCIFTable(list):
     def get_row1(self, clower, value):
         """Return the first row which which has column data matching value.
         """
-        fpred = lambda r: r.get_lower(clower) == value
-        itertools.ifilter(fpred, self)
-        for row in itertools.ifilter(fpred, self):
-            return row
-        return None
+        return self.get_row((clower, value))
 
     def get_row(self, *args):
         """Preforms a SQL-like 'AND' select aginst all the rows in the table,
@@ -255,7 +463,15 @@ class mmCIFTable(list):
         For example:
           get_row(('atom_id','CA'),('entity_id', '1'))
         returns the first matching row with atom_id==1 and entity_id==1.
+        The row is found through the hash index of the columns, once they
+        were searched before.
         """
+        rows = self.lookup_rows(args)
+        if rows is not None:
+            if rows:
+                return rows[0]
+            return None
+
         if len(args) == 1:
             clower, value = args[0]
             for row in self:
@@ -283,6 +499,15 @@ class mmCIFTable(list):
         """This is the same as get_row, but it iterates over all matching
         rows in the table.
         """
+        rows = self.lookup_rows(args)
+        if rows is not None:
+            return iter(rows[:])
+        return self.scan_rows(args)
+
+    def scan_rows(self, args):
+        """Iterates over the rows matching all the (<lower-case-column-name>,
+        <column-value>) tuples of args, testing every row.
+        """
         for cif_row in self:
             match_row = True
             for clower, value in args:
@@ -306,6 +531,801 @@ class mmCIFTable(list):
                 pass
         return dictx
 
+    def get_column(self, column):
+        """Returns a list of the values of the column in each row, with None
+        for the rows without a value.
+        """
+        clower = column.lower()
+        return [row.get_lower(clower) for row in self]
+
+    def iter_column_chunks(self, clowers, nrows):
+        """Iterates over the rows of the table in chunks of at most nrows
+        rows, each a list of the values of the rows in each of the lower
+        case columns clowers, with None for no value.
+        """
+        for i in xrange(0, len(self), nrows):
+            rows = list.__getslice__(self, i, i + nrows)
+            yield [[row.get_lower(clower) for row in rows] for clower in clowers]
+
+    def lookup_rows(self, args):
+        """Returns the list of the rows matching all the (<lower-case-column-
+        name>, <column-value>) tuples of args from the hash index of their
+        columns. Returns None if there are no args, the columns were not
+        searched before, or the values cannot be hashed, and the rows have
+        to be searched.
+        """
+        if not args:
+            return None
+        if len(args) == 1:
+            clowers = (args[0][0],)
+            key = args[0][1]
+        else:
+            clowers = tuple([clower for clower, value in args])
+            key = tuple([value for clower, value in args])
+
+        if self.row_indexes is None:
+            self.row_indexes = dict()
+        elif self.row_indexes.has_key(clowers):
+            try:
+                return self.get_row_index(clowers).get(key, [])
+            except TypeError:
+                return None
+
+        ## a table searched once is only scanned
+        self.row_indexes[clowers] = None
+        return None
+
+    def get_row_index(self, clowers):
+        """Returns the hash index of the rows by their values in the tuple of
+        lower case column names clowers, building it if needed. The index
+        is a dictionary mapping the value of a row in the column, or the
+        tuple of its values in more than one column, with None for no value,
+        to the list of the matching rows in table order. For a
+        mmCIFColumnTable the index lists the row numbers.
+        """
+        if self.row_indexes is None:
+            self.row_indexes = dict()
+        index = self.row_indexes.get(clowers)
+        if index is None:
+            index = self.row_indexes[clowers] = self.build_row_index(clowers)
+        return index
+
+    def build_row_index(self, clowers):
+        columns = [self.get_column(clower) for clower in clowers]
+        return self.make_row_index(list.__iter__(self), columns)
+
+    def make_row_index(self, items, columns):
+        """Returns the hash index of items, the rows or for a
+        mmCIFColumnTable the row numbers, by the values of columns, a list of
+        a sequence of the values of the rows for each column.
+        """
+        if len(columns) == 1:
+            keys = columns[0]
+        else:
+            keys = itertools.izip(*columns)
+
+        ## the lists of the index cannot form cycles, so the collector is
+        ## not run while one is made for each row
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            index = dict()
+            for item, key in itertools.izip(items, keys):
+                key_items = index.get(key)
+                if key_items is None:
+                    index[key] = [item]
+                else:
+                    key_items.append(item)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return index
+
+    def row_key(self, row, clowers):
+        """Returns the key of row in the hash index of the columns clowers.
+        """
+        if len(clowers) == 1:
+            return row.get_lower(clowers[0])
+        return tuple([row.get_lower(clower) for clower in clowers])
+
+    def is_last_row(self, item):
+        return list.__len__(self) > 0 and list.__getitem__(self, -1) is item
+
+    def index_row(self, item, row, indexes):
+        """Adds item, the row or for a mmCIFColumnTable its row number, to
+        the entries of row in the (clowers, index) list of hash indexes.
+        An index is dropped if the row is not the last of the table and
+        the rows of its entry would go out of order.
+        """
+        for clowers, index in indexes:
+            if index is None:
+                continue
+            key = self.row_key(row, clowers)
+            try:
+                items = index[key]
+            except KeyError:
+                index[key] = [item]
+                continue
+            if self.is_last_row(item):
+                items.append(item)
+            else:
+                del self.row_indexes[clowers]
+
+    def unindex_row(self, item, row, clower = None):
+        """Removes item, the row or for a mmCIFColumnTable its row number,
+        from the entries of row in the hash indexes of the column clower,
+        or in all the hash indexes, and returns the list of the
+        (clowers, index) it was removed from. An index without the row is
+        dropped.
+        """
+        unindexed = []
+        for clowers, index in self.row_indexes.items():
+            if index is None or (clower is not None and clower not in clowers):
+                continue
+            key = self.row_key(row, clowers)
+            try:
+                items = index[key]
+                items.remove(item)
+            except (KeyError, ValueError):
+                del self.row_indexes[clowers]
+                continue
+            if not items:
+                del index[key]
+            unindexed.append((clowers, index))
+        return unindexed
+
+    def set_row_value(self, row, clower, value):
+        """Sets the value of column clower of the mmCIFRow row of this table,
+        or deletes it if value is None, and moves the row to its entries
+        for the new value in the hash indexes of the column.
+        """
+        if row.get_lower(clower) == value:
+            unindexed = []
+        else:
+            unindexed = self.unindex_row(row, row, clower)
+        try:
+            if value is None:
+                dict.__delitem__(row, clower)
+            else:
+                dict.__setitem__(row, clower, value)
+        finally:
+            self.index_row(row, row, unindexed)
+
+
+class mmCIFColumnRow(mmCIFRowMethods):
+    """A row of a mmCIFColumnTable. It has the interface of a mmCIFRow,
+    but its values are read from and written to the columns of the table.
+    A mmCIFColumnRow refers to its row by position, so it is not valid
+    after rows before it are inserted or removed. It is not a dict, whose
+    values dict(row) and f(**row) would read instead of the columns, but
+    has all the dict methods.
+    """
+    __slots__ = ["table", "index"]
+
+    __hash__ = None
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, mmCIFColumnRow) and \
+               self.table is other.table and self.index == other.index
+
+    def __cmp__(self, other):
+        ## rows are ordered by their values, as mmCIFRow dictionaries are
+        if isinstance(other, mmCIFColumnRow):
+            other = dict(other.iteritems())
+        return cmp(dict(self.iteritems()), other)
+
+    def __reduce__(self):
+        return (mmCIFColumnRow, (self.table, self.index))
+
+    def __deepcopy__(self, memo):
+        return mmCIFRow(self.iteritems())
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __contains__(self, column):
+        return self.get_lower(column.lower()) is not None
+
+    def __setitem__(self, column, value):
+        assert value is not None
+        self.table.set_value_lower(self.index, column.lower(), value)
+
+    def __getitem__(self, column):
+        return self.getitem_lower(column.lower())
+
+    def getitem_lower(self, clower):
+        value = self.get_lower(clower)
+        if value is None:
+            raise KeyError(clower)
+        return value
+
+    def __delitem__(self, column):
+        clower = column.lower()
+        self.getitem_lower(clower)
+        self.table.set_value_lower(self.index, clower, None)
+
+    def get(self, column, default = None):
+        return self.get_lower(column.lower(), default)
+
+    def get_lower(self, clower, default = None):
+        try:
+            value = self.table.column_data[clower][self.index]
+        except KeyError:
+            return default
+        if value is None:
+            return default
+        return value
+
+    def has_key(self, column):
+        return self.get_lower(column.lower()) is not None
+
+    def has_key_lower(self, clower):
+        return self.get_lower(clower) is not None
+
+    def iteritems(self):
+        index = self.index
+        for clower, column in self.table.column_data.iteritems():
+            value = column[index]
+            if value is not None:
+                yield clower, value
+
+    def iterkeys(self):
+        for clower, value in self.iteritems():
+            yield clower
+
+    def itervalues(self):
+        for clower, value in self.iteritems():
+            yield value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def copy(self):
+        return mmCIFRow(self.iteritems())
+
+
+class mmCIFTableListMethods(object):
+    """The list methods of mmCIFColumnTable and mmCIFStreamTable, which do
+    not store their rows in the list they inherit, built on iterating over
+    and indexing the rows. The list operators give lists of the rows.
+    """
+    __slots__ = []
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getslice__(self, i, j):
+        return self[slice(max(0, i), max(0, j))]
+
+    def __add__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(self) + list(rows)
+
+    def __radd__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(rows) + list(self)
+
+    def __mul__(self, n):
+        return list(self) * n
+
+    def __rmul__(self, n):
+        return list(self) * n
+
+    def __lt__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(self) < list(rows)
+
+    def __le__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(self) <= list(rows)
+
+    def __gt__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(self) > list(rows)
+
+    def __ge__(self, rows):
+        if not isinstance(rows, list):
+            return NotImplemented
+        return list(self) >= list(rows)
+
+
+class mmCIFColumnTable(mmCIFTableListMethods, mmCIFTable):
+    """A mmCIFTable which stores a list of values for each column instead of
+    a mmCIFRow dictionary for each row, which takes a fraction of the memory
+    for tables of many rows. Its rows are given as mmCIFColumnRow objects
+    made on access, and whole columns are searched without making them.
+    The list the table inherits holds no rows, so every list method is
+    implemented on the columns; rows added to the table are copied into
+    them, and rows removed from it are returned as mmCIFRow copies.
+
+    mmCIFColumnTable.column_data - lower case column name -> list of the
+                                   values of the rows, None for no value
+    """
+    __slots__ = ["column_data", "num_rows"]
+
+    def __init__(self, name, columns = None):
+        self.column_data = dict()
+        self.num_rows = 0
+        mmCIFTable.__init__(self, name, columns)
+
+    def __deepcopy__(self, memo):
+        table = mmCIFColumnTable(self.name, self.columns[:])
+        table.__setstate__((self.column_data, self.num_rows))
+        return table
+
+    def __reduce__(self):
+        return (mmCIFColumnTable, (self.name, self.columns),
+                (self.column_data, self.num_rows))
+
+    def __setstate__(self, state):
+        column_data, self.num_rows = state
+        self.column_data = dict()
+        for clower, column in column_data.iteritems():
+            self.column_data[clower] = column[:]
+
+    def __sizeof__(self):
+        size = list.__sizeof__(self) + sys.getsizeof(self.column_data)
+        for column in self.column_data.itervalues():
+            size += sys.getsizeof(column)
+        return size
+
+    def __len__(self):
+        return self.num_rows
+
+    def __iter__(self):
+        return itertools.imap(
+            mmCIFColumnRow, itertools.repeat(self), xrange(self.num_rows))
+
+    def __reversed__(self):
+        return itertools.imap(
+            mmCIFColumnRow, itertools.repeat(self),
+            xrange(self.num_rows - 1, -1, -1))
+
+    def __contains__(self, row):
+        try:
+            self.index(row)
+        except ValueError:
+            return False
+        return True
+
+    def __getitem__(self, x):
+        """Retrieves the mmCIFColumnRow at index x from the table if the
+        argument is an integer, or the list of them if it is a slice. If
+        the argument is a string, then the data from the first row is
+        returned.
+        """
+        if isinstance(x, int):
+            if x < 0:
+                x += self.num_rows
+            if x < 0 or x >= self.num_rows:
+                raise IndexError, x
+            return mmCIFColumnRow(self, x)
+
+        elif isinstance(x, slice):
+            return [mmCIFColumnRow(self, i)
+                    for i in xrange(*x.indices(self.num_rows))]
+
+        elif isinstance(x, str):
+            try:
+                return self[0][x]
+            except (IndexError, KeyError):
+                raise KeyError
+
+        raise TypeError, x
+
+    def __setitem__(self, x, value):
+        assert value is not None
+
+        if isinstance(x, int):
+            index = self[x].index
+            self.set_rows(slice(index, index + 1), [value])
+
+        elif isinstance(x, slice):
+            self.set_rows(x, value)
+
+        elif isinstance(x, str):
+            if self.num_rows == 0:
+                self.new_row()
+            self[0][x] = value
+
+    def row_values(self, row):
+        """Returns a dictionary of the values of the mmCIFRow or
+        mmCIFColumnRow row by lower case column name.
+        """
+        assert isinstance(row, (mmCIFRow, mmCIFColumnRow))
+        return dict(row.iteritems())
+
+    def set_rows(self, x, rows):
+        """Replaces the rows of the slice x with rows with the values of the
+        mmCIFRow or mmCIFColumnRow objects of rows, or deletes them if rows
+        is None, and drops the hash indexes.
+        """
+        ## the values are read before the columns are changed, as rows may
+        ## be rows of this table, and the slice is checked on a list of the
+        ## row numbers, so an error leaves the columns unchanged
+        row_numbers = range(self.num_rows)
+        if rows is None:
+            del row_numbers[x]
+        else:
+            rows = [self.row_values(row) for row in rows]
+            row_numbers[x] = rows
+            for values in rows:
+                for clower in values:
+                    if not self.column_data.has_key(clower):
+                        self.column_data[clower] = [None] * self.num_rows
+
+        for clower, column in self.column_data.iteritems():
+            if rows is None:
+                del column[x]
+            else:
+                column[x] = [values.get(clower) for values in rows]
+        self.num_rows = len(row_numbers)
+        self.row_indexes = None
+
+    def index(self, row, start = 0, stop = sys.maxint):
+        if isinstance(row, mmCIFColumnRow) and row.table is self:
+            start, stop, step = slice(start, stop).indices(self.num_rows)
+            if start <= row.index < stop:
+                return row.index
+        raise ValueError, "row not in table"
+
+    def count(self, row):
+        if row in self:
+            return 1
+        return 0
+
+    def append(self, row):
+        """Appends a row with the values of the mmCIFRow or mmCIFColumnRow
+        row.
+        """
+        self.insert(self.num_rows, row)
+
+    def insert(self, i, row):
+        """Inserts a row with the values of the mmCIFRow or mmCIFColumnRow
+        row before index i. The row is copied, so row itself does not
+        become part of the table.
+        """
+        items = self.row_values(row).items()
+        i = max(0, min(i < 0 and i + self.num_rows or i, self.num_rows))
+
+        ## the row numbers after i change, so the hash indexes are kept
+        ## only for a row added at the end
+        row_indexes = self.row_indexes
+        self.row_indexes = None
+
+        for column in self.column_data.itervalues():
+            column.insert(i, None)
+        self.num_rows += 1
+
+        for clower, value in items:
+            self.set_value_lower(i, clower, value)
+
+        if row_indexes and i == self.num_rows - 1:
+            self.row_indexes = row_indexes
+            self.index_row(i, mmCIFColumnRow(self, i), row_indexes.items())
+
+    def remove(self, row):
+        index = self.index(row)
+        if index == self.num_rows - 1 and self.row_indexes:
+            self.unindex_row(index, row)
+        else:
+            self.row_indexes = None
+        for column in self.column_data.itervalues():
+            del column[index]
+        self.num_rows -= 1
+
+    def pop(self, i = -1):
+        """Removes the row at index i, and returns a mmCIFRow copy of it.
+        """
+        row = self[i]
+        cif_row = mmCIFRow(row.iteritems())
+        self.remove(row)
+        return cif_row
+
+    def sort(self, *args, **kwargs):
+        rows = list(self)
+        rows.sort(*args, **kwargs)
+        row_numbers = [row.index for row in rows]
+        for column in self.column_data.itervalues():
+            column[:] = [column[i] for i in row_numbers]
+        self.row_indexes = None
+
+    def reverse(self):
+        for column in self.column_data.itervalues():
+            column.reverse()
+        self.row_indexes = None
+
+    def new_row(self):
+        """Adds a row without values to the table, and returns it.
+        """
+        for column in self.column_data.itervalues():
+            column.append(None)
+        self.num_rows += 1
+        row = mmCIFColumnRow(self, self.num_rows - 1)
+        if self.row_indexes:
+            self.index_row(row.index, row, self.row_indexes.items())
+        return row
+
+    def set_value_lower(self, index, clower, value):
+        """Sets the value of column clower of row index, None for no value,
+        and moves the row to its entries for the new value in the hash
+        indexes of the column.
+        """
+        try:
+            column = self.column_data[clower]
+        except KeyError:
+            column = self.column_data[clower] = [None] * self.num_rows
+
+        if self.row_indexes and column[index] != value:
+            row = mmCIFColumnRow(self, index)
+            unindexed = self.unindex_row(index, row, clower)
+            column[index] = value
+            self.index_row(index, row, unindexed)
+        else:
+            column[index] = value
+
+    def extend_columns(self, column_values, nrows):
+        """Adds nrows rows given by column_values, a list of 2-tuples of a
+        lower case column name and a list of its values in the rows, with
+        None for no value. A list may be shorter than nrows if the last
+        rows have no value for the column.
+        """
+        self.row_indexes = None
+        num_rows = self.num_rows + nrows
+        for clower, values in column_values:
+            try:
+                column = self.column_data[clower]
+            except KeyError:
+                column = self.column_data[clower] = [None] * self.num_rows
+            column.extend(values)
+        for column in self.column_data.itervalues():
+            if len(column) < num_rows:
+                column.extend([None] * (num_rows - len(column)))
+        self.num_rows = num_rows
+
+    def autoset_columns(self):
+        """Automatically sets the mmCIFTable column names to the columns
+        which have values.
+        """
+        for clower, column in self.column_data.iteritems():
+            if column.count(None) < self.num_rows:
+                if clower not in self.columns_lower:
+                    self.append_column(clower)
+            else:
+                self.remove_column(clower)
+        for clower in self.columns_lower.keys():
+            if not self.column_data.has_key(clower):
+                self.remove_column(clower)
+
+    def get_column(self, column):
+        """Returns a list of the values of the column in each row, with None
+        for the rows without a value.
+        """
+        try:
+            return self.column_data[column.lower()][:]
+        except KeyError:
+            return [None] * self.num_rows
+
+    def iter_column_chunks(self, clowers, nrows):
+        """Iterates over the rows of the table in chunks of at most nrows
+        rows, see mmCIFTable.iter_column_chunks().
+        """
+        for i in xrange(0, self.num_rows, nrows):
+            chunk = []
+            for clower in clowers:
+                try:
+                    chunk.append(self.column_data[clower][i:i + nrows])
+                except KeyError:
+                    chunk.append([None] * min(nrows, self.num_rows - i))
+            yield chunk
+
+    def iter_row_indexes(self, args):
+        """Iterates over the indexes of the rows matching all the
+        (<lower-case-column-name>, <column-value>) tuples of args, searching
+        the column of the first one.
+        """
+        tests = []
+        for clower, value in args:
+            try:
+                column = self.column_data[clower]
+            except KeyError:
+                if value is not None:
+                    return
+                continue
+            tests.append((column, value))
+
+        if not tests:
+            for i in xrange(self.num_rows):
+                yield i
+            return
+
+        column1, value1 = tests[0]
+        tests = tests[1:]
+        i = -1
+        while True:
+            try:
+                i = column1.index(value1, i + 1)
+            except ValueError:
+                return
+            for column, value in tests:
+                if column[i] != value:
+                    break
+            else:
+                yield i
+
+    def get_row(self, *args):
+        """Returns the first row matching all the arguments, see
+        mmCIFTable.get_row().
+        """
+        indexes = self.lookup_rows(args)
+        if indexes is None:
+            indexes = self.iter_row_indexes(args)
+        for i in indexes:
+            return mmCIFColumnRow(self, i)
+        return None
+
+    def iter_rows(self, *args):
+        """This is the same as get_row, but it iterates over all matching
+        rows in the table.
+        """
+        indexes = self.lookup_rows(args)
+        if indexes is None:
+            indexes = self.iter_row_indexes(args)
+        else:
+            indexes = indexes[:]
+        return itertools.imap(mmCIFColumnRow, itertools.repeat(self), indexes)
+
+    def build_row_index(self, clowers):
+        columns = []
+        for clower in clowers:
+            try:
+                columns.append(self.column_data[clower])
+            except KeyError:
+                columns.append(itertools.repeat(None, self.num_rows))
+        return self.make_row_index(xrange(self.num_rows), columns)
+
+    def is_last_row(self, item):
+        return item == self.num_rows - 1
+
+    def row_index_dict(self, clower):
+        """Return a dictionary mapping the value of the row's value in
+        column 'key' to the row itself. If there are multiple rows with
+        the same key value, they will be overwritten with the last found
+        row.
+        """
+        dictx = dict()
+        for i, value in enumerate(self.column_data.get(clower, ())):
+            if value is not None:
+                dictx[value] = mmCIFColumnRow(self, i)
+        return dictx
+
+
+class mmCIFStreamTable(mmCIFTableListMethods, mmCIFTable):
+    """A loop_ table whose rows are not stored, but made in chunks by a
+    function each time the table is written or iterated over, so a table
+    too large to hold as rows is written by mmCIFFileWriter a chunk at a
+    time. Its rows cannot be added, removed, replaced or reordered, and it
+    is searched by scanning the rows it makes. The rows are made again
+    each time, so a row object is never found in the table by index(),
+    count() or the in operator.
+
+    mmCIFStreamTable.num_rows      - the number of rows
+    mmCIFStreamTable.column_chunks - function of (clowers, nrows) returning
+                                     an iterator over the chunks of rows,
+                                     see mmCIFTable.iter_column_chunks()
+    """
+    __slots__ = ["num_rows", "column_chunks"]
+
+    def __init__(self, name, columns, num_rows, column_chunks):
+        mmCIFTable.__init__(self, name, columns)
+        self.num_rows = num_rows
+        self.column_chunks = column_chunks
+
+    def __len__(self):
+        return self.num_rows
+
+    def __iter__(self):
+        clowers = [column.lower() for column in self.columns]
+        for chunk in self.column_chunks(clowers, WRITE_CHUNK):
+            for values in itertools.izip(*chunk):
+                yield mmCIFRow([(clower, value)
+                                for clower, value in itertools.izip(clowers, values)
+                                if value is not None])
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __contains__(self, row):
+        return False
+
+    def __getitem__(self, x):
+        """Retrieves the mmCIFRow at index x, made by iterating over the rows
+        up to it, if the argument is an integer, or the list of them if it
+        is a slice. If the argument is a string, then the data from the
+        first row is returned.
+        """
+        if isinstance(x, int):
+            if x < 0:
+                x += self.num_rows
+            if x < 0 or x >= self.num_rows:
+                raise IndexError, x
+            return itertools.islice(self, x, None).next()
+
+        elif isinstance(x, slice):
+            start, stop, step = x.indices(self.num_rows)
+            if step < 0:
+                return list(self)[x]
+            return list(itertools.islice(self, start, max(start, stop), step))
+
+        return mmCIFTable.__getitem__(self, x)
+
+    def __reduce__(self):
+        raise mmCIFError("mmCIFStreamTable %s cannot be pickled" % (self.name))
+
+    def __setitem__(self, x, value):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def __delitem__(self, x):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def set_rows(self, x, rows):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def index(self, row, start = 0, stop = sys.maxint):
+        raise ValueError, "row not in table"
+
+    def count(self, row):
+        return 0
+
+    def append(self, row):
+        raise mmCIFError("rows cannot be added to mmCIFStreamTable %s" % (self.name))
+
+    def insert(self, i, row):
+        raise mmCIFError("rows cannot be added to mmCIFStreamTable %s" % (self.name))
+
+    def extend(self, rows):
+        raise mmCIFError("rows cannot be added to mmCIFStreamTable %s" % (self.name))
+
+    def remove(self, row):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def pop(self, i = -1):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def sort(self, *args, **kwargs):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def reverse(self):
+        raise mmCIFError("rows of mmCIFStreamTable %s cannot be changed" % (self.name))
+
+    def iter_column_chunks(self, clowers, nrows):
+        return self.column_chunks(clowers, nrows)
+
+    def lookup_rows(self, args):
+        ## the rows are made again for each search, so they are not indexed
+        return None
+
 
 class mmCIFData(list):
     """Contains all information found under a data_ block in a mmCIF file.
@@ -313,13 +1333,19 @@ class mmCIFData(list):
     would suggest. Since a mmCIF file is more-or-less a SQL database dump,
     the files are represented here with their sections as "Tables" and
     their subsections as "Columns". The data is stored in "Rows".
+
+    A mmCIFData loaded by mmCIFFile.load_file() with lazy = True has a
+    mmCIFBlockIndex as its block_index until all its tables are parsed. A
+    table is parsed when it is first looked up by name, and the remaining
+    tables when the block is iterated or indexed as a list.
     """
-    __slots__ = ["name", "file"]
+    __slots__ = ["name", "file", "block_index"]
     
     def __init__(self, name):
         assert name is not None        
         list.__init__(self)
         self.name = name
+        self.block_index = None
 
     def __str__(self):
         return "mmCIFData(name = %s)" % (self.name)
@@ -339,23 +1365,90 @@ class mmCIFData(list):
         except KeyError:
             raise AttributeError(name)
     
+    def __len__(self):
+        if self.block_index is not None:
+            self.load_tables()
+        return list.__len__(self)
+
+    def __nonzero__(self):
+        return self.block_index is not None or list.__len__(self) > 0
+
+    def __iter__(self):
+        if self.block_index is not None:
+            self.load_tables()
+        return list.__iter__(self)
+
+    def __contains__(self, table):
+        if self.block_index is not None:
+            self.load_tables()
+        return list.__contains__(self, table)
+
     def __getitem__(self, x):
         if isinstance(x, int):
+            if self.block_index is not None:
+                self.load_tables()
             return list.__getitem__(self, x)
 
         elif isinstance(x, str):
             name = x.lower()
-            for ctable in self:
+            if self.block_index is not None and \
+               self.block_index.table_ranges.has_key(name):
+                self.load_table(name)
+            for ctable in list.__iter__(self):
                 if ctable.name.lower() == name:
                     return ctable
             raise KeyError, x
 
         raise TypeError, x
 
+    def load_table(self, clower):
+        """Parses the table named clower (lower case) from the file the
+        block was loaded from, along with any other table found in its part
+        of the file which was not indexed, and adds it in file order.
+        """
+        block_index = self.block_index
+        table_order = block_index.table_order
+
+        for table in block_index.parse_table(clower):
+            name = table.name.lower()
+            if name != clower and table_order.has_key(name):
+                continue
+            order = table_order.get(name, sys.maxint)
+            i = 0
+            for ctable in list.__iter__(self):
+                if table_order.get(ctable.name.lower(), sys.maxint) > order:
+                    break
+                i += 1
+            table.data = self
+            list.insert(self, i, table)
+
+        if not block_index.table_ranges:
+            self.block_index = None
+
+    def load_tables(self):
+        """Parses all the tables of the block which are not parsed yet.
+        """
+        while self.block_index is not None:
+            clower = self.block_index.next_table()
+            self.load_table(clower)
+
+    def discard_table(self, name):
+        """Drops the table name from the tables of the block not parsed yet,
+        if it is one of them.
+        """
+        if self.block_index is not None:
+            self.block_index.table_ranges.pop(name.lower(), None)
+            if not self.block_index.table_ranges:
+                self.block_index = None
+
     def __setitem__(self, x, table):
         """
         """
         assert isinstance(table, mmCIFTable)
+        if isinstance(x, int) and self.block_index is not None:
+            self.load_tables()
+        elif isinstance(x, str):
+            self.discard_table(x)
 
         try:
             old_table = self[x]
@@ -381,6 +1474,7 @@ class mmCIFData(list):
         with the same name.
         """
         assert isinstance(table, mmCIFTable)
+        self.discard_table(table.name)
         try:
             del self[table.name]
         except KeyError:
@@ -390,6 +1484,8 @@ class mmCIFData(list):
 
     def insert(self, i, table):
         assert isinstance(table, mmCIFTable)
+        if self.block_index is not None:
+            self.load_tables()
         try:
             del self[table.name]
         except KeyError:
@@ -551,15 +1647,24 @@ class mmCIFFile(list):
         except KeyError:
             return default
         
-    def load_file(self, fil):
+    def load_file(self, fil, columnar = False, lazy = False):
         """Load and append the mmCIF data from file object fil into self.
         The fil argument must be a file object or implement its iterface.
+        If columnar is True, loop_ tables are loaded as mmCIFColumnTable
+        objects. If lazy is True and fil is a path or a seekable file, the
+        file is only scanned for the offsets of its data blocks and tables,
+        and each table is parsed when it is first used; the file must stay
+        open until then.
         """
         if isinstance(fil, str):
-            fileobj = open(fil, "r")
+            fileobj = open(fil, lazy and "rb" or "r")
         else:
             fileobj = fil
-        mmCIFFileParser().parse_file(fileobj, self)
+
+        if lazy and hasattr(fileobj, "seek"):
+            mmCIFFileIndex(fileobj, columnar).scan(self)
+        else:
+            mmCIFFileParser().parse_file(fileobj, self, columnar)
 
     def save_file(self, fil):
         if isinstance(fil, str):
@@ -602,16 +1707,21 @@ class mmCIFDictionary(mmCIFFile):
 
 
 class mmCIFFileParser(object):
-    """Stateful parser which uses the mmCIFElementFile tokenizer to read
-    a mmCIF file and convert it into the mmCIFData/mmCIFTable/mmCIFRow
-    data hierarchy.
+    """Stateful parser which tokenizes a mmCIF file line by line and
+    converts it into the mmCIFData/mmCIFTable/mmCIFRow data hierarchy.
+    The data of loop_ tables is read a whole line at a time, and made
+    into rows in chunks.
     """
-    def parse_file(self, fileobj, cif_file):
+    def parse_file(self, fileobj, cif_file, columnar = False):
+        self.columnar = columnar
         self.line_number = 0
-        token_iter = self.gen_token_iter(fileobj)
+        self.file_iter = iter(fileobj)
+
+        ## the tokens remaining on the current line, in reverse order
+        self.tokens = []
 
         try:
-            self.parse(token_iter, cif_file)
+            self.parse(cif_file)
         except StopIteration:
             pass
         else:
@@ -636,7 +1746,7 @@ class mmCIFFileParser(object):
         name = tokx[i+1:]
         return rword, name
         
-    def parse(self, token_iter, cif_file):
+    def parse(self, cif_file):
         """Stateful parser for mmCIF files.
 
         XXX: loop_, data_, save_ tags are handled in a case-sensitive
@@ -652,7 +1762,7 @@ class mmCIFFileParser(object):
         ## ignore anything in the input file until a reserved word is
         ## found
         while True:
-            tblx, colx, strx, tokx = token_iter.next()
+            tblx, colx, strx, tokx = self.next_token()
             if tokx is None:
                 continue
             rword, name = self.split_token(tokx)
@@ -724,7 +1834,7 @@ class mmCIFFileParser(object):
 
                 ## get the next token from the file, it should be the data
                 ## keyed by the previous token
-                tx, cx, strx, tokx = token_iter.next()
+                tx, cx, strx, tokx = self.next_token()
                 if tx is not None or (strx is None and tokx is None):
                     self.syntax_error("missing data for _%s.%s" % (tblx,colx))
 
@@ -745,7 +1855,7 @@ class mmCIFFileParser(object):
                 else:
                     self.syntax_error("bad token #4")
 
-                tblx, colx, strx, tokx = token_iter.next()
+                tblx, colx, strx, tokx = self.next_token()
                 continue
 
             ###
@@ -757,7 +1867,7 @@ class mmCIFFileParser(object):
             elif state == "RD_LOOP":
                 ## the first section.subsection (tblx.colx) is read
                 ## to create the section(table) name for the entire loop
-                tblx, colx, strx, tokx = token_iter.next()
+                tblx, colx, strx, tokx = self.next_token()
 
                 if tblx is None or colx is None:
                     self.syntax_error("bad token #5")
@@ -767,7 +1877,10 @@ class mmCIFFileParser(object):
                     self.syntax_error("_loop section duplication")
                     return
 
-                cif_table = mmCIFTable(tblx)
+                if self.columnar:
+                    cif_table = mmCIFColumnTable(tblx)
+                else:
+                    cif_table = mmCIFTable(tblx)
 
                 try:
                     cif_data.append(cif_table)
@@ -779,7 +1892,7 @@ class mmCIFFileParser(object):
 
                 ## read the remaining subsection definitions for the loop_
                 while True:
-                    tblx, colx, strx, tokx = token_iter.next()
+                    tblx, colx, strx, tokx = self.next_token()
                     
                     if tblx is None:
                         break
@@ -802,30 +1915,8 @@ class mmCIFFileParser(object):
                                 "unexpected reserved word: %s" % (rword))
                     
                 ## now read all the data 
-                while True:
-                    cif_row = mmCIFRow()
-                    cif_table.append(cif_row)
-
-                    for col in cif_table.columns:
-                        if tokx is not None:
-                            if tokx != ".":
-                                cif_row[col] = tokx
-                        elif strx is not None:
-                            cif_row[col] = strx
-
-                        tblx,colx,strx,tokx = token_iter.next()
-
-                    ## the loop ends when one of these conditions is met:
-                    ## condition #1: a new table is encountered
-                    if tblx is not None:
-                        break
-
-                    ## condition #2: a reserved word is encountered
-                    if tokx is not None:
-                        rword, name = self.split_token(tokx)
-                        if rword is not None:
-                            break
-
+                tblx, colx, strx, tokx = self.read_loop(
+                    cif_table, (tblx, colx, strx, tokx))
                 continue
 
             elif state == "RD_DATA":
@@ -834,7 +1925,7 @@ class mmCIFFileParser(object):
                 cif_table_cache = dict()
                 cif_table = None
 
-                tblx,colx,strx,tokx = token_iter.next()
+                tblx,colx,strx,tokx = self.next_token()
 
             elif state == "RD_SAVE":
                 cif_data = mmCIFSave(tokx[5:])
@@ -842,77 +1933,473 @@ class mmCIFFileParser(object):
                 cif_table_cache = dict()
                 cif_table = None
 
-                tblx,colx,strx,tokx = token_iter.next()
+                tblx,colx,strx,tokx = self.next_token()
                 
 
-    def gen_token_iter(self, fileobj):
-        re_tok = re.compile(
-            r"(?:"
-
-             "(?:_(.+?)[.](\S+))"               "|"  # _section.subsection
-
-             "(?:['\"](.*?)(?:['\"]\s|['\"]$))" "|"  # quoted strings
-
-             "(?:\s*#.*$)"                      "|"  # comments
-
-             "(\S+)"                                 # unquoted tokens
+    def read_line(self):
+        """Returns the next line of the file, raising StopIteration at the
+        end.
+        """
+        ln = self.file_iter.next()
+        self.line_number += 1
+        return ln
 
-             ")")
+    def read_text_field(self, ln):
+        """Returns the semi-colon multi-line string starting on line ln.
+        """
+        lmerge = [ln[1:]]
+        while True:
+            ln = self.read_line()
+            if ln.startswith(";"):
+                break
+            lmerge.append(ln)
 
-        file_iter = iter(fileobj)
+        lmerge[-1] = lmerge[-1].rstrip()
+        return "".join(lmerge)
 
-        ## parse file, yielding tokens for self.parser()
-        while True:
-            ln = file_iter.next()
-            self.line_number += 1
+    def split_line(self, ln):
+        """Returns the list of tokens on line ln as 4-tuples:
+        (section, subsection, quoted string, unquoted token)
+        """
+        if RE_SPECIAL.search(ln) is None:
+            return [(None, None, None, tokx) for tokx in ln.split()]
+
+        tokens = []
+        for tokm in RE_TOKEN.finditer(ln):
+            groups = tokm.groups()
+            if groups != (None, None, None, None):
+                tokens.append(groups)
+        return tokens
+
+    def next_token(self):
+        """Returns the next token of the file as a 4-tuple, see
+        split_line(), raising StopIteration at the end.
+        """
+        while not self.tokens:
+            ln = self.read_line()
 
             ## skip comments
             if ln.startswith("#"):
                 continue
-            
+
             ## semi-colen multi-line strings
             if ln.startswith(";"):
-                lmerge = [ln[1:]]
+                self.tokens = [(None, None, self.read_text_field(ln), None)]
+            else:
+                self.tokens = self.split_line(ln)
+                self.tokens.reverse()
+
+        return self.tokens.pop()
+
+    def read_loop(self, cif_table, token):
+        """Reads the data of a loop_ into rows of cif_table, starting with
+        token, and returns the token which ends the loop. Lines of unquoted
+        tokens are split as a whole and added to a flat list of values, and
+        rows are made from it in chunks. Like the data, a row may span
+        lines, and a line may hold several rows.
+        """
+        columns = [column.lower() for column in cif_table.columns]
+        ncols = len(columns)
+
+        ## values of the rows not yet added to cif_table
+        values = []
+
+        tokens = [token]
+        while self.tokens:
+            tokens.append(self.tokens.pop())
+
+        ## the rows hold only strings, so the collector is not run while
+        ## hundreds of thousands of them are made
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            while True:
+                i = self.scan_loop_tokens(tokens, values, ncols)
+                if i != -1:
+                    tokens = tokens[i:]
+                    tokens.reverse()
+                    self.tokens = tokens
+                    break
+
+                if len(values) >= LOOP_CHUNK:
+                    nvalues = len(values) - len(values) % ncols
+                    self.add_loop_rows(cif_table, columns, values, nvalues)
+                    del values[:nvalues]
+
+                ## read lines until one needs to be tokenized, or a chunk
+                ## of values is read
+                tokens = []
                 while True:
-                    ln = file_iter.next()
-                    self.line_number += 1
+                    ln = self.read_line()
+
+                    if ln.startswith("#"):
+                        continue
+
                     if ln.startswith(";"):
+                        tokens = [(None, None, self.read_text_field(ln), None)]
                         break
-                    lmerge.append(ln)
 
-                lmerge[-1] = lmerge[-1].rstrip()
-                yield (None, None, "".join(lmerge), None)
+                    if RE_SPECIAL.search(ln) is None:
+                        values.extend(ln.split())
+
+                    elif RE_LOOP_END.search(ln) is None:
+                        self.add_line_values(ln, values)
+
+                    else:
+                        tokens = self.split_line(ln)
+                        break
+
+                    if len(values) >= LOOP_CHUNK:
+                        break
+        finally:
+            self.add_loop_rows(cif_table, columns, values, len(values))
+            if gc_enabled:
+                gc.enable()
+
+        return self.next_token()
+
+    def add_line_values(self, ln, values):
+        """Adds the values of a loop_ data line which has quoted strings or
+        comments, but no token which could end the loop, to the list values.
+        """
+        line_values = RE_VALUE.findall(ln)
+
+        if ("'.", "") not in line_values and ('".', "") not in line_values:
+            values.extend([tokx or strx[1:]
+                           for (strx, tokx) in line_values if strx or tokx])
+            return
+
+        for strx, tokx in line_values:
+            if tokx:
+                values.append(tokx)
+            elif strx == "'." or strx == '".':
+                values.append(QUOTED_DOT)
+            elif strx:
+                values.append(strx[1:])
+
+    def scan_loop_tokens(self, tokens, values, ncols):
+        """Adds the values of the loop_ data tokens to the list values, and
+        returns the index of the token which ends the loop, or -1. The loop
+        ends at a section.subsection or a reserved word which begins a row.
+        """
+        for i, (tblx, colx, strx, tokx) in enumerate(tokens):
+            if tokx is not None:
+                if len(values) % ncols == 0:
+                    rword, name = self.split_token(tokx)
+                    if rword is not None:
+                        return i
+                values.append(tokx)
+
+            elif strx is not None:
+                if strx == ".":
+                    values.append(QUOTED_DOT)
+                else:
+                    values.append(strx)
+
+            else:
+                ## a section.subsection inside a row leaves its column
+                ## without a value
+                if len(values) % ncols == 0:
+                    return i
+                values.append(".")
+
+        return -1
+
+    def add_loop_rows(self, cif_table, columns, values, nvalues):
+        """Adds rows made from the first nvalues values of a loop_ to
+        cif_table; a final partial row holds the columns it has values for.
+        Unquoted "." values are left out of the rows. The columns with a
+        value in every row make the rows in one step, the columns with
+        some "." values are then added a column at a time, and those with
+        only "." values are skipped.
+        """
+        if isinstance(cif_table, mmCIFColumnTable):
+            self.add_loop_columns(cif_table, columns, values, nvalues)
+            return
+
+        ncols = len(columns)
+        nrows = nvalues // ncols
+        nfull = nrows * ncols
+
+        full_columns = []
+        full_values = []
+        sparse_columns = []
+        for i, column in enumerate(columns):
+            column_values = values[i:nfull:ncols]
+            ndots = column_values.count(".")
+            if ndots == nrows:
                 continue
+            if ndots == 0 and QUOTED_DOT not in column_values:
+                full_columns.append(column)
+                full_values.append(column_values)
+            else:
+                sparse_columns.append((column, column_values))
+
+        if full_columns:
+            cif_rows = map(mmCIFRow, itertools.imap(
+                itertools.izip,
+                itertools.repeat(full_columns),
+                itertools.izip(*full_values)))
+        else:
+            cif_rows = [mmCIFRow() for i in xrange(nrows)]
+
+        for column, column_values in sparse_columns:
+            keep = map(operator.ne, column_values, itertools.repeat(".", nrows))
+            if QUOTED_DOT in column_values:
+                column_values = [value is QUOTED_DOT and "." or value
+                                 for value in column_values]
+            list(itertools.imap(
+                dict.__setitem__,
+                itertools.compress(cif_rows, keep),
+                itertools.repeat(column),
+                itertools.compress(column_values, keep)))
+
+        if nfull < nvalues:
+            cif_row = mmCIFRow()
+            for column, value in itertools.izip(columns, values[nfull:nvalues]):
+                if value is QUOTED_DOT:
+                    cif_row[column] = "."
+                elif value != ".":
+                    cif_row[column] = value
+            cif_rows.append(cif_row)
+
+        for cif_row in cif_rows:
+            cif_row.table = cif_table
+        list.extend(cif_table, cif_rows)
+
+    def add_loop_columns(self, cif_table, columns, values, nvalues):
+        """Adds the rows made from the first nvalues values of a loop_ to
+        the mmCIFColumnTable cif_table, a column at a time.
+        """
+        ncols = len(columns)
+        nrows = (nvalues + ncols - 1) // ncols
+
+        ## unquoted "." values are stored as None
+        dot_map = {".": None, QUOTED_DOT: "."}
+
+        column_values = []
+        for i, column in enumerate(columns):
+            values_i = values[i:nvalues:ncols]
+            if "." in values_i or QUOTED_DOT in values_i:
+                values_i = [dot_map.get(value, value) for value in values_i]
+            column_values.append((column, values_i))
+
+        cif_table.extend_columns(column_values, nrows)
 
-            ## split line into tokens
-            tok_iter = re_tok.finditer(ln)
 
-            for tokm in tok_iter:
-                groups = tokm.groups()
-                if groups != (None, None, None, None):
-                    yield groups
+class mmCIFBlockIndex(object):
+    """The tables of a data block of a lazily loaded mmCIF file which are
+    not parsed yet, see mmCIFFileIndex.
+
+    mmCIFBlockIndex.table_order  - lower case table name -> position of the
+                                   table in the block
+    mmCIFBlockIndex.table_ranges - lower case table name -> list of the
+                                   (offset, nbytes, line_number) ranges of
+                                   the file holding the table, for the
+                                   tables not parsed yet
+    """
+    def __init__(self, file_index):
+        self.file_index = file_index
+        self.table_order = {}
+        self.table_ranges = {}
+
+    def add_segment(self, segment, end_offset):
+        """Adds the range of the file from the [clower, offset, line_number]
+        segment to end_offset to the ranges of table clower.
+        """
+        clower, offset, line_number = segment
+        if not self.table_order.has_key(clower):
+            self.table_order[clower] = len(self.table_order)
+            self.table_ranges[clower] = []
+        self.table_ranges[clower].append(
+            (offset, end_offset - offset, line_number))
+
+    def next_table(self):
+        """Returns the name of the first table of the block not parsed yet.
+        """
+        return min(self.table_ranges.keys(), key = self.table_order.get)
+
+    def parse_table(self, clower):
+        """Parses the table clower and returns the list of tables found in
+        its ranges of the file.
+        """
+        tables = self.file_index.parse_ranges(self.table_ranges[clower])
+        del self.table_ranges[clower]
+        return tables
+
+
+class mmCIFFileIndex(object):
+    """Scans a seekable mmCIF file once for the byte offsets of its data_
+    and save_ blocks and of the tables in them, without parsing any
+    values, and parses single tables from those offsets on demand. Block
+    headers, loop_ and tags are found at the start of lines, outside of
+    semi-colon text fields.
+    """
+    def __init__(self, fileobj, columnar = False):
+        self.fileobj = fileobj
+        self.columnar = columnar
+
+    def scan(self, cif_file):
+        """Appends the data blocks of the file to cif_file, with a
+        mmCIFBlockIndex of their tables in place of the parsed tables.
+        """
+        fileobj = self.fileobj
+        fileobj.seek(0)
+
+        block_list = []
+        block_index = None
+
+        ## the open range of a table as [clower, offset, line_number], and
+        ## the (offset, line_number) of a loop_ whose first tag is not read;
+        ## the tags of a loop_ all belong to its range, so the parser finds
+        ## any change of section name among them; the reserved word ending
+        ## a loop_ without values is kept in its range for the same reason
+        segment = None
+        loop_start = None
+        loop_header = False
+        loop_empty = False
+
+        in_text = False
+        offset = 0
+        line_number = 0
+
+        for ln in iter(fileobj.readline, ""):
+            line_number += 1
+
+            if ln.startswith(";"):
+                in_text = not in_text
+                loop_empty = False
+                offset += len(ln)
+                continue
+            if in_text:
+                offset += len(ln)
+                continue
+
+            s = ln
+            c = s[:1]
+            if c == " " or c == "\t":
+                s = ln.lstrip()
+                c = s[:1]
+
+            if c == "_":
+                i = s.find(".")
+                if i != -1 and block_index is not None:
+                    clower = s[1:i].lower()
+                    if loop_start is not None:
+                        segment = [clower, loop_start[0], loop_start[1]]
+                        loop_start = None
+                        loop_header = True
+                        loop_empty = True
+                    elif loop_header:
+                        pass
+                    elif segment is None or segment[0] != clower:
+                        if segment is not None:
+                            block_index.add_segment(segment, offset)
+                        segment = [clower, offset, line_number]
+                offset += len(ln)
+                continue
+
+            loop_header = False
+
+            if c and c in "dDsSlL":
+                word = s[:5].lower()
+                if word in ("loop_", "data_", "save_", "stop_"):
+                    if segment is not None:
+                        if loop_empty:
+                            block_index.add_segment(segment, offset + len(ln))
+                        else:
+                            block_index.add_segment(segment, offset)
+                        segment = None
+                    loop_start = None
+                    loop_empty = False
+
+                if word == "loop_":
+                    loop_start = (offset, line_number)
+
+                elif word == "data_" or word == "save_":
+                    name = s.split(None, 1)[0][5:]
+                    if word == "data_":
+                        cif_data = mmCIFData(name)
+                    else:
+                        cif_data = mmCIFSave(name)
+                    cif_file.append(cif_data)
+                    block_index = mmCIFBlockIndex(self)
+                    block_list.append((cif_data, block_index))
+
+                elif word == "stop_":
+                    raise mmCIFError()
+
+            if loop_empty and c and c != "#" and c != "\n" and c != "\r":
+                loop_empty = False
+
+            offset += len(ln)
+
+        if segment is not None:
+            block_index.add_segment(segment, offset)
+
+        for cif_data, block_index in block_list:
+            if block_index.table_ranges:
+                cif_data.block_index = block_index
+
+    def parse_ranges(self, ranges):
+        """Parses the (offset, nbytes, line_number) ranges of the file as
+        the contents of one data block, and returns its tables.
+        """
+        parser = mmCIFFileParser()
+        cif_file = mmCIFFile()
+        parser.parse_file(
+            self.iter_range_lines(parser, ranges), cif_file, self.columnar)
+        return list(cif_file[0])
+
+    def iter_range_lines(self, parser, ranges):
+        """Iterates over the lines of the ranges, after a data_ line which
+        starts the block, keeping the line numbers of the parser those of
+        the file.
+        """
+        yield "data_\n"
+        for offset, nbytes, line_number in ranges:
+            self.fileobj.seek(offset)
+            lines = cStringIO.StringIO(self.fileobj.read(nbytes))
+            parser.line_number = line_number - 1
+            for ln in lines:
+                yield ln
 
 
 class mmCIFFileWriter(object):
-    """Writes out a mmCIF file using the data in the mmCIFData list.
+    """Writes out a mmCIF file using the data in the mmCIFData list. The
+    output is collected in a buffer of WRITE_BUFFER bytes, and loop_ tables
+    are formatted a column at a time in chunks of WRITE_CHUNK rows.
     """  
     def write_file(self, fil, cif_data_list):
         self.fil = fil
+        self.buffer = []
+        self.buffer_size = 0
 
         ## constant controlls the spacing between columns
         self.SPACING = 2
 
         ## iterate through the data sections and write them
         ## out to the file
-        for cif_data in cif_data_list:
-            self.cif_data = cif_data
-            self.write_cif_data()
+        try:
+            for cif_data in cif_data_list:
+                self.cif_data = cif_data
+                self.write_cif_data()
+        finally:
+            self.flush()
 
     def write(self, x):
-        self.fil.write(x)
+        self.buffer.append(x)
+        self.buffer_size += len(x)
+        if self.buffer_size >= WRITE_BUFFER:
+            self.flush()
 
     def writeln(self, x = ""):
-        self.fil.write(x + "\n")
+        self.write(x + "\n")
+
+    def flush(self):
+        self.fil.write("".join(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
 
     def write_mstring(self, mstring):
         self.write(self.form_mstring(mstring))
@@ -1046,60 +2533,35 @@ class mmCIFFileWriter(object):
             assert len(key) < MAX_LINE
             self.writeln(key)
 
-        col_len_map   = {}
-        col_dtype_map = {}
+        clowers = [col.lower() for col in cif_table.columns]
 
-        for row in cif_table:
-            for col in cif_table.columns:
-                ## get data and data type
-                try:
-                    x0 = row[col]
-                except KeyError:
-                    lenx  = 1
-                    dtype = "token"
-                else:
-                    x, dtype = self.data_type(x0)
+        ## a first pass over the rows finds the data type which holds all
+        ## the values of each column, and its width
+        col_dtype_list = ["token"] * len(clowers)
+        col_len_list   = [0] * len(clowers)
 
-                    ## determine write length of data
-                    if dtype == "token":
-                        lenx = len(x)
-                    elif dtype == "qstring":
-                        lenx = len(x) + 2
-                    else:
-                        lenx = 0
+        for chunk in cif_table.iter_column_chunks(clowers, WRITE_CHUNK):
+            for i, values in enumerate(chunk):
+                dtype, lenx = self.column_format(values)
+                if DTYPE_RANK[dtype] > DTYPE_RANK[col_dtype_list[i]]:
+                    col_dtype_list[i] = dtype
+                if lenx > col_len_list[i]:
+                    col_len_list[i] = lenx
 
-                try:
-                    col_dtype = col_dtype_map[col]
-                except KeyError:
-                    col_dtype_map[col] = dtype
-                    col_len_map[col]   = lenx
-                    continue
-
-                ## update the column charactor width if necessary
-                if col_len_map[col] < lenx:
-                    col_len_map[col] = lenx
-
-                ## modify column data type if necessary
-                if col_dtype != dtype:
-                    if dtype == "mstring":
-                        col_dtype_map[col] = "mstring"
-                    elif col_dtype == "token" and dtype == "qstring":
-                        col_dtype_map[col] = "qstring"
-
-        ## form a write list of the column names with values of None to
+        ## form a write list of the column indexes with values of None to
         ## indicate a newline
         wlist = []
         llen = 0
-        for col in cif_table.columns:
-            dtype = col_dtype_map[col]
+        for i in xrange(len(clowers)):
+            dtype = col_dtype_list[i]
 
             if dtype == "mstring":
                 llen = 0
                 wlist.append((None, None, None))
-                wlist.append((col, dtype, None))
+                wlist.append((i, dtype, None))
                 continue
 
-            lenx  = col_len_map[col]
+            lenx  = col_len_list[i]
             if llen == 0:
                 llen = lenx
             else:
@@ -1109,61 +2571,95 @@ class mmCIFFileWriter(object):
                 wlist.append((None, None, None))
                 llen = lenx
 
-            wlist.append((col, dtype, lenx))
-            
-        ## write out the data
-        spacing   = " " * self.SPACING
-        add_space = False
-        listx     = []
+            wlist.append((i, dtype, lenx))
+
+        ## write out the data a chunk of rows at a time; the formatted
+        ## values of each chunk are put together column by column into
+        ## parts of its lines, which are joined into the lines
+        spacing = " " * self.SPACING
 
-        for row in cif_table:
-            for (col, dtype, lenx) in wlist:
+        for chunk in cif_table.iter_column_chunks(clowers, WRITE_CHUNK):
+            nrows = len(chunk[0])
+            parts = []
+            fields = []
 
-                if col is None:
-                    add_space = False
-                    listx.append("\n")
+            for (i, dtype, lenx) in wlist:
+                if i is not None and dtype != "mstring":
+                    fields.append(self.form_column(chunk[i], dtype, lenx))
                     continue
 
-                if add_space == True:
-                    add_space = False
-                    listx.append(spacing)
-
-                if dtype == "token":
-                    x = str(row.get(col, "."))
-                    if x == "":
-                        x = "."
-                    x = x.ljust(lenx)
-                    listx.append(x)
-                    add_space = True
-                    
-                elif dtype == "qstring":
-                    x = row.get(col, ".")
-                    if x == "":
-                        x = "."
-                    elif x != "." and x != "?":
-                        x = "'%s'" % (x)
-                    x = x.ljust(lenx)
-                    listx.append(x)
-                    add_space = True
-
-                elif dtype == "mstring":
-                    try:
-                        listx.append(self.form_mstring(row[col]))
-                    except KeyError:
-                        listx.append(".\n")
-                    add_space = False
-
-            add_space = False
-            listx.append("\n")
-
-            ## write out strx if it gets big to avoid using a lot of
-            ## memory
-            if len(listx) > 1024:
-                self.write("".join(listx))
-                listx = []
-
-        ## write out the _loop section
-        self.write("".join(listx))
+                if fields:
+                    parts.append(map(spacing.join, itertools.izip(*fields)))
+                    fields = []
+
+                if i is None:
+                    parts.append(itertools.repeat("\n", nrows))
+                else:
+                    parts.append([x is None and ".\n" or self.form_mstring(x)
+                                  for x in chunk[i]])
+
+            if fields:
+                parts.append(map(spacing.join, itertools.izip(*fields)))
+            parts.append(itertools.repeat("\n", nrows))
+
+            self.write("".join(map("".join, itertools.izip(*parts))))
+
+    def column_format(self, values):
+        """Returns the 2-tuple (dtype, width) of the values of a loop_
+        column, None for no value: the data type of data_type() which holds
+        all of them, and the width of the widest token or qstring.
+        """
+        dtype = "token"
+        lenmax = 0
+
+        if None in values:
+            lenmax = 1
+            values = [x for x in values if x is not None]
+        if not values:
+            return dtype, lenmax
+
+        ## values which are not strings are all tokens
+        if str not in set(map(type, values)):
+            return dtype, max(lenmax, max(map(len, map(str, values))))
+
+        try:
+            values = set(values)
+        except TypeError:
+            pass
+
+        for x0 in values:
+            x, xtype = self.data_type(x0)
+
+            if xtype == "token":
+                lenx = len(x)
+            elif xtype == "qstring":
+                lenx = len(x) + 2
+            else:
+                lenx = 0
+
+            if lenx > lenmax:
+                lenmax = lenx
+            if DTYPE_RANK[xtype] > DTYPE_RANK[dtype]:
+                dtype = xtype
+
+        return dtype, lenmax
+
+    def form_column(self, values, dtype, lenx):
+        """Returns the list of the values of a token or qstring loop_
+        column, None for no value, formatted and padded to width lenx.
+        """
+        if dtype == "token":
+            column = [x is None and "." or str(x) or "." for x in values]
+        else:
+            column = map(self.form_qstring, values)
+        return map(str.ljust, column, itertools.repeat(lenx, len(column)))
+
+    def form_qstring(self, x):
+        if x is None or x == "":
+            return "."
+        if x == "." or x == "?":
+            return x
+        return "'%s'" % (x)
 
 
 ### <testing>
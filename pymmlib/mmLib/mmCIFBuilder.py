@@ -17,43 +17,48 @@ import Structure
 def setmaps_cif(smap, skey, dmap, dkey):
     """For string converisons, treat [?.] as blank.
     """
-    if smap.has_key_lower(skey):
-        x = smap.getitem_lower(skey)
-        if x in ('', '?', '.'):
-            return False
-        dmap[dkey] = str(x)
-        return True
-    return False
+    x = smap.get_lower(skey)
+    if x is None or x in ('', '?', '.'):
+        return False
+    dmap[dkey] = str(x)
+    return True
 
 
 def setmapi_cif(smap, skey, dmap, dkey):
     """For integer converisons, treat [?.] as blank.
     """
-    if smap.has_key_lower(skey):
-        x = smap.getitem_lower(skey)
-        if x in ('', '?', '.'):
-            return False
-        try:
-            dmap[dkey] = int(x)
-        except ValueError:
-            return False
-        return True
-    return False
+    x = smap.get_lower(skey)
+    if x is None or x in ('', '?', '.'):
+        return False
+    try:
+        dmap[dkey] = int(x)
+    except ValueError:
+        return False
+    return True
 
 
 def setmapf_cif(smap, skey, dmap, dkey):
     """For float converisons, treat [?.] as blank.
     """
-    if smap.has_key_lower(skey):
-        x = smap.getitem_lower(skey)
-        if x in ('', '?', '.'):
-            return False
-        try:
-            dmap[dkey] = float(x)
-        except ValueError:
-            return False
-        return True
-    return False
+    x = smap.get_lower(skey)
+    if x is None or x in ('', '?', '.'):
+        return False
+    try:
+        dmap[dkey] = float(x)
+    except ValueError:
+        return False
+    return True
+
+
+def item_column(vectors, key):
+    """Returns the list of the items vector[key] of the vectors, with None
+    for the vectors which are None.
+    """
+    column = [None] * len(vectors)
+    for i, vector in enumerate(vectors):
+        if vector is not None:
+            column[i] = vector[key]
+    return column
 
 
 class mmCIFStructureBuilder(StructureBuilder.StructureBuilder):
@@ -63,7 +68,7 @@ class mmCIFStructureBuilder(StructureBuilder.StructureBuilder):
     def read_start(self, filobj):
         ## parse the mmCIF file
         self.cif_file = mmCIF.mmCIFFile()
-        self.cif_file.load_file(filobj)
+        self.cif_file.load_file(filobj, columnar = True)
 
         ## for an mmCIF file for a structure, assume the first data item
         ## contains the structure; if there is no data in the mmCIF
@@ -460,12 +465,16 @@ CIF_BUILD_TABLES = {
 
 
 class mmCIFFileBuilder(object):
-    """Builds a mmCIF file from a Structure object.
+    """Builds a mmCIF file from a Structure object. If stream is True, the
+    atom_site and atom_site_anisotrop tables are mmCIFStreamTable objects
+    which make their rows from the Structure's atoms a chunk at a time
+    when the file is written, instead of holding a mmCIFRow for each atom.
     """
-    def __init__(self, struct, cif_file):
+    def __init__(self, struct, cif_file, stream = False):
         self.struct   = struct
         self.entry_id = self.struct.structure_id        
         self.cif_data = cif_file.new_data(self.entry_id)
+        self.stream   = stream
 
         ## entity handling
         ## entity_desc list
@@ -673,9 +682,64 @@ class mmCIFFileBuilder(object):
         row["Int_Tables_number"]    = space_group.number
 
     def add__atom_site(self):
-        """Adds the _atom_site table.
+        """Adds the _atom_site table, and the _atom_site_anisotrop table if
+        any atoms have a U tensor.
         """
+        if self.stream:
+            num_atoms = 0
+            num_aniso = 0
+            for atom in self.iter_atom_site_atoms():
+                num_atoms += 1
+                if atom[1].U is not None:
+                    num_aniso += 1
+
+            self.add_stream_table(
+                "atom_site", num_atoms, self.atom_site_columns, False)
+            if num_aniso > 0:
+                self.add_stream_table(
+                    "atom_site_anisotrop", num_aniso,
+                    self.atom_site_anisotrop_columns, True)
+            return
+
         atom_site = self.get_table("atom_site")
+
+        for atoms in self.iter_atom_chunks(mmCIF.WRITE_CHUNK, False):
+            self.add_rows(atom_site, len(atoms), self.atom_site_columns(atoms))
+
+            aniso_atoms = [atom for atom in atoms if atom[1].U is not None]
+            if aniso_atoms:
+                self.add_rows(self.get_table("atom_site_anisotrop"),
+                              len(aniso_atoms),
+                              self.atom_site_anisotrop_columns(aniso_atoms))
+
+    def add_rows(self, table, num_rows, columns):
+        """Appends num_rows rows to table from columns, a dictionary of lower
+        case column names and the lists of their values, None for no value.
+        """
+        column_items = columns.items()
+        for i in xrange(num_rows):
+            table.append(mmCIF.mmCIFRow(
+                [(clower, values[i]) for clower, values in column_items
+                 if values[i] is not None]))
+
+    def add_stream_table(self, name, num_rows, make_columns, aniso):
+        """Adds a mmCIFStreamTable of num_rows rows, made by the function
+        make_columns from chunks of the atoms of iter_atom_chunks().
+        """
+        def column_chunks(clowers, nrows):
+            for atoms in self.iter_atom_chunks(nrows, aniso):
+                columns = make_columns(atoms)
+                no_values = [None] * len(atoms)
+                yield [columns.get(clower, no_values) for clower in clowers]
+
+        columns = copy.deepcopy(CIF_BUILD_TABLES[name])
+        self.cif_data.append(
+            mmCIF.mmCIFStreamTable(name, columns, num_rows, column_chunks))
+
+    def iter_atom_site_atoms(self):
+        """Iterates over the 4-tuples (atom_id, atm, entity_desc,
+        label_seq_id) of the atoms of the atom_site table.
+        """
         atom_id = 0
 
         for chain in self.struct.iter_all_chains():
@@ -687,102 +751,90 @@ class mmCIFFileBuilder(object):
 
                 for atm in frag.iter_all_atoms():
                     atom_id += 1
+                    yield atom_id, atm, entity_desc, label_seq_id
 
-                    row = atom_site.new_row()
-                    row["id"] = atom_id
-                    
-                    self.set_atom_site_row(row, atm, entity_desc, label_seq_id)
-
-    def set_atom_site_row(self, asrow, atm, entity_desc, label_seq_id):
-        """Add atom_site coordinate row.
+    def iter_atom_chunks(self, nrows, aniso):
+        """Iterates over the atoms of iter_atom_site_atoms() in lists of at
+        most nrows atoms; only the atoms with a U tensor if aniso is True.
         """
-        if entity_desc["polymer"]==True:
-            asrow["group_PDB"]     = "ATOM"
-            asrow["label_asym_id"] = atm.chain_id
-
-        else:
-            asrow["group_PDB"] = "HETATM"
-
-        asrow["label_entity_id"]    = entity_desc["id"]
-        asrow["label_atom_id"]      = atm.name
-        asrow["label_alt_id"]       = atm.alt_loc
-        asrow["label_comp_id"]      = atm.res_name
-        asrow["label_seq_id"]       = label_seq_id
-
-        asrow["auth_atom_id"]       = atm.name
-        asrow["auth_alt_id"]        = atm.alt_loc
-        asrow["auth_comp_id"]       = atm.res_name
-        asrow["auth_seq_id"]        = atm.fragment_id
-        asrow["auth_asym_id"]       = atm.chain_id
-
-        asrow["type_symbol"]        = atm.element
-        asrow["pdbx_PDB_model_num"] = atm.model_id
-        
-        if atm.occupancy is not None:
-            asrow["occupancy"] = atm.occupancy
-
-        if atm.temp_factor is not None:
-            asrow["B_iso_or_equiv"] = atm.temp_factor
-
-        if atm.position is not None:
-            if atm.position[0] is not None:
-                asrow["Cartn_x"] = atm.position[0]
-            if atm.position[1] is not None:
-                asrow["Cartn_y"] = atm.position[1]
-            if atm.position[2] is not None:
-                asrow["Cartn_z"] = atm.position[2]
-        
-        if atm.sig_position is not None:
-            if atm.sig_position[0] is not None:
-                asrow["Cartn_x_esd"] = atm.sig_position[0]
-            if atm.sig_position[1] is not None:
-                asrow["Cartn_y_esd"] = atm.sig_position[1]
-            if atm.sig_position[2] is not None:
-                asrow["Cartn_z_esd"] = atm.sig_position[2]
-
-        if atm.sig_occupancy is not None:
-            asrow["occupancy_esd"] = atm.sig_occupancy
-
-        if atm.sig_temp_factor is not None:
-            asrow["B_iso_or_equiv_esd"] = atm.sig_temp_factor
-
-        if atm.U is not None:
-            aniso = self.get_table("atom_site_anisotrop")
-            anrow = aniso.new_row()
-
-            anrow["id"]                = asrow["id"]
-            anrow["type_symbol"]       = asrow["type_symbol"]
-            anrow["label_entity_id"]   = asrow["label_entity_id"]
-            anrow["pdbx_auth_seq_id"]  = asrow["auth_seq_id"]
-            anrow["pdbx_auth_comp_id"] = asrow["auth_comp_id"]
-            anrow["pdbx_auth_asym_id"] = asrow["auth_asym_id"]
-            anrow["pdbx_auth_atom_id"] = asrow["auth_atom_id"]
-            anrow["pdbx_auth_alt_id"]  = asrow["auth_alt_id"]
-
-            if atm.U[0,0] is not None:
-                anrow["U[1][1]"] = atm.U[0,0]
-            if atm.U[1,1] is not None:
-                anrow["U[2][2]"] = atm.U[1,1]
-            if atm.U[2,2] is not None:
-                anrow["U[3][3]"] = atm.U[2,2]
-            if atm.U[0,1] is not None:
-                anrow["U[1][2]"] = atm.U[0,1]
-            if atm.U[0,2] is not None:
-                anrow["U[1][3]"] = atm.U[0,2]
-            if atm.U[1,2] is not None:
-                anrow["U[2][3]"] = atm.U[1,2]
-
-            if atm.sig_U is not None:
-                if atm.sig_U[0,0] is not None:
-                    anrow["U[1][1]_esd"] = atm.sig_U[0,0]
-                if atm.sig_U[1,1] is not None:
-                    anrow["U[2][2]_esd"] = atm.sig_U[1,1]
-                if atm.sig_U[2,2] is not None:
-                    anrow["U[3][3]_esd"] = atm.sig_U[2,2]
-                if atm.sig_U[0,1] is not None:
-                    anrow["U[1][2]_esd"] = atm.sig_U[0,1]
-                if atm.sig_U[0,2] is not None:
-                    anrow["U[1][3]_esd"] = atm.sig_U[0,2]
-                if atm.sig_U[1,2] is not None:
-                    anrow["U[2][3]_esd"] = atm.sig_U[1,2]
-
+        atoms = []
+        for atom in self.iter_atom_site_atoms():
+            if aniso and atom[1].U is None:
+                continue
+            atoms.append(atom)
+            if len(atoms) == nrows:
+                yield atoms
+                atoms = []
+        if atoms:
+            yield atoms
+
+    def atom_site_columns(self, atoms):
+        """Returns the atom_site columns of the atoms of
+        iter_atom_site_atoms(), as a dictionary of lower case column names
+        and the lists of their values, None for no value.
+        """
+        atm_list = [atom[1] for atom in atoms]
+        columns = {}
+
+        group_pdb     = columns["group_pdb"]     = [None] * len(atoms)
+        label_asym_id = columns["label_asym_id"] = [None] * len(atoms)
+        for i, (atom_id, atm, entity_desc, label_seq_id) in enumerate(atoms):
+            if entity_desc["polymer"]==True:
+                group_pdb[i]     = "ATOM"
+                label_asym_id[i] = atm.chain_id
+            else:
+                group_pdb[i] = "HETATM"
+
+        columns["id"]              = [atom[0] for atom in atoms]
+        columns["label_entity_id"] = [atom[2]["id"] for atom in atoms]
+        columns["label_seq_id"]    = [atom[3] for atom in atoms]
+
+        columns["label_atom_id"] = columns["auth_atom_id"] = [
+            atm.name for atm in atm_list]
+        columns["label_alt_id"] = columns["auth_alt_id"] = [
+            atm.alt_loc for atm in atm_list]
+        columns["label_comp_id"] = columns["auth_comp_id"] = [
+            atm.res_name for atm in atm_list]
+        columns["auth_seq_id"]  = [atm.fragment_id for atm in atm_list]
+        columns["auth_asym_id"] = [atm.chain_id for atm in atm_list]
+
+        columns["type_symbol"]        = [atm.element for atm in atm_list]
+        columns["pdbx_pdb_model_num"] = [atm.model_id for atm in atm_list]
+
+        columns["occupancy"]          = [atm.occupancy for atm in atm_list]
+        columns["b_iso_or_equiv"]     = [atm.temp_factor for atm in atm_list]
+        columns["occupancy_esd"]      = [atm.sig_occupancy for atm in atm_list]
+        columns["b_iso_or_equiv_esd"] = [atm.sig_temp_factor for atm in atm_list]
+
+        positions = [atm.position for atm in atm_list]
+        sig_positions = [atm.sig_position for atm in atm_list]
+        for i, x in enumerate(("x", "y", "z")):
+            columns["cartn_" + x]          = item_column(positions, i)
+            columns["cartn_" + x + "_esd"] = item_column(sig_positions, i)
+
+        return columns
+
+    def atom_site_anisotrop_columns(self, atoms):
+        """Returns the atom_site_anisotrop columns of the atoms of
+        iter_atom_site_atoms() with a U tensor, see atom_site_columns().
+        """
+        atm_list = [atom[1] for atom in atoms]
+        columns = {}
+
+        columns["id"]                = [atom[0] for atom in atoms]
+        columns["type_symbol"]       = [atm.element for atm in atm_list]
+        columns["label_entity_id"]   = [atom[2]["id"] for atom in atoms]
+        columns["pdbx_auth_seq_id"]  = [atm.fragment_id for atm in atm_list]
+        columns["pdbx_auth_comp_id"] = [atm.res_name for atm in atm_list]
+        columns["pdbx_auth_asym_id"] = [atm.chain_id for atm in atm_list]
+        columns["pdbx_auth_atom_id"] = [atm.name for atm in atm_list]
+        columns["pdbx_auth_alt_id"]  = [atm.alt_loc for atm in atm_list]
+
+        Us = [atm.U for atm in atm_list]
+        sig_Us = [atm.sig_U for atm in atm_list]
+        for i, j in ((0, 0), (1, 1), (2, 2), (0, 1), (0, 2), (1, 2)):
+            column = "u[%d][%d]" % (i + 1, j + 1)
+            columns[column]          = item_column(Us, (i, j))
+            columns[column + "_esd"] = item_column(sig_Us, (i, j))
+
+        return columns
@@ -6,10 +6,13 @@
  * pdbmodule.c - PDB parser/accelorator for mmLib
  *
  */
+#define PY_SSIZE_T_CLEAN
 #include "Python.h"
 #include <stdio.h>
+#include <ctype.h>
 
 #define MAX_LINE 82
+#define MAX_FIELD 128
 
 static PyObject *PDBModuleErr = NULL;
 
@@ -891,12 +894,200 @@ pdb_read(PyObject *self, PyObject *args)
   return py_pdb_list;
 }
 
+/* field conversion codes used by read_record(); these must match the
+ * PDB_CODEC_* constants in mmLib/PDB.py
+ */
+#define PDB_CODEC_STRIP   0
+#define PDB_CODEC_LSTRIP  1
+#define PDB_CODEC_RSTRIP  2
+#define PDB_CODEC_INTEGER 3
+#define PDB_CODEC_FLOAT   4
+
+/* convert one fixed column field of a PDB line the same way
+ * PDBRecord.read() does; returns a new reference, or NULL with no
+ * exception set if the field is blank or does not convert
+ */
+static PyObject *
+pdb_convert_field(const char *s, Py_ssize_t n, int codec)
+{
+  Py_ssize_t  i;
+  Py_ssize_t  j;
+  char        field[MAX_FIELD];
+  char       *end;
+  PyObject   *py_strx;
+  PyObject   *py_valx;
+
+  /* ignore blank fields */
+  for (i = 0; i < n && isspace(Py_CHARMASK(s[i])); i++)
+    ;
+  if (i == n) {
+    return NULL;
+  }
+
+  for (j = n; j > i && isspace(Py_CHARMASK(s[j-1])); j--)
+    ;
+
+  switch (codec) {
+
+  case PDB_CODEC_STRIP:
+    return PyString_FromStringAndSize(&s[i], j - i);
+
+  case PDB_CODEC_LSTRIP:
+    return PyString_FromStringAndSize(&s[i], n - i);
+
+  case PDB_CODEC_RSTRIP:
+    return PyString_FromStringAndSize(s, j);
+
+  case PDB_CODEC_INTEGER:
+    if (n < MAX_FIELD) {
+      memcpy(field, s, n);
+      field[n] = '\0';
+      py_valx = PyInt_FromString(field, &end, 10);
+    } else {
+      py_strx = PyString_FromStringAndSize(s, n);
+      if (py_strx == NULL) {
+	return NULL;
+      }
+      py_valx = PyInt_FromString(PyString_AS_STRING(py_strx), &end, 10);
+      Py_DECREF(py_strx);
+    }
+    break;
+
+  case PDB_CODEC_FLOAT:
+    py_strx = PyString_FromStringAndSize(s, n);
+    if (py_strx == NULL) {
+      return NULL;
+    }
+    py_valx = PyFloat_FromString(py_strx, NULL);
+    Py_DECREF(py_strx);
+    break;
+
+  default:
+    PyErr_SetString(PDBModuleErr, "invalid field codec");
+    return NULL;
+  }
+
+  if (py_valx == NULL && PyErr_ExceptionMatches(PyExc_ValueError)) {
+    PyErr_Clear();
+  }
+  return py_valx;
+}
+
+static PyObject *
+pdb_read_record(PyObject *self, PyObject *args)
+{
+  const char *line;
+  Py_ssize_t  len;
+  Py_ssize_t  n;
+  Py_ssize_t  i;
+  Py_ssize_t  nfields;
+  Py_ssize_t  istart;
+  Py_ssize_t  iend;
+  long        codec;
+  char        rec_name[7];
+  PyObject   *py_codec_map;
+  PyObject   *py_codec;
+  PyObject   *py_rec_class;
+  PyObject   *py_fields;
+  PyObject   *py_field;
+  PyObject   *py_rec;
+  PyObject   *py_valx;
+
+  if (!PyArg_ParseTuple(args, "s#O!", &line, &len, &PyDict_Type, &py_codec_map))
+    return NULL;
+
+  /* strip right hand whitespace */
+  while (len > 0 && isspace(Py_CHARMASK(line[len-1]))) {
+    len--;
+  }
+
+  /* record name is the first 6 columns, padded with spaces */
+  n = len < 6 ? len : 6;
+  memset(rec_name, ' ', 6);
+  memcpy(rec_name, line, n);
+  rec_name[6] = '\0';
+
+  py_codec = PyDict_GetItemString(py_codec_map, rec_name);
+  if (py_codec == NULL) {
+    Py_INCREF(Py_None);
+    return Py_None;
+  }
+
+  if (!PyTuple_Check(py_codec) || PyTuple_GET_SIZE(py_codec) != 2) {
+    PyErr_SetString(PDBModuleErr, "codec must be a (class, fields) tuple");
+    return NULL;
+  }
+  py_rec_class = PyTuple_GET_ITEM(py_codec, 0);
+  py_fields    = PyTuple_GET_ITEM(py_codec, 1);
+
+  py_rec = PyObject_CallObject(py_rec_class, NULL);
+  if (py_rec == NULL) {
+    return NULL;
+  }
+  if (!PyDict_Check(py_rec)) {
+    Py_DECREF(py_rec);
+    PyErr_SetString(PDBModuleErr, "record class must subclass dict");
+    return NULL;
+  }
+
+  if (!PyTuple_Check(py_fields)) {
+    Py_DECREF(py_rec);
+    PyErr_SetString(PDBModuleErr, "codec fields must be a tuple");
+    return NULL;
+  }
+
+  nfields = PyTuple_GET_SIZE(py_fields);
+  for (i = 0; i < nfields; i++) {
+    py_field = PyTuple_GET_ITEM(py_fields, i);
+    if (!PyTuple_Check(py_field) || PyTuple_GET_SIZE(py_field) != 4) {
+      Py_DECREF(py_rec);
+      PyErr_SetString(PDBModuleErr, "codec field must be a 4-tuple");
+      return NULL;
+    }
+
+    istart = PyInt_AsSsize_t(PyTuple_GET_ITEM(py_field, 1)) - 1;
+    iend   = PyInt_AsSsize_t(PyTuple_GET_ITEM(py_field, 2));
+    codec  = PyInt_AsLong(PyTuple_GET_ITEM(py_field, 3));
+
+    /* same bounds as the Python slice line[start-1:end] */
+    if (iend > len) {
+      iend = len;
+    }
+    if (istart >= iend) {
+      continue;
+    }
+
+    py_valx = pdb_convert_field(&line[istart], iend - istart, (int) codec);
+    if (py_valx == NULL) {
+      if (PyErr_Occurred()) {
+	Py_DECREF(py_rec);
+	return NULL;
+      }
+      continue;
+    }
+
+    if (PyDict_SetItem(py_rec, PyTuple_GET_ITEM(py_field, 0), py_valx) < 0) {
+      Py_DECREF(py_valx);
+      Py_DECREF(py_rec);
+      return NULL;
+    }
+    Py_DECREF(py_valx);
+  }
+
+  return py_rec;
+}
+
 
 static PyMethodDef PDBModuleMethods[] = {
   {"read",
    pdb_read,
    METH_VARARGS,
    "Reads a PDB file and returns a list."},
+
+  {"read_record",
+   pdb_read_record,
+   METH_VARARGS,
+   "Converts one PDB line to a record using a mmLib.PDB codec map."},
   
   {NULL, NULL, 0, NULL}
 };
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Measures the time to load a synthetic ultra-high resolution structure
+in which most residues, hydrogens included, have A/B alternate
+conformations, and checks the alt_loc bookkeeping of every Fragment
+against a rebuild by Fragment.set_default_alt_loc(). So is the time to
+add the Atoms of a large ligand whose B conformers come before its A
+conformers, each of which is placed among the Atoms already selected.
+"""
+
+## Python
+import sys
+import time
+import StringIO
+
+## pymmlib
+from mmLib import ConsoleOutput, FileIO, Structure
+from test_util import synthetic_pdb_file, print_stat
+
+
+## lysine heavy atoms and riding hydrogens, as refined at 0.8 Angstrom
+LYS_ATOMS = [
+    ("N", "N"), ("CA", "C"), ("C", "C"), ("O", "O"), ("CB", "C"),
+    ("CG", "C"), ("CD", "C"), ("CE", "C"), ("NZ", "N"), ("H", "H"),
+    ("HA", "H"), ("HB2", "H"), ("HB3", "H"), ("HG2", "H"), ("HG3", "H"),
+    ("HD2", "H"), ("HD3", "H"), ("HE2", "H"), ("HE3", "H"), ("HZ1", "H"),
+    ("HZ2", "H"), ("HZ3", "H")]
+
+## every residue with a number divisible by ORDERED_EVERY is ordered, and
+## every one divisible by TRIPLE_EVERY has a third conformer
+ORDERED_EVERY = 10
+TRIPLE_EVERY = 7
+
+## atoms of the ligand with its B conformer before its A conformer
+LIGAND_ATOMS = 4000
+
+
+def lys_alt_locs(res_seq):
+    """Returns the (alt_loc, occupancy) conformers of residue res_seq.
+    """
+    if res_seq % ORDERED_EVERY == 0:
+        return [("", 1.0)]
+    elif res_seq % TRIPLE_EVERY == 0:
+        return [("A", 0.4), ("B", 0.3), ("C", 0.3)]
+    return [("A", 0.6), ("B", 0.4)]
+
+
+def check_fragment(frag):
+    """Checks the atom_list and atom_dict built while the Atoms were
+    added match a rebuild from atom_order_list.
+    """
+    atom_list = list(frag.atom_list)
+    atom_dict = dict(frag.atom_dict)
+    frag.set_default_alt_loc(frag.default_alt_loc)
+    assert frag.atom_list == atom_list
+    assert frag.atom_dict == atom_dict
+
+
+def ligand_atom(i, alt_loc):
+    return Structure.Atom(
+        name = "X%d" % (i), alt_loc = alt_loc, res_name = "LIG",
+        fragment_id = "1", chain_id = "A")
+
+
+def add_ligand(num_atoms):
+    """Adds the Atoms of a ligand of num_atoms atoms, B conformers first,
+    to a Fragment, checks it, and returns the time to add them.
+    """
+    frag = Structure.Fragment(chain_id = "A", fragment_id = "1", res_name = "LIG")
+    atoms = [ligand_atom(i, alt_loc)
+             for alt_loc in ("B", "A") for i in xrange(num_atoms)]
+
+    time1 = time.time()
+    for atom in atoms:
+        frag.add_atom(atom)
+    time2 = time.time()
+
+    check_fragment(frag)
+    assert [atm.name for atm in frag.atom_list] == \
+           ["X%d" % (i) for i in xrange(num_atoms)]
+    assert [atm.alt_loc for atm in frag.atom_list] == ["A"] * num_atoms
+
+    ## Atoms added after set_default_alt_loc() changed atom_list
+    frag.set_default_alt_loc("C")
+    for i in xrange(1, num_atoms, 2):
+        frag.add_atom(ligand_atom(i, "C"))
+    check_fragment(frag)
+    assert [atm.name for atm in frag.atom_list] == \
+           ["X%d" % (i) for i in xrange(1, num_atoms, 2)]
+
+    return time2 - time1
+
+
+def main(num_res):
+    data = synthetic_pdb_file(
+        ["A"], num_res, res_name = "LYS", atoms = LYS_ATOMS,
+        alt_locs = lys_alt_locs)
+
+    ## the monomer library has no hydrogens, so do not warn about each one
+    ConsoleOutput.disable()
+
+    time1 = time.time()
+    struct = FileIO.LoadStructure(
+        fil = StringIO.StringIO(data), format = "PDB")
+    time2 = time.time()
+
+    num_atoms = 0
+    for frag in struct.iter_fragments():
+        check_fragment(frag)
+        num_atoms += len(list(frag.iter_all_atoms()))
+
+    ligand_time = add_ligand(LIGAND_ATOMS)
+
+    print_stat("Residues", num_res)
+    print_stat("Atoms", num_atoms)
+    print_stat("Load Time (sec)", "%.3f" % (time2 - time1))
+    print_stat("Ligand Time (sec)", "%.3f, %d atoms" % (ligand_time, LIGAND_ATOMS))
+
+
+if __name__ == "__main__":
+    try:
+        num_res = int(sys.argv[1])
+    except IndexError:
+        num_res = 2000
+    except ValueError:
+        print "usage: altloc_bench.py [num_res]"
+        sys.exit(1)
+
+    main(num_res)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Measures the resident memory per atom of a ribosome-sized synthetic
+structure and checks the size of the Atom objects against the per-atom
+byte budget documented in Structure.Atom.
+"""
+
+## Python
+import os
+import gc
+import sys
+import time
+import string
+import StringIO
+
+## pymmlib
+from mmLib import FileIO, Structure
+from test_util import ALA_ATOMS, synthetic_pdb_file, print_stat
+
+
+## chain IDs of the synthetic structure
+CHAIN_IDS = string.uppercase + string.lowercase + string.digits
+
+## bytes of the Atom object itself and its position vector and U tensor
+## views, see the Structure.Atom docstring
+ATOM_BYTE_BUDGET = 600
+
+
+def rss_bytes():
+    """Returns the current resident set size of this process, or None if
+    /proc is not available.
+    """
+    try:
+        statm = open("/proc/self/statm").read().split()
+    except IOError:
+        return None
+    return int(statm[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def atom_bytes(atom):
+    """Returns the bytes used by the Atom object, its instance dictionary
+    if it has one, and its position and U arrays. Its Bonds are stored in
+    a Structure.BondTable shared by the bonded Atoms.
+    """
+    nbytes = sys.getsizeof(atom)
+
+    ## reading atom.__dict__ would create it, so look for it among the
+    ## objects the atom refers to
+    for obj in gc.get_referents(atom):
+        if type(obj) is dict:
+            nbytes += sys.getsizeof(obj)
+
+    for array in (atom.position, atom.U):
+        if array is not None:
+            nbytes += sys.getsizeof(array)
+            if array.base is None:
+                nbytes += array.nbytes
+    return nbytes
+
+
+def main(num_chains, num_res):
+    data = synthetic_pdb_file(CHAIN_IDS[:num_chains], num_res, anisou = True)
+    num_atoms = num_chains * num_res * len(ALA_ATOMS)
+
+    gc.collect()
+    rss1 = rss_bytes()
+    time1 = time.time()
+    struct = FileIO.LoadStructure(
+        fil = StringIO.StringIO(data), format = "PDB")
+    time2 = time.time()
+    del data
+    gc.collect()
+    rss2 = rss_bytes()
+
+    assert struct.count_atoms() == num_atoms
+
+    atom = struct.iter_atoms().next()
+    nbytes = atom_bytes(atom)
+
+    print_stat("Atoms", num_atoms)
+    print_stat("Load Time (sec)", "%.3f" % (time2 - time1))
+    if rss1 is not None:
+        print_stat("RSS Bytes/Atom", (rss2 - rss1) / num_atoms)
+    print_stat("Atom Object Bytes", "%d (budget %d)" % (nbytes, ATOM_BYTE_BUDGET))
+
+    assert nbytes <= ATOM_BYTE_BUDGET
+
+
+if __name__ == "__main__":
+    try:
+        num_chains = int(sys.argv[1])
+        num_res = int(sys.argv[2])
+    except IndexError:
+        num_chains, num_res = 50, 600
+    except ValueError:
+        print "usage: atom_memory_bench.py [num_chains num_res]"
+        sys.exit(1)
+
+    if num_chains > len(CHAIN_IDS):
+        print "at most %d chains" % (len(CHAIN_IDS))
+        sys.exit(1)
+
+    main(num_chains, num_res)
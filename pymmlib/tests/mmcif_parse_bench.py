@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Times the mmCIF parser on a ribosome-sized synthetic atom_site table,
+loaded into mmCIFRow dictionaries, into mmCIFColumnTable columns, and
+lazily; the lookups of its atoms through the hash indexes of the columns;
+and the mmCIF writer on both tables and on a mmCIFStreamTable made from
+the columns a chunk at a time. The results are checked by mmcif_test.py.
+"""
+
+## Python
+import sys
+import time
+import StringIO
+
+## pymmlib
+from mmLib import mmCIF
+from test_util import ATOM_SITE_COLUMNS, NUC_ATOMS, synthetic_cif_file, print_stat
+
+
+def nuc_cif_file(num_chains, num_res):
+    """Returns a mmCIF file as a string with num_chains chains of num_res
+    nucleotides in its atom_site table.
+    """
+    return synthetic_cif_file(
+        "BENCH", ["C%d" % (i) for i in xrange(num_chains)], num_res,
+        res_name = "U", atoms = NUC_ATOMS)
+
+
+def load_atom_site(data, columnar):
+    """Loads the mmCIF file data, and returns its atom_site table and the
+    load time.
+    """
+    time1 = time.time()
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(StringIO.StringIO(data), columnar)
+    time2 = time.time()
+    return cif_file["BENCH"]["atom_site"], time2 - time1
+
+
+def load_lazy(data):
+    """Loads the mmCIF file data lazily, and returns the time of the index
+    scan and of the parse of the small struct table.
+    """
+    time1 = time.time()
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(StringIO.StringIO(data), lazy = True)
+    time2 = time.time()
+    cif_file["BENCH"]["struct"]
+    time3 = time.time()
+    return time2 - time1, time3 - time2
+
+
+def save_cif_file(cif_file):
+    """Returns the time to write cif_file.
+    """
+    fil = StringIO.StringIO()
+    time1 = time.time()
+    cif_file.save_file(fil)
+    return time.time() - time1
+
+
+def stream_cif_file(col_table):
+    """Returns a mmCIFFile with a mmCIFStreamTable of the atom_site rows of
+    the mmCIFColumnTable col_table.
+    """
+    cif_file = mmCIF.mmCIFFile()
+    cif_data = mmCIF.mmCIFData("BENCH")
+    cif_file.append(cif_data)
+    cif_data.append(mmCIF.mmCIFStreamTable(
+        "atom_site", ATOM_SITE_COLUMNS, len(col_table),
+        col_table.iter_column_chunks))
+    return cif_file
+
+
+def main(num_chains, num_res):
+    data = nuc_cif_file(num_chains, num_res)
+    num_atoms = num_chains * num_res * len(NUC_ATOMS)
+
+    row_table, row_time = load_atom_site(data, False)
+    col_table, col_time = load_atom_site(data, True)
+    scan_time, struct_time = load_lazy(data)
+
+    ## the first search for the last atom scans the table, the next one
+    ## builds the hash index of the columns which finds the atoms of every
+    ## residue
+    args = (("label_asym_id", "C%d" % (num_chains - 1)),
+            ("label_seq_id", str(num_res)), ("label_atom_id", "N1"))
+    time1 = time.time()
+    row_table.get_row(*args)
+    time2 = time.time()
+    col_table.get_row(*args)
+    time3 = time.time()
+
+    lookup_times = []
+    for cif_table in (row_table, col_table):
+        time4 = time.time()
+        for chain_index in xrange(num_chains):
+            for res_seq in xrange(1, num_res + 1):
+                cif_table.get_row(
+                    ("label_asym_id", "C%d" % (chain_index)),
+                    ("label_seq_id", str(res_seq)), ("label_atom_id", "N1"))
+        lookup_times.append(time.time() - time4)
+
+    row_write_time = save_cif_file(row_table.data.file)
+    col_write_time = save_cif_file(col_table.data.file)
+    stream_write_time = save_cif_file(stream_cif_file(col_table))
+
+    print_stat("Atoms", num_atoms)
+    print_stat("Parse Time (sec)", "%.3f rows, %.3f columns" % (row_time, col_time))
+    print_stat("Lazy Time (sec)", "%.3f scan, %.4f struct table" % (
+        scan_time, struct_time))
+    print_stat("Search Time (sec)", "%.3f rows, %.3f columns" % (
+        time2 - time1, time3 - time2))
+    print_stat("Lookup Time (sec)", "%.3f rows, %.3f columns, %d lookups" % (
+        lookup_times[0], lookup_times[1], num_chains * num_res))
+    print_stat("Write Time (sec)", "%.3f rows, %.3f columns, %.3f stream" % (
+        row_write_time, col_write_time, stream_write_time))
+
+
+if __name__ == "__main__":
+    try:
+        num_chains = int(sys.argv[1])
+        num_res = int(sys.argv[2])
+    except IndexError:
+        num_chains, num_res = 50, 1000
+    except ValueError:
+        print "usage: mmcif_parse_bench.py [num_chains num_res]"
+        sys.exit(1)
+
+    main(num_chains, num_res)
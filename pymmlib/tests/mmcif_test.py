@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""This program tests the mmLib.mmCIF tables on a synthetic atom_site
+table. The file is loaded into mmCIFRow dictionaries, into
+mmCIFColumnTable columns, and lazily, which must all give the same rows,
+with the unquoted "." values left out of them. The rows are looked up
+through the hash indexes of their columns, which must stay right as the
+rows of a small table are changed through every list and dict method,
+and a small mmCIFColumnTable must give the same results as a mmCIFTable
+for each of them. A mmCIFStreamTable made from the columns a chunk at a
+time must read the same, and refuse every change. The tables are written
+back out by the mmCIF writer, which must give the same file for each.
+"""
+
+## Python
+import copy
+import cPickle
+import StringIO
+
+## pymmlib
+from mmLib import mmCIF
+from test_util import ATOM_SITE_COLUMNS, NUC_ATOMS, synthetic_cif_file
+
+
+## size of the synthetic atom_site table
+NUM_CHAINS = 3
+NUM_RES = 20
+NUM_ATOMS = NUM_CHAINS * NUM_RES * len(NUC_ATOMS)
+
+
+def nuc_cif_file():
+    return synthetic_cif_file(
+        "TEST", ["C%d" % (i) for i in xrange(NUM_CHAINS)], NUM_RES,
+        res_name = "U", atoms = NUC_ATOMS)
+
+
+def load_atom_site(data, columnar):
+    """Loads the mmCIF file data, checks its atom_site table, and returns
+    it.
+    """
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(StringIO.StringIO(data), columnar)
+
+    cif_data = cif_file["TEST"]
+    assert cif_data["struct"]["title"] == "synthetic structure\n of the test programs"
+
+    atom_site = cif_data["atom_site"]
+    assert len(atom_site) == NUM_ATOMS
+    assert atom_site.columns == ATOM_SITE_COLUMNS
+    assert isinstance(atom_site, mmCIF.mmCIFColumnTable) == columnar
+
+    for cif_row in (atom_site[0], atom_site[1], atom_site[-1]):
+        assert cif_row.table is atom_site
+        assert not cif_row.has_key("label_alt_id")
+        assert not cif_row.has_key("pdbx_formal_charge")
+        assert cif_row["pdbx_PDB_ins_code"] == "?"
+        assert cif_row["pdbx_PDB_model_num"] == "1"
+
+    assert atom_site[1]["label_atom_id"] == "O5'"
+    assert atom_site[-1]["id"] == str(NUM_ATOMS)
+    return atom_site
+
+
+def load_test(data):
+    """Checks the rows of the mmCIFTable, mmCIFColumnTable and lazy loads of
+    the file data, and returns the first two.
+    """
+    row_table = load_atom_site(data, False)
+    col_table = load_atom_site(data, True)
+    for i in (0, 1, NUM_ATOMS // 2, -1):
+        assert sorted(row_table[i].items()) == sorted(col_table[i].items())
+
+    ## a lazy load only indexes the file, and parses each table on use
+    cif_file = mmCIF.mmCIFFile()
+    cif_file.load_file(StringIO.StringIO(data), lazy = True)
+    cif_data = cif_file["TEST"]
+    assert cif_data["struct"]["title"] == "synthetic structure\n of the test programs"
+    assert [cif_table.name for cif_table in cif_data] == ["entry", "struct", "atom_site"]
+    atom_site = cif_data["atom_site"]
+    assert len(atom_site) == NUM_ATOMS
+    for i in (0, 1, NUM_ATOMS // 2, -1):
+        assert sorted(atom_site[i].items()) == sorted(row_table[i].items())
+
+    return row_table, col_table
+
+
+def get_row_test(cif_table):
+    """Checks the atoms of the atom_site table found by get_row(), which
+    scans the table on the first search of its columns and builds their
+    hash index on the next, and the upkeep of the index as rows are
+    changed and appended.
+    """
+    args = (("label_asym_id", "C%d" % (NUM_CHAINS - 1)),
+            ("label_seq_id", str(NUM_RES)), ("label_atom_id", "N1"))
+    assert cif_table.get_row(*args)["id"] == str(NUM_ATOMS)
+
+    serial = 0
+    for chain_index in xrange(NUM_CHAINS):
+        for res_seq in xrange(1, NUM_RES + 1):
+            serial += len(NUC_ATOMS)
+            cif_row = cif_table.get_row(
+                ("label_asym_id", "C%d" % (chain_index)),
+                ("label_seq_id", str(res_seq)), ("label_atom_id", "N1"))
+            assert cif_row["id"] == str(serial)
+            assert cif_table.get_row1("id", str(serial)) == cif_row
+    assert cif_table.get_row(("label_atom_id", "N9")) is None
+
+    cif_row = cif_table[-1]
+    cif_row["label_atom_id"] = "N3"
+    assert cif_table.get_row(*args) is None
+    cif_row = cif_table.new_row()
+    cif_row["label_asym_id"], cif_row["label_seq_id"] = args[0][1], args[1][1]
+    cif_row["label_atom_id"] = "N1"
+    assert cif_table.get_row(*args) == cif_table[NUM_ATOMS]
+
+    ## put the table back as it was loaded
+    del cif_table[-1]
+    cif_table[-1]["label_atom_id"] = "N1"
+    assert cif_table.get_row(*args)["id"] == str(NUM_ATOMS)
+
+
+def check_lookups(cif_table):
+    """Checks the rows found by get_row() and iter_rows() for each value
+    of columns a and b against a scan of the rows, searching each twice
+    so the hash indexes are built and used by the next check.
+    """
+    values = [None, "0", "1", "2", "9", "x"]
+    for i in xrange(2):
+        for a in values:
+            rows = [row for row in cif_table if row.get("a") == a]
+            assert list(cif_table.iter_rows(("a", a))) == rows
+            if rows:
+                assert cif_table.get_row(("a", a)) == rows[0]
+            else:
+                assert cif_table.get_row(("a", a)) is None
+            for b in values:
+                rows = [row for row in cif_table
+                        if row.get("a") == a and row.get("b") == b]
+                assert list(cif_table.iter_rows(("a", a), ("b", b))) == rows
+
+
+def row_index_test(new_table):
+    """Checks the lookups of a table made by new_table() after each list
+    and dict method which changes the table or its rows.
+    """
+    def new_row(a, b):
+        return mmCIF.mmCIFRow([("a", a), ("b", b)])
+
+    cif_table = new_table()
+    for i in xrange(12):
+        cif_table.append(new_row(str(i % 3), str(i % 2)))
+    check_lookups(cif_table)
+
+    table_changes = [
+        lambda t: t.pop(),
+        lambda t: t.pop(0),
+        lambda t: t.__delitem__(1),
+        lambda t: t.__delslice__(0, 2),
+        lambda t: t.__delitem__(slice(0, 4, 2)),
+        lambda t: t.__iadd__([new_row("9", "1")]),
+        lambda t: t.__setslice__(0, 1, [new_row("x", "0")]),
+        lambda t: t.__setitem__(slice(1, 3), [new_row("x", "1")]),
+        lambda t: t.__setitem__(-1, new_row("2", "x")),
+        lambda t: t.insert(0, new_row("9", "9")),
+        lambda t: t.extend([new_row("0", "x"), new_row("1", "1")]),
+        lambda t: t.remove(t[2]),
+        lambda t: t.sort(key = lambda row: row.get("b")),
+        lambda t: t.reverse()]
+
+    row_changes = [
+        lambda row: row.__setitem__("a", "9"),
+        lambda row: row.__delitem__("b"),
+        lambda row: row.update({"a": "x"}),
+        lambda row: row.update(b = "9"),
+        lambda row: row.setdefault("b", "2"),
+        lambda row: row.pop("a"),
+        lambda row: row.popitem(),
+        lambda row: row.clear()]
+
+    for change in table_changes:
+        change(cif_table)
+        check_lookups(cif_table)
+
+    for change in row_changes:
+        change(cif_table[len(cif_table) // 2])
+        check_lookups(cif_table)
+        change(cif_table[-1])
+        check_lookups(cif_table)
+
+    try:
+        cif_table *= 2
+    except mmCIF.mmCIFError:
+        pass
+    else:
+        raise AssertionError("mmCIFTable rows repeated")
+
+
+def row_values(value):
+    """Returns value with the rows in it replaced by the sorted lists of
+    their items, so the rows of tables of different types compare equal.
+    """
+    if hasattr(value, "iteritems"):
+        return sorted(value.iteritems())
+    if isinstance(value, (list, tuple)):
+        return [row_values(x) for x in value]
+    return value
+
+
+def list_methods_test():
+    """Checks that a mmCIFColumnTable and its rows give the same results as
+    a mmCIFTable and its rows for every list and dict method.
+    """
+    def new_row(a, b):
+        return mmCIF.mmCIFRow([("a", a), ("b", b)])
+
+    def keywords(**kwargs):
+        return kwargs
+
+    def pickled(value):
+        return cPickle.loads(cPickle.dumps(value, 2))
+
+    table_methods = [
+        lambda t: len(t),
+        lambda t: t[1],
+        lambda t: t[-1],
+        lambda t: t[1:3],
+        lambda t: t[-2:],
+        lambda t: t[::2],
+        lambda t: t["a"],
+        lambda t: repr(t),
+        lambda t: list(t),
+        lambda t: list(reversed(t)),
+        lambda t: sorted(t),
+        lambda t: t[1] in t,
+        lambda t: new_row("0", "0") in t,
+        lambda t: t.count(t[1]),
+        lambda t: t.count(new_row("0", "0")),
+        lambda t: t.index(t[2]),
+        lambda t: t.index(t[2], 1, 3),
+        lambda t: t.index(t[0], 1),
+        lambda t: t + [new_row("9", "9")],
+        lambda t: [new_row("9", "9")] + t,
+        lambda t: t * 2,
+        lambda t: 2 * t,
+        lambda t: t < [],
+        lambda t: t >= list(t),
+        lambda t: t == t,
+        lambda t: t != t,
+        lambda t: pickled(t),
+        lambda t: copy.copy(t),
+        lambda t: copy.deepcopy(t),
+        lambda t: t.append(new_row("9", "0")),
+        lambda t: t.insert(1, new_row("8", "0")),
+        lambda t: t.extend([new_row("7", "0"), new_row("6", "1")]),
+        lambda t: t.__iadd__([new_row("5", "1")]),
+        lambda t: t.__setitem__(0, new_row("4", "1")),
+        lambda t: t.__setitem__(0, t[0]),
+        lambda t: t.__setslice__(1, 2, [new_row("3", "2"), new_row("3", "3")]),
+        lambda t: t.__setitem__(slice(0, 4, 2), [new_row("2", "4"), t[2]]),
+        lambda t: t.__setitem__(slice(0, 4, 2), [new_row("2", "4")]),
+        lambda t: t.__delitem__(0),
+        lambda t: t.__delslice__(0, 1),
+        lambda t: t.__delitem__(slice(0, 5, 2)),
+        lambda t: t.pop(),
+        lambda t: t.pop(0),
+        lambda t: t.remove(t[1]),
+        lambda t: t.remove(new_row("0", "0")),
+        lambda t: t.sort(),
+        lambda t: t.sort(key = lambda row: row.get("b")),
+        lambda t: t.sort(reverse = True),
+        lambda t: t.reverse(),
+        lambda t: t.__imul__(2)]
+
+    row_methods = [
+        lambda row: len(row),
+        lambda row: sorted(row),
+        lambda row: "A" in row,
+        lambda row: row["A"],
+        lambda row: row.a,
+        lambda row: row.get("c", "-"),
+        lambda row: row.has_key("b"),
+        lambda row: sorted(row.items()),
+        lambda row: sorted(row.keys()),
+        lambda row: sorted(row.values()),
+        lambda row: row.copy(),
+        lambda row: dict(row),
+        lambda row: keywords(**row),
+        lambda row: repr(row),
+        lambda row: row == row,
+        lambda row: row != row,
+        lambda row: row < {"a": "x"},
+        lambda row: pickled(row),
+        lambda row: row.__setitem__("C", "1"),
+        lambda row: row.__delitem__("c"),
+        lambda row: row.update({"a": "x"}, b = "y"),
+        lambda row: row.setdefault("c", "2"),
+        lambda row: row.pop("c"),
+        lambda row: row.pop("c", "-"),
+        lambda row: row.popitem(),
+        lambda row: row.clear(),
+        lambda row: row.popitem()]
+
+    def call(method, value):
+        try:
+            return row_values(method(value))
+        except Exception, err:
+            return err.__class__
+
+    tables = [mmCIF.mmCIFTable("rows"), mmCIF.mmCIFColumnTable("columns")]
+    for cif_table in tables:
+        for i in xrange(6):
+            cif_table.append(new_row(str(i % 3), str(i)))
+
+    for method in table_methods:
+        results = [call(method, cif_table) for cif_table in tables]
+        assert results[0] == results[1], results
+        assert row_values(tables[0]) == row_values(tables[1])
+
+    for method in row_methods:
+        results = [call(method, cif_table[-1]) for cif_table in tables]
+        assert results[0] == results[1], results
+        assert row_values(tables[0]) == row_values(tables[1])
+
+
+def stream_table_test():
+    """Checks the rows of a mmCIFStreamTable are read as those of the
+    mmCIFColumnTable it is made from, through the chunks it makes, and
+    that every list method which would change it raises mmCIFError.
+    """
+    def new_row(a, b):
+        return mmCIF.mmCIFRow([("a", a), ("b", b)])
+
+    col_table = mmCIF.mmCIFColumnTable("columns", ["a", "b"])
+    for i in xrange(7):
+        col_table.append(new_row(str(i % 3), str(i)))
+    stream_table = mmCIF.mmCIFStreamTable(
+        "stream", ["a", "b"], len(col_table),
+        lambda clowers, nrows: col_table.iter_column_chunks(clowers, 2))
+
+    table_methods = [
+        lambda t: len(t),
+        lambda t: t[1],
+        lambda t: t[-1],
+        lambda t: t[1:3],
+        lambda t: t[-2:],
+        lambda t: t[5:1],
+        lambda t: t[::2],
+        lambda t: t[::-3],
+        lambda t: t[1:6:2],
+        lambda t: t["a"],
+        lambda t: list(t),
+        lambda t: list(reversed(t)),
+        lambda t: t + [new_row("9", "9")],
+        lambda t: 2 * t]
+    for method in table_methods:
+        assert row_values(method(stream_table)) == row_values(method(col_table))
+
+    assert repr(stream_table) == repr(col_table)
+    assert stream_table[1] not in stream_table
+    assert stream_table.count(stream_table[1]) == 0
+
+    table_changes = [
+        lambda t: t.append(new_row("9", "0")),
+        lambda t: t.insert(1, new_row("8", "0")),
+        lambda t: t.extend([new_row("7", "0")]),
+        lambda t: t.extend([]),
+        lambda t: t.__iadd__([new_row("5", "1")]),
+        lambda t: t.__imul__(2),
+        lambda t: t.__setitem__(0, new_row("4", "1")),
+        lambda t: t.__setitem__(slice(0, 2), [new_row("4", "1")]),
+        lambda t: t.__setitem__("a", "4"),
+        lambda t: t.__setslice__(1, 2, [new_row("3", "2")]),
+        lambda t: t.__delitem__(0),
+        lambda t: t.__delitem__(slice(0, 2)),
+        lambda t: t.__delslice__(0, 1),
+        lambda t: t.pop(),
+        lambda t: t.remove(t[1]),
+        lambda t: t.sort(),
+        lambda t: t.reverse()]
+    for change in table_changes:
+        try:
+            change(stream_table)
+        except mmCIF.mmCIFError:
+            pass
+        else:
+            raise AssertionError("mmCIFStreamTable rows changed")
+    assert row_values(list(stream_table)) == row_values(list(col_table))
+
+
+def save_cif_file(cif_file):
+    """Returns the mmCIF file written from cif_file as a string.
+    """
+    fil = StringIO.StringIO()
+    cif_file.save_file(fil)
+    return fil.getvalue()
+
+
+def stream_cif_file(col_table):
+    """Returns a mmCIFFile with a mmCIFStreamTable of the atom_site rows of
+    the mmCIFColumnTable col_table.
+    """
+    cif_file = mmCIF.mmCIFFile()
+    cif_data = mmCIF.mmCIFData("TEST")
+    cif_file.append(cif_data)
+    cif_data.append(mmCIF.mmCIFStreamTable(
+        "atom_site", ATOM_SITE_COLUMNS, len(col_table),
+        col_table.iter_column_chunks))
+    return cif_file
+
+
+def save_test(row_table, col_table):
+    """Checks the mmCIFTable, mmCIFColumnTable and mmCIFStreamTable of the
+    atom_site rows are written the same, and read back the same.
+    """
+    row_text = save_cif_file(row_table.data.file)
+    col_text = save_cif_file(col_table.data.file)
+    stream_text = save_cif_file(stream_cif_file(col_table))
+    assert row_text == col_text
+    assert row_text.endswith(stream_text[stream_text.index("loop_"):])
+
+    atom_site = load_atom_site(row_text, False)
+    for i in (0, 1, NUM_ATOMS // 2, -1):
+        assert sorted(atom_site[i].items()) == sorted(row_table[i].items())
+
+
+def main():
+    print "[load]"
+    row_table, col_table = load_test(nuc_cif_file())
+
+    print "[get_row]"
+    get_row_test(row_table)
+    get_row_test(col_table)
+
+    print "[row indexes]"
+    row_index_test(lambda: mmCIF.mmCIFTable("rows"))
+    row_index_test(lambda: mmCIF.mmCIFColumnTable("columns"))
+
+    print "[list methods]"
+    list_methods_test()
+
+    print "[stream table]"
+    stream_table_test()
+
+    print "[save]"
+    save_test(row_table, col_table)
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,9 @@ def bond_test(bond, atom, stats):
     assert bond.get_atom1() == bond.atom1
     assert bond.get_atom2() == bond.atom2
 
+    assert bond in atom.bond_list
+    assert atom.get_bond(bond.get_partner(atom)).get_partner(atom) == bond.get_partner(atom)
+
     assert bond.get_fragment1() == bond.atom1.fragment
     assert bond.get_fragment2() == bond.atom2.fragment
 
@@ -205,6 +208,27 @@ def chain_test(chain, stats):
         assert frag.get_model() == chain.get_model()
         assert frag.get_structure() == chain.get_structure()
 
+    ## fragment_id slices must match a walk of the fragment list
+    frag_list = chain.fragment_list
+    for i in range(0, len(frag_list), max(1, len(frag_list) / 8)):
+        frag_id1 = frag_list[i].fragment_id
+        frag_id2 = frag_list[min(i + 5, len(frag_list) - 1)].fragment_id
+        walk = list(Structure.iter_fragments(iter(frag_list), frag_id1, frag_id2))
+        assert chain[frag_id1:frag_id2].fragment_list == walk
+        assert list(chain.iter_fragments(frag_id1, frag_id2)) == walk
+        assert chain[frag_id1:].fragment_list == frag_list[frag_list.index(walk[0]):]
+
+    ## ordered insertion must match sorting after each append
+    rev_list = list(frag_list)
+    rev_list.reverse()
+    segment = chain.construct_segment()
+    for frag in rev_list:
+        segment.add_fragment(frag)
+    assert segment.fragment_list == sorted(rev_list, key = Structure.fragment_sort_key)
+    segment = chain.construct_segment()
+    segment.add_fragments(rev_list)
+    assert segment.fragment_list == sorted(rev_list, key = Structure.fragment_sort_key)
+
     chain.has_amino_acids()
     chain.count_amino_acids()
     for frag in chain.iter_amino_acids():
@@ -308,6 +332,93 @@ def model_test(model, stats):
     model.count_all_atoms()
     model.count_bonds()
 
+    ## test AtomArrays
+    atom_arrays = model.get_atom_arrays()
+    assert isinstance(atom_arrays, Structure.AtomArrays)
+    assert len(atom_arrays) == model.count_all_atoms()
+    assert model.get_atom_arrays() == atom_arrays
+
+    for i, atm in enumerate(atom_arrays.atom_list):
+        assert atm.atom_arrays == atom_arrays
+        if atm.position is not None:
+            assert atm.position.base is atom_arrays.position
+            assert atom_arrays.position_mask[i]
+        if atm.U is not None:
+            assert atm.U.base is atom_arrays.U
+            assert atom_arrays.U_mask[i]
+        if atm.temp_factor is not None:
+            assert atm.temp_factor == atom_arrays.temp_factor[i]
+        if atm.occupancy is not None:
+            assert atm.occupancy == atom_arrays.occupancy[i]
+
+    ## test BondTable
+    bond_table = model.get_bond_table()
+    assert isinstance(bond_table, Structure.BondTable)
+    assert len(bond_table) == len(list(Structure.iter_atom_bonds(model.iter_all_atoms())))
+
+    for atm in model.iter_all_atoms():
+        if atm.bond_table is None:
+            assert len(atm.bond_list) == 0
+            continue
+        assert atm.bond_table is bond_table
+        assert bond_table.atom_list[atm.bond_table_index] is atm
+        partners = [bond.get_partner(atm) for bond in atm.iter_bonds()]
+        assert partners == list(atm.iter_bonded_atoms())
+
+    ## bonding Atoms of two BondTables merges them, keeping the Bonds
+    atm1, atm2, atm3, atm4 = [Structure.Atom(name = "C%d" % (i)) for i in range(4)]
+    atm1.create_bond(atm2)
+    atm3.create_bond(atm4, bond_type = "covale")
+    assert atm1.bond_table is not atm3.bond_table
+    bond = atm3.get_bond(atm4)
+    bond_set = set([atm1.get_bond(atm2), bond])
+    bond_dict = {atm1.get_bond(atm2): 1, bond: 2}
+    atm2.create_bond(atm3)
+    assert atm1.bond_table is atm4.bond_table
+    assert bond == atm4.get_bond(atm3)
+    assert bond in bond_set and atm2.get_bond(atm1) in bond_set
+    assert bond_dict.get(atm1.get_bond(atm2)) == 1
+    assert bond_dict.get(atm4.get_bond(atm3)) == 2
+    assert atm2.get_bond(atm3) not in bond_set
+    assert bond.bond_type == "covale"
+    assert list(atm2.iter_bonded_atoms()) == [atm1, atm3]
+    bond.bond_type = "disulf"
+    assert atm3.get_bond(atm4).bond_type == "disulf"
+    assert atm1.get_bond(atm3) is None
+
+    ## Bonds added between lookups are found, before and after the
+    ## adjacency is rebuilt, in the order they were added
+    atms = [Structure.Atom(name = "C%d" % (i)) for i in range(300)]
+    for i in range(1, len(atms)):
+        for j in (i - 1, i // 3):
+            if atms[i].get_bond(atms[j]) is None:
+                atms[i].create_bond(atms[j])
+            assert atms[j].get_bond(atms[i]) is not None
+    bond_table = atms[0].bond_table
+    for atm in atms:
+        row = atm.bond_table_index
+        bond_ids = [bond_id for bond_id in range(len(bond_table))
+                    if row in (bond_table.atom1[bond_id], bond_table.atom2[bond_id])]
+        assert list(bond_table.iter_bond_ids(row)) == bond_ids
+
+    ## test Model.clone
+    model_cpy = model.clone()
+    assert model_cpy.count_all_atoms() == model.count_all_atoms()
+    assert model_cpy.count_bonds() == model.count_bonds()
+    assert model_cpy.get_atom_arrays() == model_cpy.atom_arrays
+    assert model.get_atom_arrays() == atom_arrays
+
+    for atm, atm_cpy in zip(model.iter_all_atoms(), model_cpy.iter_all_atoms()):
+        assert atm_cpy is not atm
+        assert atm_cpy.name == atm.name
+        assert atm_cpy.alt_loc == atm.alt_loc
+        assert atm_cpy.fragment_id == atm.fragment_id
+        assert atm_cpy.temp_factor == atm.temp_factor
+        assert len(atm_cpy.bond_list) == len(atm.bond_list)
+        if atm.position is not None:
+            assert atm_cpy.position.base is model_cpy.atom_arrays.position
+            assert numpy.allclose(atm_cpy.position, atm.position)
+
     ## test AlphaHelix
     for helix in model.iter_alpha_helicies():
         assert isinstance(helix, Structure.AlphaHelix)
@@ -473,6 +584,78 @@ def struct_test(struct, stats):
         struct.count_all_atoms()
         struct.count_bonds()
 
+        ## check atom selections against plain Python filters
+        all_atoms = list(struct.default_model.iter_all_atoms())
+        assert list(struct.select_atoms("all")) == all_atoms
+
+        for chain in struct.iter_chains():
+            sel = "chain %s and name CA,N" % (chain.chain_id)
+            atoms = [atm for atm in all_atoms
+                     if atm.chain_id == chain.chain_id and atm.name in ("CA", "N")]
+            assert list(struct.select_atoms(sel)) == atoms
+            assert struct.select_atoms(sel) is struct.select_atoms(sel)
+
+            if len(chain) > 0 and chain.chain_id != "":
+                frag_id1 = chain[0].fragment_id
+                frag_id2 = chain[min(4, len(chain) - 1)].fragment_id
+                sel = "chain %s and resi %s-%s" % (chain.chain_id, frag_id1, frag_id2)
+                assert list(struct.select_atoms(sel)) == \
+                       list(chain[frag_id1:frag_id2].iter_all_atoms())
+
+        atoms = [atm for atm in all_atoms
+                 if atm.temp_factor is not None and atm.temp_factor < 20.0
+                 and atm.element != "C"]
+        assert list(struct.select_atoms("b < 20.0 and not element C")) == atoms
+
+        ## cached selections see values set through the Atoms
+        atm = all_atoms[0]
+        temp_factor = atm.temp_factor
+        assert atm not in struct.select_atoms("b > 999.0")
+        atm.temp_factor = 1000.0
+        assert atm in struct.select_atoms("b > 999.0")
+        atm.temp_factor = None
+        assert atm not in struct.select_atoms("b != 3.0")
+        atm.temp_factor = temp_factor
+        assert atm not in struct.select_atoms("b > 999.0")
+
+        ## labels set through the Atoms drop the cached selections, labels
+        ## assigned directly are seen after invalidate_caches()
+        res_name = atm.res_name
+        assert atm not in struct.select_atoms("resn ZZZ")
+        atm.set_res_name("ZZZ")
+        assert atm in struct.select_atoms("resn ZZZ")
+        atm.set_res_name(res_name)
+        assert atm not in struct.select_atoms("resn ZZZ")
+
+        name = atm.name
+        assert atm not in struct.select_atoms("name ZZ")
+        atm.name = "ZZ"
+        struct.invalidate_caches()
+        assert atm in struct.select_atoms("name ZZ")
+        atm.name = name
+        struct.invalidate_caches()
+        assert atm not in struct.select_atoms("name ZZ")
+
+        position = atm.position
+        if position is not None:
+            atm.position = position + numpy.array([1000.0, 0.0, 0.0])
+            atom_table = struct.get_atom_table()
+            assert atom_table.atom_arrays is struct.get_atom_arrays()
+            assert numpy.allclose(atom_table.atom_arrays.position[0], atm.position)
+            atm.position = position
+
+        ## neighborhood queries find an Atom moved after the spatial index
+        ## was built
+        atoms = [atm for atm in struct.iter_atoms() if atm.position is not None]
+        if len(atoms) > 1:
+            atm1, atm2 = atoms[0], atoms[-1]
+            atm1.iter_atoms_by_distance(3.0)
+            position = atm2.position
+            atm2.position = atm1.position + numpy.array([1.0, 0.0, 0.0])
+            assert atm2 in [atm for dist, atm in atm1.iter_atoms_by_distance(3.0)]
+            atm2.position = position
+            assert atm2 not in [atm for dist, atm in atm1.iter_atoms_by_distance(0.5)]
+
     struct.set_model(old_model)
 
     stats["testing"] = None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Times the StructureBuilder name service on a synthetic PDB file
+whose atoms all have blank chain IDs, so every atom must be named.
+"""
+
+## Python
+import sys
+import time
+import StringIO
+
+## pymmlib
+from mmLib import FileIO
+from test_util import ALA_ATOMS, synthetic_pdb_file, print_stat
+
+
+def main(num_chains, num_res, num_waters):
+    ## no record has a chain ID; the waters after each polymer chain are
+    ## what the name service uses to detect the chain breaks
+    data = synthetic_pdb_file([""] * num_chains, num_res, num_waters = num_waters)
+    num_atoms = num_chains * (num_res * len(ALA_ATOMS) + num_waters)
+
+    time1 = time.time()
+    struct = FileIO.LoadStructure(
+        fil = StringIO.StringIO(data), format = "PDB")
+    time2 = time.time()
+
+    ## every polymer chain and the waters get their own chain ID
+    assert struct.count_atoms() == num_atoms
+    assert struct.count_chains() == num_chains + 1
+    for chain in struct.iter_chains():
+        assert chain.chain_id != ""
+
+    print_stat("Atoms", num_atoms)
+    print_stat("Chains", struct.count_chains())
+    print_stat("Load Time (sec)", "%.3f" % (time2 - time1))
+
+
+if __name__ == "__main__":
+    try:
+        num_chains = int(sys.argv[1])
+        num_res = int(sys.argv[2])
+        num_waters = int(sys.argv[3])
+    except IndexError:
+        num_chains, num_res, num_waters = 10, 1000, 500
+    except ValueError:
+        print "usage: name_service_bench.py [num_chains num_res num_waters]"
+        sys.exit(1)
+
+    main(num_chains, num_res, num_waters)
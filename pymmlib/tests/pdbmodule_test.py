@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Verifies the pdbmodule C accelerator converts PDB files into exactly
+the same PDB records as the pure Python PDBRecord.read implementation.
+"""
+
+## Python
+import sys
+import time
+
+## pymmlib
+import test_util
+from mmLib import PDB, FileIO
+
+
+def cmp_records(path):
+    print "[%s]" % (path)
+
+    time1 = time.time()
+    py_recs = list(PDB.iter_pdb_records_py(FileIO.OpenFile(path, "r")))
+    time2 = time.time()
+    c_recs = list(PDB.iter_pdb_records_c(FileIO.OpenFile(path, "r")))
+    time3 = time.time()
+
+    assert len(py_recs) == len(c_recs)
+
+    for (py_rec, c_rec) in zip(py_recs, c_recs):
+        assert type(py_rec) == type(c_rec)
+        assert py_rec == c_rec
+        for (field, value) in py_rec.iteritems():
+            assert type(value) == type(c_rec[field])
+
+    print "Records--------------:", len(py_recs)
+    print "Python Time (sec)----: %.3f" % (time2 - time1)
+    print "C Time (sec)---------: %.3f" % (time3 - time2)
+
+
+def main(path):
+    if not PDB.PDBMODULE_EXISTS:
+        print "pdbmodule C extension not built; nothing to compare"
+        sys.exit(1)
+
+    for pathx in test_util.walk_pdb(path):
+        cmp_records(pathx)
+
+
+if __name__ == "__main__":
+    try:
+        path = sys.argv[1]
+    except IndexError:
+        print "usage: pdbmodule_test.py <PDB file or directory of files>"
+        sys.exit(1)
+
+    main(path)
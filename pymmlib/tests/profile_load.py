@@ -12,13 +12,17 @@ import sys
 import profile
 
 ## pymmlib
-from mmLib import FileIO
+from mmLib import FileIO, Library
 
 
 def main(path):
     print "PERFORMANCE PROFILE: mmLib.LoadStructure(fil=%s)" % (path)
     profile.run("FileIO.LoadStructure(fil=path)")
 
+    info = Library.library_guess_element_cache_info()
+    print "ELEMENT GUESS CACHE: hits=%d misses=%d size=%d" % (
+        info["hits"], info["misses"], info["size"])
+
 if __name__ == "__main__":
     import os
 
@@ -164,6 +164,139 @@ def cif_stats(path):
     return stats
 
 
+## residue atoms (name, element) of the default synthetic polymer chains
+ALA_ATOMS = [("N", "N"), ("CA", "C"), ("C", "C"), ("O", "O"), ("CB", "C")]
+
+## residue atoms of synthetic nucleic acid chains; the quoted names are
+## tokenized by the mmCIF parser's regular expression instead of split
+NUC_ATOMS = [("P", "P"), ("O5'", "O"), ("C5'", "C"), ("C4'", "C"), ("N1", "N")]
+
+## columns of the atom_site table of synthetic_cif_file()
+ATOM_SITE_COLUMNS = [
+    "group_PDB", "id", "type_symbol", "label_atom_id", "label_alt_id",
+    "label_comp_id", "label_asym_id", "label_seq_id", "pdbx_PDB_ins_code",
+    "Cartn_x", "Cartn_y", "Cartn_z", "occupancy", "B_iso_or_equiv",
+    "pdbx_formal_charge", "pdbx_PDB_model_num"]
+
+def ordered_alt_locs(res_seq):
+    return [("", 1.0)]
+
+def iter_synthetic_atoms(chain_ids, num_res, res_name = "ALA",
+                         atoms = ALA_ATOMS, alt_locs = ordered_alt_locs,
+                         num_waters = 0):
+    """Iterates over the atoms of a synthetic structure, as dicts of the
+    values of their PDB records, for the test and bench programs. Each
+    chain ID of chain_ids, which may be blank, gets a polymer chain of
+    num_res residues of res_name with the (name, element) atoms, followed
+    by num_waters waters numbered on from the waters of the chains
+    before. alt_locs is a function of the residue number returning the
+    list of (alt_loc, occupancy) conformers of the residue.
+    """
+    serial = 0
+    water_seq = 0
+    for chain_index, chain_id in enumerate(chain_ids):
+        for res_seq in xrange(1, num_res + 1):
+            for alt_loc, occupancy in alt_locs(res_seq):
+                ## the conformers are set apart along y
+                y = float(res_seq / 100) * 3.8 + chain_index * 40.0
+                if alt_loc:
+                    y += (ord(alt_loc) % 4) * 0.3
+
+                for name, element in atoms:
+                    serial += 1
+                    yield {
+                        "record":      "ATOM",
+                        "serial":      serial,
+                        "name":        name,
+                        "alt_loc":     alt_loc,
+                        "res_name":    res_name,
+                        "chain_id":    chain_id,
+                        "res_seq":     res_seq,
+                        "x":           float(res_seq % 100) * 3.8,
+                        "y":           y,
+                        "z":           float(serial % 23) * 0.5,
+                        "occupancy":   occupancy,
+                        "temp_factor": 10.0 + serial % 7,
+                        "element":     element}
+
+        for i in xrange(num_waters):
+            serial += 1
+            water_seq += 1
+            yield {
+                "record":      "HETATM",
+                "serial":      serial,
+                "name":        "O",
+                "alt_loc":     "",
+                "res_name":    "HOH",
+                "chain_id":    chain_id,
+                "res_seq":     water_seq,
+                "x":           float(water_seq % 100) * 3.8,
+                "y":           chain_index * 40.0 + 20.0,
+                "z":           float(water_seq / 100) * 3.8,
+                "occupancy":   1.0,
+                "temp_factor": 20.0,
+                "element":     "O"}
+
+def synthetic_pdb_file(chain_ids, num_res, anisou = False, **args):
+    """Returns a PDB file as a string with the atoms of
+    iter_synthetic_atoms(chain_ids, num_res, **args), with anisotropic
+    ANISOU records if anisou is True.
+    """
+    lines = []
+    for atm in iter_synthetic_atoms(chain_ids, num_res, **args):
+        name = atm["name"]
+        if len(name) < 4 and len(atm["element"]) == 1:
+            name = " " + name
+        labels = (atm["serial"] % 100000, name, atm["alt_loc"],
+                  atm["res_name"], atm["chain_id"], atm["res_seq"])
+        lines.append(
+            "%-6s%5d %-4s%1s%-3s %1s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f"
+            "          %2s" % ((atm["record"],) + labels + (
+            atm["x"], atm["y"], atm["z"], atm["occupancy"],
+            atm["temp_factor"], atm["element"])))
+        if anisou:
+            lines.append(
+                "ANISOU%5d %-4s%1s%-3s %1s%4d  %7d%7d%7d%7d%7d%7d      %2s" % (
+                labels + (1000, 1100, 1200, 10, 20, 30, atm["element"])))
+    lines.append("END")
+    return "\n".join(lines) + "\n"
+
+def synthetic_cif_file(data_name, chain_ids, num_res, **args):
+    """Returns a mmCIF file as a string with a data_ block data_name of the
+    atoms of iter_synthetic_atoms(chain_ids, num_res, **args) in the
+    ATOM_SITE_COLUMNS of its atom_site table. It has a multi-line title,
+    atom names with a quote are quoted, and the blank alt_loc and charge
+    values are written as ".".
+    """
+    lines = ["data_%s" % (data_name),
+             "_entry.id %s" % (data_name),
+             "_struct.title",
+             ";synthetic structure",
+             " of the test programs",
+             ";",
+             "loop_"]
+    for column in ATOM_SITE_COLUMNS:
+        lines.append("_atom_site.%s" % (column))
+
+    for atm in iter_synthetic_atoms(chain_ids, num_res, **args):
+        name = atm["name"]
+        if "'" in name:
+            name = '"%s"' % (name)
+        lines.append(
+            "%s %d %s %s %s %s %s %d ? %.3f %.3f %.3f %.2f %.2f . 1" % (
+            atm["record"], atm["serial"], atm["element"], name,
+            atm["alt_loc"] or ".", atm["res_name"], atm["chain_id"] or ".",
+            atm["res_seq"], atm["x"], atm["y"], atm["z"], atm["occupancy"],
+            atm["temp_factor"]))
+    lines.append("#")
+    return "\n".join(lines) + "\n"
+
+def print_stat(label, value):
+    """Prints one line of the statistics of a test or bench program.
+    """
+    print "%s: %s" % (label.ljust(21, "-"), value)
+
+
 if __name__ == "__main__":
 
     for pathx in walk_pdb_cif("/data/tlsmd/pdb"):
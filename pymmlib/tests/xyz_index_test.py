@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+## Copyright 2002-2010 by PyMMLib Development Group (see AUTHORS file)
+## This code is part of the PyMMLib distribution and governed by
+## its license.  Please see the LICENSE file that should have been
+## included as part of this package.
+"""Verifies the GeometryDict.XYZIndex radius, nearest neighbor and contact
+pair queries, and the XYZDict queries as items are added and removed,
+against brute force distance calculations, and times the XYZIndex and
+the XYZDict wrapper on the atoms of a structure.
+"""
+
+## Python
+import sys
+import time
+import random
+
+## NumPy
+import numpy
+
+## pymmlib
+from mmLib import FileIO, GeometryDict
+
+
+def brute_force_distances(positions):
+    delta = positions[:,numpy.newaxis,:] - positions[numpy.newaxis,:,:]
+    return numpy.sqrt((delta ** 2).sum(axis = 2))
+
+
+def check_index(positions, resolution, distance):
+    xyz_index = GeometryDict.XYZIndex(positions, resolution)
+    dist = brute_force_distances(positions)
+
+    ## contact pairs
+    i, j, d = xyz_index.calc_contact_pairs(distance)
+    bi, bj = numpy.nonzero(numpy.triu(dist <= distance, 1))
+    assert numpy.all(i == bi) and numpy.all(j == bj)
+    assert numpy.allclose(d, dist[bi, bj])
+
+    for q in random.sample(xrange(len(positions)), 20):
+        ## radius query
+        p, d = xyz_index.calc_sphere_intersection(positions[q], distance)
+        assert sorted(p.tolist()) == numpy.nonzero(dist[q] <= distance)[0].tolist()
+        assert numpy.allclose(d, dist[q, p])
+
+        ## nearest neighbors
+        p, d = xyz_index.calc_nearest(positions[q], 5)
+        assert numpy.allclose(d, numpy.sort(dist[q])[:5])
+
+
+def check_xyzdict(positions, resolution, distance):
+    """Checks the XYZDict queries against brute force distances as items
+    are added and removed between them, before and after the index is
+    rebuilt.
+    """
+    xyzdict = GeometryDict.XYZDict(resolution)
+    live = set()
+    order = range(len(positions))
+    random.shuffle(order)
+
+    for n, i in enumerate(order):
+        xyzdict.add(positions[i], i)
+        live.add(i)
+        if n % 3 == 2:
+            j = random.choice(list(live))
+            xyzdict.remove(positions[j], j)
+            live.remove(j)
+        if n % 5 != 0:
+            continue
+
+        q = random.choice(order)
+        found = sorted(item for pos, item in
+                       xyzdict.iter_sphere_intersection(positions[q], distance))
+        delta = positions[sorted(live)] - positions[q]
+        dist = numpy.sqrt((delta ** 2).sum(axis = 1))
+        assert found == [j for j, d in zip(sorted(live), dist) if d <= distance]
+
+        found = sorted(item for pos, item in
+                       xyzdict.iter_cube_intersection(positions[q], distance))
+        inside = numpy.all(numpy.abs(delta) <= distance, axis = 1)
+        assert found == [j for j, k in zip(sorted(live), inside) if k]
+
+    assert sorted(item for pos, item in xyzdict.iter_all()) == sorted(live)
+    pairs = sorted((min(a[1], b[1]), max(a[1], b[1]))
+                   for a, b, d in xyzdict.iter_contact_distance(distance))
+    dist = brute_force_distances(positions)
+    assert pairs == [(i, j) for i in sorted(live) for j in sorted(live)
+                     if i < j and dist[i, j] <= distance]
+
+    try:
+        xyzdict.remove(positions[order[0]], -1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("XYZDict removed an item it does not hold")
+
+
+def main(path):
+    random.seed(0)
+    for resolution in (0.7, 2.0, 5.0):
+        positions = numpy.array(
+            [[random.uniform(-15.0, 15.0) for k in xrange(3)]
+             for n in xrange(1500)])
+        check_index(positions, resolution, 2.5)
+        check_xyzdict(positions[:600], resolution, 2.5)
+    print "Random Points--------: OK"
+
+    struct = FileIO.LoadStructure(fil = path)
+    atom_list = [atm for atm in struct.iter_all_atoms()
+                 if atm.position is not None]
+    positions = numpy.array([atm.position for atm in atom_list])
+
+    time1 = time.time()
+    xyz_index = GeometryDict.XYZIndex(positions, 2.5)
+    i, j, d = xyz_index.calc_contact_pairs(2.5)
+    time2 = time.time()
+
+    xyzdict = GeometryDict.XYZDict(2.0)
+    for atm in atom_list:
+        xyzdict.add(atm.position, atm)
+    num_pairs = len(list(xyzdict.iter_contact_distance(2.5)))
+    time3 = time.time()
+
+    assert num_pairs == len(i)
+
+    ## each atom is removed and added back in place of a neighbor search,
+    ## as a model being edited does
+    for atm in atom_list[:2000]:
+        xyzdict.remove(atm.position, atm)
+        len(list(xyzdict.iter_sphere_intersection(atm.position, 4.0)))
+        xyzdict.add(atm.position, atm)
+    time4 = time.time()
+
+    print "Atoms----------------: %d" % (len(atom_list))
+    print "Contact Pairs--------: %d" % (num_pairs)
+    print "XYZIndex Time (sec)--: %.3f" % (time2 - time1)
+    print "XYZDict Time (sec)---: %.3f" % (time3 - time2)
+    print "Edit Time (sec)------: %.3f, %d removes and searches" % (
+        time4 - time3, min(2000, len(atom_list)))
+
+
+if __name__ == "__main__":
+    try:
+        path = sys.argv[1]
+    except IndexError:
+        print "usage: xyz_index_test.py <PDB/mmCIF file>"
+        sys.exit(1)
+
+    main(path)
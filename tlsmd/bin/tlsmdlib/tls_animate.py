@@ -7,7 +7,6 @@
 ## NOTE: Some of the code in here is used for rendering images with Raster3D
 
 ## Python modules
-import copy
 import string
 import math
 import itertools
@@ -145,11 +144,11 @@ class TLSAnimate(object):
         chain_id = self.chain.chain_id
         self.L1_chain = self.struct.get_chain(chain_id)
 
-        self.L2_chain = copy.deepcopy(self.L1_chain)
+        self.L2_chain = self.L1_chain.clone()
         self.L2_chain.set_chain_id(self.next_chain_id())
         self.struct.add_chain(self.L2_chain, True)
 
-        self.L3_chain = copy.deepcopy(self.L1_chain)
+        self.L3_chain = self.L1_chain.clone()
         self.L3_chain.set_chain_id(self.next_chain_id())
         self.struct.add_chain(self.L3_chain, True)
 
@@ -161,7 +160,7 @@ class TLSAnimate(object):
         ## copy the original model and add it to the structure
         model1 = self.struct.get_model(1)
 
-        model = copy.deepcopy(model1)
+        model = model1.clone()
         model.set_model_id(self.next_model_id())
         self.struct.add_model(model, True)
 